@@ -0,0 +1,288 @@
+"""Fairness and quality report over one or many allocations (school-center.tsv), e.g. every seed of a batch run."""
+
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+
+import numpy as np
+
+from school_center import DEFAULT_OUTPUT_FILENAME, PREF_DISTANCE_THRESHOLD, read_tsv
+from utils.custom_logger import configure_logging
+from utils.tsv_reader import CENTERS_SCHEMA
+from utils.tsv_writer import COMPRESSION_SUFFIXES, write_tsv
+
+DISTANCE_BIN_KM = 0.01          # Resolution of the distance histogram, percentiles are exact to this
+PERCENTILES = [50, 90, 95, 99]
+PAIR_COLUMNS = ["scode", "cscode", "runs", "share", "students"]
+RUN_COLUMNS = ["run", "schools", "centers_used", "mean_centers_per_school", "max_centers_per_school",
+               "stretched_centers", "stretched_students", "relaxed_schools", "students", "mean_km", "max_km"] + \
+              [f"p{q}_km" for q in PERCENTILES]
+
+logger = logging.getLogger(__name__)
+
+
+class DistanceHistogram:
+    """
+    Students per DISTANCE_BIN_KM wide distance bin: percentiles in memory bounded by the
+    largest distance, however many rows are added.
+    """
+
+    def __init__(self, bin_km: float = DISTANCE_BIN_KM):
+        self.bin_km = bin_km
+        self.bins: Dict[int, int] = {}
+        self.students = 0
+        self.total_km = 0.0
+        self.max_km = 0.0
+
+    def add(self, distance: float, students: int):
+        b = int(distance / self.bin_km)
+        self.bins[b] = self.bins.get(b, 0) + students
+        self.students += students
+        self.total_km += distance * students
+        self.max_km = max(self.max_km, distance)
+
+    def merge(self, other: 'DistanceHistogram'):
+        for b, students in other.bins.items():
+            self.bins[b] = self.bins.get(b, 0) + students
+        self.students += other.students
+        self.total_km += other.total_km
+        self.max_km = max(self.max_km, other.max_km)
+
+    def mean(self) -> float:
+        return self.total_km / self.students if self.students else 0.0
+
+    def percentile(self, q: float) -> float:
+        """
+        Return the upper edge of the bin holding the q-th (0-100) student weighted percentile.
+        """
+        cumulative = 0
+        for b in sorted(self.bins):
+            cumulative += self.bins[b]
+            if cumulative >= self.students * q / 100:
+                return round(min((b + 1) * self.bin_km, self.max_km), 6)
+        return 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        result = {'students': self.students, 'mean_km': self.mean(), 'max_km': self.max_km}
+        result.update({f'p{q}_km': self.percentile(q) for q in PERCENTILES})
+        return result
+
+
+def count_histogram(values: Iterable[int]) -> Dict[int, int]:
+    histogram = {}
+    for value in values:
+        histogram[value] = histogram.get(value, 0) + 1
+    return histogram
+
+
+class AllocationReport:
+    """
+    Aggregate allocations one run at a time, reading each row once. Memory is bounded by the
+    no. of schools, centers and distinct school-center pairs, not by the no. of runs: the
+    measures of each run are returned by add_run, not kept.
+
+    centers: List of dicts as returned by read_tsv, for capacities
+    pref_distance_threshold: Schools with a center farther than this went through the relaxed pass
+    """
+
+    def __init__(self, centers: List[Dict[str, str]], pref_distance_threshold: float = PREF_DISTANCE_THRESHOLD):
+        self.centers = centers
+        self.pref_distance_threshold = pref_distance_threshold
+        self.center_positions = {}
+        for i, c in enumerate(centers):
+            self.center_positions.setdefault(c['cscode'], i)
+        self.capacity = np.array([int(c['capacity']) for c in centers], dtype=np.int64)
+        self.runs = 0
+        self.distances = DistanceHistogram()
+        self.centers_per_school: Dict[int, int] = {}    # no. of centers -> school runs
+        self.center_students = np.zeros(len(centers), dtype=np.int64)
+        self.center_stretched_runs = np.zeros(len(centers), dtype=np.int64)
+        self.relaxed_runs: Dict[str, int] = {}          # scode -> runs with a center beyond the threshold
+        self.pairs: Dict[tuple, List[int]] = {}         # (scode, cscode) -> [runs, students]
+
+    def add_run(self, name: str, rows: Iterable[Dict[str, str]]) -> Dict[str, any]:
+        """
+        Add the rows of one school-center.tsv and return the measures of this run, a row of RUN_COLUMNS.
+        """
+        distances = DistanceHistogram(self.distances.bin_km)
+        centers_of: Dict[str, int] = {}
+        relaxed = set()
+        used = np.zeros(len(self.centers), dtype=np.int64)
+        unknown = 0
+        for row in rows:
+            scode, cscode = row['scode'], row['cscode']
+            students, distance = int(row['allocation']), float(row['distance_km'])
+            distances.add(distance, students)
+            centers_of[scode] = centers_of.get(scode, 0) + 1
+            if distance > self.pref_distance_threshold:
+                relaxed.add(scode)
+            ci = self.center_positions.get(cscode)
+            if ci is None:
+                unknown += students
+            else:
+                used[ci] += students
+            pair = self.pairs.setdefault((scode, cscode), [0, 0])
+            pair[0] += 1
+            pair[1] += students
+
+        stretched = np.maximum(used - self.capacity, 0)
+        self.distances.merge(distances)
+        for n, schools in count_histogram(centers_of.values()).items():
+            self.centers_per_school[n] = self.centers_per_school.get(n, 0) + schools
+        self.center_students += used
+        self.center_stretched_runs += stretched > 0
+        for scode in relaxed:
+            self.relaxed_runs[scode] = self.relaxed_runs.get(scode, 0) + 1
+        if unknown:
+            logger.warning(f"{name}: {unknown} students allocated to centers not in the centers file")
+        self.runs += 1
+        return {'run': name,
+                'schools': len(centers_of),
+                'centers_used': int((used > 0).sum()),
+                'mean_centers_per_school': sum(centers_of.values()) / len(centers_of) if centers_of else 0,
+                'max_centers_per_school': max(centers_of.values(), default=0),
+                'stretched_centers': int((stretched > 0).sum()),
+                'stretched_students': int(stretched.sum()),
+                'relaxed_schools': len(relaxed),
+                **distances.to_dict()}
+
+    def add_runs(self, files: Iterable[str]) -> Iterator[Dict[str, any]]:
+        """
+        Add the allocation files one at a time, yielding the measures of each as it is read.
+        """
+        for file_path in files:
+            with open_allocation(file_path) as file:
+                yield self.add_run(file_path, csv.DictReader(file, delimiter='\t'))
+
+    def utilization(self) -> np.ndarray:
+        """
+        Return the mean share of capacity used per center over the runs.
+        """
+        runs = max(self.runs, 1)
+        return self.center_students / np.maximum(self.capacity, 1) / runs
+
+    def to_dict(self) -> Dict[str, any]:
+        runs = self.runs
+        utilization = self.utilization()
+        school_runs = sum(self.centers_per_school.values())
+        return {'runs': runs,
+                'distance': self.distances.to_dict(),
+                'centers_per_school': {
+                    'histogram': dict(sorted(self.centers_per_school.items())),
+                    'mean': sum(n * k for n, k in self.centers_per_school.items()) / school_runs if school_runs else 0},
+                'centers': {
+                    'mean_utilization': float(utilization.mean()) if len(utilization) else 0,
+                    'unused': int((self.center_students == 0).sum()),
+                    'stretched_in_any_run': int((self.center_stretched_runs > 0).sum()),
+                    'per_center': [{'cscode': c['cscode'],
+                                    'utilization': round(float(u), 4),
+                                    'stretched_runs': int(s)}
+                                   for c, u, s in zip(self.centers, utilization.tolist(),
+                                                      self.center_stretched_runs.tolist())]},
+                'relaxed_pass': {
+                    'schools': len(self.relaxed_runs),
+                    'school_runs': sum(self.relaxed_runs.values()),
+                    'mean_schools_per_run': sum(self.relaxed_runs.values()) / runs if runs else 0},
+                'pairs': {
+                    'distinct': len(self.pairs),
+                    'in_every_run': sum(1 for n, _ in self.pairs.values() if n == runs)}}
+
+    def pair_rows(self) -> Iterator[Dict[str, any]]:
+        """
+        Yield how often each school-center pair was allocated, most frequent first.
+        """
+        runs = max(self.runs, 1)
+        for (scode, cscode), (n, students) in sorted(self.pairs.items(), key=lambda item: (-item[1][0], item[0])):
+            yield {'scode': scode, 'cscode': cscode, 'runs': n, 'share': round(n / runs, 4), 'students': students}
+
+
+def open_allocation(file_path: str) -> TextIO:
+    """
+    Open a school-center.tsv for reading, also when compressed with --compress.
+    """
+    if file_path.endswith(COMPRESSION_SUFFIXES['gzip']):
+        return gzip.open(file_path, 'rt', encoding='utf-8', newline='')
+    if file_path.endswith(COMPRESSION_SUFFIXES['zstd']):
+        import zstandard
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb')),
+                                encoding='utf-8', newline='')
+    return open(file_path, 'r', encoding='utf-8', newline='')
+
+
+def find_allocations(paths: List[str], filename: str = DEFAULT_OUTPUT_FILENAME) -> List[str]:
+    """
+    Return the allocation files among paths; directories, e.g. the output of a batch run,
+    are searched for filename (compressed or not) in sorted order.
+    """
+    names = [filename] + [filename + suffix for suffix in COMPRESSION_SUFFIXES.values()]
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            files.extend(os.path.join(dirpath, name) for name in names if name in filenames)
+    return files
+
+
+def build_report(centers: List[Dict[str, str]], files: List[str],
+                 pref_distance_threshold: float = PREF_DISTANCE_THRESHOLD,
+                 runs_path: Optional[str] = None) -> AllocationReport:
+    """
+    Aggregate the allocation files; runs_path: Stream the measures of each run as TSV to this file.
+    """
+    report = AllocationReport(centers, pref_distance_threshold)
+    if runs_path:
+        write_tsv(runs_path, RUN_COLUMNS, report.add_runs(files))
+    else:
+        for _ in report.add_runs(files):
+            pass
+    return report
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='allocation report',
+        description='Reports fairness and quality measures over one or many allocations')
+    parser.add_argument('centers_tsv', help="Tab separated (TSV) file containing center details")
+    parser.add_argument('allocations', nargs='+', metavar='ALLOCATION',
+                        help=f"{DEFAULT_OUTPUT_FILENAME} files or directories to search for them, "
+                             "e.g. the output directory of a --seeds batch")
+    parser.add_argument('-o', '--output', metavar='FILE', default=None,
+                        help='Write the report as JSON to FILE (default: stdout)')
+    parser.add_argument('--pairs', metavar='FILE', default=None,
+                        help='Write how often each school-center pair was allocated as TSV to FILE')
+    parser.add_argument('--runs', metavar='FILE', default=None,
+                        help='Write the measures of each allocation as TSV to FILE, one row per run')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, any]:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    configure_logging()
+    files = find_allocations(args.allocations)
+    if not files:
+        parser.error(f"no {DEFAULT_OUTPUT_FILENAME} found in {', '.join(args.allocations)}")
+    report = build_report(read_tsv(args.centers_tsv, CENTERS_SCHEMA), files, runs_path=args.runs)
+    result = report.to_dict()
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+        logger.info(f"Report of {len(files)} allocations written to {args.output}")
+    else:
+        print(text)
+    if args.pairs:
+        write_tsv(args.pairs, PAIR_COLUMNS, report.pair_rows())
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""HTTP service running allocations as queued jobs on a bounded process pool."""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from aiohttp import web
+
+from school_center import (DEFAULT_OUTPUT_DIR, DEFAULT_OUTPUT_FILENAME, DISTANCE_FILENAME, allocate_centers,
+                           prefs_from_table, summarize, write_results)
+from utils.checkpoint import inputs_key
+from utils.custom_logger import configure_logging
+from utils.tsv_reader import CENTERS_SCHEMA, PREFS_SCHEMA, SCHOOLS_SCHEMA, read_table
+
+INPUT_FILES = {'schools': 'schools.tsv', 'centers': 'centers.tsv', 'prefs': 'prefs.tsv'}    # form field -> file
+RESULT_FILES = {'result': DEFAULT_OUTPUT_FILENAME, 'distances': DISTANCE_FILENAME}         # endpoint -> file
+JOB_FILENAME = 'job.json'
+DEFAULT_JOBS_DIR = os.path.join(DEFAULT_OUTPUT_DIR, 'jobs')
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_QUEUE_SIZE = 100        # Jobs waiting for a worker, more submissions are refused with 503
+CHUNK_SIZE = 2**16
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    """
+    An allocation of one set of inputs; its id is the hash of the inputs, so equal
+    submissions are the same job.
+    status: 'queued', 'running', 'done' or 'failed'
+    summary: summarize() of the allocation once done
+    """
+    id: str
+    seed: Optional[float]
+    status: str = 'queued'
+    submitted: float = 0.0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+    summary: Optional[Dict[str, any]] = None
+
+
+def run_job(job_dir: str, seed: Optional[float]) -> Dict[str, any]:
+    """
+    Allocate the inputs saved in job_dir and write the results next to them. Runs in a worker process.
+    """
+    schools = read_table(os.path.join(job_dir, INPUT_FILES['schools']), SCHOOLS_SCHEMA).rows()
+    centers = read_table(os.path.join(job_dir, INPUT_FILES['centers']), CENTERS_SCHEMA).rows()
+    prefs_table = read_table(os.path.join(job_dir, INPUT_FILES['prefs']), PREFS_SCHEMA)
+    prefs = prefs_from_table(prefs_table.text['scode'], prefs_table.text['cscode'], prefs_table.typed['pref'].tolist())
+    result = allocate_centers(schools, centers, prefs, seed)
+    write_results(result, job_dir, DEFAULT_OUTPUT_FILENAME)
+    return summarize(result, seed)
+
+
+class AllocationService:
+    """
+    Jobs are queued in a bounded queue and run on a pool of worker processes, one job per
+    worker at a time. Inputs and results of every job are kept in jobs_dir/<job id>, finished
+    jobs are reloaded from there on start so repeated submissions keep returning them.
+    """
+
+    def __init__(self, jobs_dir: str = DEFAULT_JOBS_DIR, workers: Optional[int] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.jobs_dir = jobs_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.jobs: Dict[str, Job] = {}
+        self.queue: Optional[asyncio.Queue] = None
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.tasks: List[asyncio.Task] = []
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def save_job(self, job: Job):
+        temp_path = os.path.join(self.job_dir(job.id), JOB_FILENAME + '.partial')
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(asdict(job), file)
+        os.replace(temp_path, os.path.join(self.job_dir(job.id), JOB_FILENAME))
+
+    def load_jobs(self):
+        """
+        Load the finished jobs of earlier runs; unfinished ones are run again when resubmitted.
+        """
+        for job_id in sorted(os.listdir(self.jobs_dir)):
+            job_path = os.path.join(self.job_dir(job_id), JOB_FILENAME)
+            if os.path.exists(job_path):
+                with open(job_path, 'r', encoding='utf-8') as file:
+                    job = Job(**json.load(file))
+                if job.status == 'done':
+                    self.jobs[job.id] = job
+
+    def new_pool(self) -> ProcessPoolExecutor:
+        # spawned workers do not inherit the event loop of this process
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def replace_pool(self, broken: ProcessPoolExecutor):
+        """
+        Replace the pool after a worker process died, which breaks it for every later job.
+        Jobs running on the broken pool fail with it, each replaces the pool at most once.
+        """
+        if self.pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = self.new_pool()
+
+    async def start(self, app: web.Application):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self.load_jobs()
+        self.queue = asyncio.Queue(self.queue_size)
+        self.pool = self.new_pool()
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+
+    async def stop(self, app: web.Application):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        # waiting for the workers to exit blocks, so it is done off the event loop
+        await asyncio.to_thread(self.pool.shutdown, cancel_futures=True)
+
+    async def work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            job.status, job.started = 'running', time.time()
+            pool = self.pool
+            try:
+                job.summary = await loop.run_in_executor(pool, run_job, self.job_dir(job.id), job.seed)
+                job.status = 'done'
+            except BrokenProcessPool as e:
+                job.status, job.error = 'failed', f"worker process died: {e}"
+                logger.error(f"Job {job.id} failed, a worker process died: {e}")
+                self.replace_pool(pool)
+            except Exception as e:
+                job.status, job.error = 'failed', str(e)
+                logger.error(f"Job {job.id} failed: {e}")
+            job.finished = time.time()
+            self.save_job(job)
+            self.queue.task_done()
+
+    async def receive_inputs(self, request: web.Request, staging_dir: str) -> Tuple[Optional[float], str]:
+        """
+        Stream the uploaded input files to staging_dir, hashing them on the way, and return the
+        seed and the job id. Raise HTTPBadRequest if a file is missing or the seed is not a number.
+        """
+        digests = {}
+        seed = None
+        reader = await request.multipart()
+        while (part := await reader.next()) is not None:
+            if part.name in INPUT_FILES:
+                digest = hashlib.sha256()
+                with open(os.path.join(staging_dir, INPUT_FILES[part.name]), 'wb') as file:
+                    while chunk := await part.read_chunk(CHUNK_SIZE):
+                        digest.update(chunk)
+                        file.write(chunk)
+                digests[part.name] = digest.hexdigest()
+            elif part.name == 'seed':
+                value = (await part.text()).strip()
+                try:
+                    seed = float(value) if value else None
+                except ValueError:
+                    raise web.HTTPBadRequest(text=f"seed must be a number, got '{value}'")
+        missing = [name for name in INPUT_FILES if name not in digests]
+        if missing:
+            raise web.HTTPBadRequest(text=f"missing input files: {', '.join(missing)}")
+        return seed, inputs_key(digests, seed)
+
+    async def submit(self, request: web.Request) -> web.Response:
+        """
+        POST /jobs with multipart schools, centers and prefs files and an optional seed.
+        Return the job, 202 when it is queued, 200 when equal inputs were submitted before.
+        """
+        staging_dir = tempfile.mkdtemp(prefix='.upload-', dir=self.jobs_dir)
+        try:
+            seed, job_id = await self.receive_inputs(request, staging_dir)
+            job = self.jobs.get(job_id)
+            if job is not None and job.status != 'failed':
+                return web.json_response(asdict(job), headers={'Location': f'/jobs/{job_id}'})
+            if self.queue.full():
+                raise web.HTTPServiceUnavailable(text=f"{self.queue_size} jobs are waiting, retry later")
+
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+            os.replace(staging_dir, self.job_dir(job_id))
+            job = Job(job_id, seed, submitted=time.time())
+            self.jobs[job_id] = job
+            self.save_job(job)
+            self.queue.put_nowait(job)
+            logger.info(f"Job {job_id} queued")
+            return web.json_response(asdict(job), status=202, headers={'Location': f'/jobs/{job_id}'})
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def get_job(self, request: web.Request) -> Job:
+        job = self.jobs.get(request.match_info['job_id'])
+        if job is None:
+            raise web.HTTPNotFound(text=f"unknown job {request.match_info['job_id']}")
+        return job
+
+    async def status(self, request: web.Request) -> web.Response:
+        """
+        GET /jobs/{job_id}: the job and, once done, its summary.
+        """
+        return web.json_response(asdict(self.get_job(request)))
+
+    async def download(self, request: web.Request) -> web.StreamResponse:
+        """
+        GET /jobs/{job_id}/result or /jobs/{job_id}/distances: a result TSV of a done job.
+        """
+        job = self.get_job(request)
+        if job.status != 'done':
+            raise web.HTTPConflict(text=f"job {job.id} is {job.status}")
+        filename = RESULT_FILES[request.match_info['name']]
+        return web.FileResponse(os.path.join(self.job_dir(job.id), filename),
+                                headers={'Content-Type': 'text/tab-separated-values; charset=utf-8',
+                                         'Content-Disposition': f'attachment; filename="{filename}"'})
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([web.post('/jobs', self.submit),
+                        web.get('/jobs/{job_id}', self.status),
+                        web.get('/jobs/{job_id}/{name:result|distances}', self.download)])
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+        return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='allocation service',
+        description='Serves allocations over HTTP: POST /jobs, GET /jobs/{id}, GET /jobs/{id}/result')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'Address to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--jobs-dir', default=DEFAULT_JOBS_DIR,
+                        help=f'Directory keeping the inputs and results of jobs (default: {DEFAULT_JOBS_DIR})')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='No. of jobs run in parallel, each in a worker process (default: no. of CPUs)')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f'Max. no. of jobs waiting for a worker (default: {DEFAULT_QUEUE_SIZE})')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+    configure_logging()
+    service = AllocationService(args.jobs_dir, args.workers, args.queue_size)
+    web.run_app(service.application(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,17 @@
-import os
-import folium
-import tempfile
-import subprocess
-import pandas as pd
+import io
 import streamlit as st
-from streamlit_folium import st_folium
-from utils.pretty import pretty_dataframe, custom_map_zoom, custom_map_tooltip
+from school_center import ALLOCATION_COLUMNS, DISTANCE_COLUMNS, allocate_centers, parse_prefs, parse_tsv
+from utils.custom_logger import configure_logging
+from utils.filter_index import FILTER_COLUMNS, build_filter_indexes
+from utils.lazy_import import lazy_import
+from utils.pretty import pretty_dataframe
+
+# pandas and the map libraries load on first use, not before files are uploaded
+pd = lazy_import('pandas')
+map_layers = lazy_import('utils.map_layers')
+streamlit_folium = lazy_import('streamlit_folium')
+
+configure_logging()
 
 
 #Page Setup
@@ -68,9 +74,27 @@ tab3.subheader("School Data", divider=divider_color)
 tab4.subheader("Center Data", divider=divider_color)
 tab5.subheader("Pref Data", divider=divider_color)
 
+# Parsed uploads are memoized by file content, so reruns don't parse them again
+@st.cache_data
+def load_dataframe(content):
+    return pd.read_csv(io.BytesIO(content), sep="\t", dtype={"scode": str, "cscode": str})
+
+@st.cache_data
+def load_records(content):
+    return parse_tsv(io.StringIO(content.decode("utf-8"), newline=""))
+
+@st.cache_data
+def load_prefs(content):
+    return parse_prefs(io.StringIO(content.decode("utf-8"), newline=""))
+
+# Maps are keyed by the rows they show, i.e. by the filter selection
+@st.cache_resource(max_entries=32)
+def cached_map(map_data, tiles, show_heatmap):
+    return map_layers.build_map(map_data, tiles, show_heatmap)
+
 # Show data in Tabs as soon as the files are uploaded
 if schools_file:
-    df = pd.read_csv(schools_file, sep="\t")
+    df = load_dataframe(schools_file.getvalue())
     school_df = df
     tab3.dataframe(pretty_dataframe(df), use_container_width=True)
     
@@ -78,69 +102,44 @@ else:
     tab3.info("Upload data to view it.", icon="ℹ️")
 
 if centers_file:
-    df = pd.read_csv(centers_file, sep="\t")
+    df = load_dataframe(centers_file.getvalue())
     tab4.dataframe(pretty_dataframe(df), use_container_width=True)
 else:
     tab4.info("Upload data to view it.", icon="ℹ️")
 
 if prefs_file:
-    df = pd.read_csv(prefs_file, sep="\t")
+    df = load_dataframe(prefs_file.getvalue())
     tab5.dataframe(pretty_dataframe(df), use_container_width=True)
 else:
     tab5.info("Upload data to view it.", icon="ℹ️")
 
 
-# Function to run the center randomizer program
-def run_center_randomizer(schools_tsv, centers_tsv, prefs_tsv):
-    cmd = f"python school_center.py {schools_tsv} {centers_tsv} {prefs_tsv}"
-    subprocess.run(cmd, shell=True)
+# Function to run the center randomizer program in-process
+def run_center_randomizer(schools_file, centers_file, prefs_file):
+    result = allocate_centers(load_records(schools_file.getvalue()),
+                              load_records(centers_file.getvalue()),
+                              load_prefs(prefs_file.getvalue()))
+    school_center = pd.DataFrame(result.allocations, columns=ALLOCATION_COLUMNS)
+    school_center[["center_lat", "center_long"]] = school_center[["center_lat", "center_long"]].apply(pd.to_numeric)
+    return school_center, pd.DataFrame(result.distances, columns=DISTANCE_COLUMNS)
 
-#Function to filter the data
-def filter_data(df, filter_type, filter_value):
-    if filter_type in df.columns:
-        df = df[df[filter_type] == filter_value]
-        return df
-    else:
-        st.error(f"{filter_type} is not a valid column in the DataFrame.")
-        return pd.DataFrame() 
-    
 # Run logic after the button is clicked
 if calculate:
     st.session_state.calculate_clicked = True
     
-    def save_file_to_temp(file_obj):
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            file_obj.seek(0)  # Go to the start of the file
-            temp_file.write(file_obj.read())
-            return temp_file.name
-    
     if st.session_state.calculate_clicked:
         # Ensure all files are uploaded
         if schools_file and centers_file and prefs_file:
-            schools_path = save_file_to_temp(schools_file)
-            centers_path = save_file_to_temp(centers_file)
-            prefs_path = save_file_to_temp(prefs_file)
-
-            # Run the program with the temporary file paths
-            run_center_randomizer(schools_path, centers_path, prefs_path)
+            # Run the program on the uploaded data; results stay in this session's memory
+            school_center, school_center_distance = run_center_randomizer(schools_file, centers_file, prefs_file)
             st.toast("Calculation successful!", icon="🎉")
             st.session_state.calculation_completed = True
 
-            # Delete the temporary files after use
-            os.unlink(schools_path)
-            os.unlink(centers_path)
-            os.unlink(prefs_path)
-
-            # Set the paths for the output files[UPDATE LATER TO BE FLEXIBLE]
-            school_center_file = "results/school-center.tsv"
-            school_center_distance_file = "results/school-center-distance.tsv"
-
             # Store calculated data in session state
-            if school_center_file and school_center_distance_file:
-                st.session_state.calculated_data['school_center'] = school_center_file
-                st.session_state.calculated_data['school_center_distance'] = school_center_distance_file
-            else:
-                tab1.error("Calculated data not found", icon="🚨")
+            st.session_state.calculated_data['school_center'] = school_center
+            st.session_state.calculated_data['school_center_distance'] = school_center_distance
+            # Rows per school and center with their filter labels, built once so filtering is a lookup
+            st.session_state.calculated_data['filter_indexes'] = build_filter_indexes(school_center)
 
         else:
             st.sidebar.error("Please upload all required files.", icon="🚨")
@@ -152,37 +151,23 @@ elif not st.session_state.calculate_clicked:
 if st.session_state.calculate_clicked and st.session_state.calculation_completed:
     # Display data from session state
     if 'school_center' in st.session_state.calculated_data:
-        df_school_center = pd.read_csv(st.session_state.calculated_data['school_center'], sep="\t")
-        allowed_filter_types = ['school', 'center']
+        df_school_center = st.session_state.calculated_data['school_center']
+        allowed_filter_types = list(FILTER_COLUMNS)
         st.session_state.filter_type = tab1.radio("Choose a filter type:", allowed_filter_types, horizontal=True)
 
         # Display an input field based on the selected filter type
         if st.session_state.filter_type:
-         if st.session_state.filter_type == 'school':
-          # Create filter options with school name and code
-          filter_options = [f"{code} | {name}" for name, code in zip(df_school_center['school'].unique(), df_school_center['scode'].unique())]
-
-         elif st.session_state.filter_type == 'center':
-          # Create filter options with center name and code
-          filter_options = [f"{code} | {name}" for name, code in zip(df_school_center['center'].unique(), df_school_center['cscode'].unique())]
+         filter_index = st.session_state.calculated_data['filter_indexes'][st.session_state.filter_type]
 
-         # Display a selectbox for selection
-         st.session_state.filter_value = tab1.selectbox(f"Select a value for {st.session_state.filter_type.capitalize()}:", filter_options)
+         # Display a selectbox for selection, options are "code | name"
+         st.session_state.filter_value = tab1.selectbox(f"Select a value for {st.session_state.filter_type.capitalize()}:", filter_index.labels)
 
-         # Split the selected value to extract name and code
-         code, name = st.session_state.filter_value.split(' | ')
-
-         # Filter the DataFrame based on the selected type and value
-         filtered_df = filter_data(df_school_center, st.session_state.filter_type, name)
+         # Look up the rows of the selected school or center
+         filtered_df = filter_index.select(df_school_center, st.session_state.filter_value)
 
         with tab1:
           if st.session_state.filter_value:
-            # Remove thousand separator comma in scode and cscode 
-            styled_df  = pretty_dataframe(filtered_df).style.format({
-              "cscode": lambda x: '{:.0f}'.format(x),
-              "scode": lambda x: '{:.0f}'.format(x)
-            })
-            st.dataframe(styled_df , hide_index=True, use_container_width=True)
+            st.dataframe(pretty_dataframe(filtered_df), hide_index=True, use_container_width=True)
             st.markdown("<br/><br/>", unsafe_allow_html=True)
             st.subheader('Map', divider=divider_color)
             
@@ -207,44 +192,9 @@ if st.session_state.calculate_clicked and st.session_state.calculation_completed
             
             show_heatmap = st.checkbox("View allocation distribution", value=False)
             
-            # Maps setup
-            m = folium.Map(
-                location=[map_data['lat'].mean(), map_data['long'].mean()],         # Center map on the mean of the lat and long
-                zoom_start=custom_map_zoom(map_data['lat'].values, map_data['long'].values),
-                tiles=st.session_state.map_type
-            )
-            
-            fg = folium.FeatureGroup(name="Allocated Centers")
-            for _, row in map_data.iterrows(): 
-                fg.add_child(folium.Marker(
-                    location=[row['lat'], row['long']],
-                    tooltip=custom_map_tooltip(row),
-                    popup=custom_map_tooltip(row),
-                    icon= folium.CustomIcon(
-                        "https://cdn-icons-png.flaticon.com/256/4996/4996117.png" if row['type'] == "School" else "https://cdn-icons-png.flaticon.com/256/15092/15092199.png",
-                        icon_size=(38, 40),
-                        icon_anchor=(21, 38),
-                        shadow_image="https://static.vecteezy.com/system/resources/thumbnails/013/169/090/small_2x/oval-shadow-for-object-or-product-png.png",
-                        shadow_size=(28, 30) if row['type'] == "School" else (22, 24),
-                        shadow_anchor=(8, 19) if row['type'] == "School" else (8, 13),
-                    )
-                ))
-            m.add_child(fg)
-            
-            if show_heatmap:
-                max_allocation = map_data['allocation'].max()
-                for _, row in map_data[map_data.allocation > 0].iterrows():
-                    folium.CircleMarker(
-                        location=[row['lat'], row['long']],
-                        radius=row['allocation'] / max_allocation * 25,
-                        color="#3c844a",
-                        opacity=0.35,
-                        fill=True,
-                        fill_color="green",
-                        fill_opacity=0.3
-                    ).add_to(m)
-            
-            st_folium( m, width=1200, height=400)
+            # Built once per filter selection, map type and heatmap choice; reruns reuse it
+            m = cached_map(map_data, st.session_state.map_type, show_heatmap)
+            streamlit_folium.st_folium(m, width=1200, height=400, returned_objects=[])
          
           st.markdown("<br/><br/>", unsafe_allow_html=True)
           st.subheader('All Data', divider=divider_color)
@@ -253,7 +203,7 @@ if st.session_state.calculate_clicked and st.session_state.calculation_completed
         tab1.info("No calculated data available.", icon="ℹ️")
     
     if 'school_center_distance' in st.session_state.calculated_data:
-        df = pd.read_csv(st.session_state.calculated_data['school_center_distance'], sep="\t")
+        df = st.session_state.calculated_data['school_center_distance']
         tab2.dataframe(pretty_dataframe(df), use_container_width=True)
 
     else:
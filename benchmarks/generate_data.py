@@ -0,0 +1,112 @@
+"""Generate synthetic schools, centers and prefs TSVs at national scale for benchmarks."""
+
+import argparse
+import csv
+from os import makedirs, path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+SAMPLE_SCHOOLS_TSV = "sample_data/schools_grade12_2081.tsv"
+SAMPLE_CENTERS_TSV = "sample_data/centers_grade12_2081.tsv"
+ROOT_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+
+LAT_RANGE = (26.4, 30.4)        # Bounding box of Nepal
+LONG_RANGE = (80.1, 88.2)
+SCHOOLS_PER_CITY = 200          # Average no. of schools around each urban center
+CITY_SPREAD_KM = (1.5, 15)      # Range of the standard deviation of school locations around a city
+CENTER_FRACTION = 0.36          # Share of schools that are also centers, as in the sample data
+PREF_FRACTION = 0.01            # Share of schools with a preference row
+PREF_SCORES = [-5, -5, -2, -1, 1, 2]
+CAPACITY_MARGIN = 1.02          # Total center capacity of a city relative to its students
+KM_PER_DEGREE = 111.2
+
+SCHOOL_COLUMNS = ["scode", "count", "name-address", "lat", "long"]
+CENTER_COLUMNS = ["cscode", "capacity", "name", "address", "नाम", "ठेगाना", "lat", "long"]
+PREF_COLUMNS = ["scode", "cscode", "pref", "reason"]
+
+
+def sample_column(file_path: str, column: str) -> np.ndarray:
+    """
+    Return the integer values of a column of a sample TSV file.
+    """
+    with open(path.join(ROOT_DIR, file_path), "r", newline="", encoding="utf-8") as file:
+        return np.array([int(row[column]) for row in csv.DictReader(file, delimiter="\t")])
+
+
+def generate(num_schools: int, seed: int = 0) -> Tuple[List[Dict[str, str]], List[Dict[str, str]], List[Dict[str, str]]]:
+    """
+    Return synthetic (schools, centers, prefs) rows with the columns of the sample TSVs.
+
+    Schools cluster around urban centers whose sizes follow a Zipf law, student
+    counts and center capacities are resampled from the sample data, and the
+    capacity of the centers of each city covers its students with a small margin.
+    """
+    rng = np.random.default_rng(seed)
+    sample_counts = sample_column(SAMPLE_SCHOOLS_TSV, "count")
+    sample_capacities = sample_column(SAMPLE_CENTERS_TSV, "capacity")
+
+    num_cities = max(1, num_schools // SCHOOLS_PER_CITY)
+    city_lat = rng.uniform(*LAT_RANGE, num_cities)
+    city_long = rng.uniform(*LONG_RANGE, num_cities)
+    city_spread = rng.uniform(*CITY_SPREAD_KM, num_cities) / KM_PER_DEGREE
+    sizes = 1 / np.arange(1, num_cities + 1)
+    city = np.sort(rng.choice(num_cities, num_schools, p=sizes / sizes.sum()))
+
+    lat = rng.normal(city_lat[city], city_spread[city])
+    long = rng.normal(city_long[city], city_spread[city] / np.cos(np.radians(city_lat[city])))
+    counts = rng.choice(sample_counts, num_schools)
+    codes = [str(100000 + i) for i in range(num_schools)]
+    schools = [{"scode": codes[i], "count": str(counts[i]), "name-address": f"School {codes[i]}",
+                "lat": f"{lat[i]:.8f}", "long": f"{long[i]:.8f}"} for i in range(num_schools)]
+
+    is_center = rng.random(num_schools) < CENTER_FRACTION
+    is_center[np.unique(city, return_index=True)[1]] = True  # at least one center per city
+    center_indexes = np.flatnonzero(is_center)
+    capacities = rng.choice(sample_capacities, len(center_indexes)).astype(np.float64)
+    city_students = np.bincount(city, weights=counts, minlength=num_cities)
+    city_capacity = np.bincount(city[center_indexes], weights=capacities, minlength=num_cities)
+    capacities *= (city_students * CAPACITY_MARGIN / city_capacity)[city[center_indexes]]
+    centers = [{"cscode": codes[i], "capacity": str(max(1, round(capacity))), "name": f"CENTER {codes[i]}",
+                "address": f"CITY {city[i]}", "नाम": f"केन्द्र {codes[i]}", "ठेगाना": f"शहर {city[i]}",
+                "lat": schools[i]["lat"], "long": schools[i]["long"]}
+               for i, capacity in zip(center_indexes.tolist(), capacities.tolist())]
+
+    # prefs between schools and centers of the same city
+    prefs = []
+    for i in rng.choice(num_schools, int(num_schools * PREF_FRACTION), replace=False).tolist():
+        same_city = center_indexes[city[center_indexes] == city[i]]
+        j = int(rng.choice(same_city))
+        if j != i:
+            prefs.append({"scode": codes[i], "cscode": codes[j], "pref": str(rng.choice(PREF_SCORES)),
+                          "reason": "synthetic"})
+    return schools, centers, prefs
+
+
+def write_tsv(file_path: str, columns: List[str], rows: List[Dict[str, str]]):
+    with open(file_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=columns, delimiter="\t")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_dataset(output_dir: str, num_schools: int, seed: int = 0) -> Tuple[str, str, str]:
+    """
+    Write schools.tsv, centers.tsv and prefs.tsv to output_dir and return their paths.
+    """
+    makedirs(output_dir, exist_ok=True)
+    files = tuple(path.join(output_dir, name) for name in ("schools.tsv", "centers.tsv", "prefs.tsv"))
+    for file_path, columns, rows in zip(files, (SCHOOL_COLUMNS, CENTER_COLUMNS, PREF_COLUMNS),
+                                        generate(num_schools, seed)):
+        write_tsv(file_path, columns, rows)
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic schools, centers and prefs TSVs")
+    parser.add_argument("schools", type=int, help="No. of schools, e.g. 10000 to 100000")
+    parser.add_argument("-o", "--output", default="benchmarks/data", help="Output directory")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed of the generator")
+    args = parser.parse_args()
+    for file_path in write_dataset(args.output, args.schools, args.seed):
+        print(file_path)
@@ -0,0 +1,128 @@
+"""Time each phase of school_center.py on synthetic data and write the results as JSON."""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generate_data import write_dataset  # noqa: E402
+from school_center import (SOLVERS, AllocationParams, build_distance_engine, read_prefs, read_tsv,  # noqa: E402
+                           summarize, write_results)
+
+DEFAULT_SCALES = [10000, 30000, 100000]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Return the peak resident set size of this process so far in MB, None if unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # bytes on macOS, KB on Linux
+
+
+class PhaseTimer:
+    """
+    Record the wall time and the peak RSS at the end of named phases.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.peak_rss_mb: Dict[str, Optional[float]] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.seconds[name] = time.perf_counter() - start
+        self.peak_rss_mb[name] = peak_rss_mb()
+
+
+def run_phases(schools_tsv: str, centers_tsv: str, prefs_tsv: str, seed: float = 1,
+               solver: str = "greedy") -> Dict[str, any]:
+    """
+    Run the allocation pipeline on the given files one phase at a time and return the measurements.
+    Candidate ranking is timed on its own, the allocation phase ranks the candidates again.
+    """
+    timer = PhaseTimer()
+    params = AllocationParams()
+    with timer.phase("parse"):
+        schools = read_tsv(schools_tsv)
+        centers = read_tsv(centers_tsv)
+        prefs = read_prefs(prefs_tsv)
+    with timer.phase("distances"):
+        distance_engine = build_distance_engine(schools, centers, params, precompute=True)
+    with timer.phase("ranking"):
+        allocator = SOLVERS[solver](schools, centers, prefs, seed, params, distance_engine=distance_engine)
+        for school_index in allocator.order:
+            allocator.ranked_centers(school_index, params.abs_distance_threshold, True,
+                                     allocator.school_candidates(school_index))
+    with timer.phase("allocation"):
+        result = SOLVERS[solver](schools, centers, prefs, seed, params, distance_engine=distance_engine).run()
+    with timer.phase("output"), tempfile.TemporaryDirectory() as output_dir:
+        write_results(result, output_dir, "school-center.tsv")
+    summary = summarize(result, seed)
+    return {"schools": len(schools),
+            "centers": len(centers),
+            "prefs": sum(len(p) for p in prefs.values()),
+            "solver": solver,
+            "seconds": timer.seconds,
+            "total_seconds": sum(timer.seconds.values()),
+            "peak_rss_mb": timer.peak_rss_mb,
+            "allocated": summary["allocated"],
+            "not_assigned": summary["not_assigned"]}
+
+
+def run_scale(num_schools: int, data_seed: int = 0, seed: float = 1, solver: str = "greedy",
+              data_dir: Optional[str] = None) -> Dict[str, any]:
+    """
+    Generate a dataset of num_schools schools (kept in data_dir if given) and benchmark it.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = write_dataset(os.path.join(data_dir or tmp_dir, str(num_schools)), num_schools, data_seed)
+        return dict(run_phases(*files, seed=seed, solver=solver), scale=num_schools)
+
+
+def run_benchmarks(scales: List[int], data_seed: int = 0, seed: float = 1, solver: str = "greedy",
+                   data_dir: Optional[str] = None) -> List[Dict[str, any]]:
+    """
+    Benchmark every scale in a fresh worker process, so that peak RSS is measured per scale.
+    """
+    results = []
+    for num_schools in scales:
+        with multiprocessing.Pool(1) as pool:
+            results.append(pool.apply(run_scale, (num_schools, data_seed, seed, solver, data_dir)))
+        print(f"{num_schools} schools: " + ", ".join(f"{name} {seconds:.2f}s"
+                                                     for name, seconds in results[-1]["seconds"].items()))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark school_center.py on synthetic data")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)),
+                        type=lambda value: [int(v) for v in value.split(",")],
+                        help="Comma separated no. of schools per benchmark (default: %(default)s)")
+    parser.add_argument("--solver", choices=sorted(SOLVERS), default="greedy")
+    parser.add_argument("-s", "--seed", type=float, default=1, help="Seed of the allocation")
+    parser.add_argument("--data-seed", type=int, default=0, help="Seed of the data generator")
+    parser.add_argument("--data-dir", default=None, help="Keep the generated TSVs in this directory")
+    parser.add_argument("-o", "--output", default="benchmarks/results.json", help="JSON output file")
+    args = parser.parse_args()
+    results = run_benchmarks(args.scales, args.data_seed, args.seed, args.solver, args.data_dir)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
@@ -1,5 +1,21 @@
-from utils.custom_logger import configure_logging
-from typing import Dict, List
+from __future__ import annotations
+
+from utils.checkpoint import DEFAULT_INTERVAL_S, Checkpoint, inputs_key
+from utils.custom_logger import PROFILE_TARGET, configure_logging
+from utils.distance import DistanceEngine, parse_coords
+from utils.distance_cache import DEFAULT_CACHE_SIZE_MB, DistanceCache, update_distances
+from utils.distance_matrix import THRESHOLD_METRICS, MatrixDistanceEngine, read_distance_matrix
+from utils.lazy_import import lazy_import
+from utils.metrics import Metrics, write_profile
+from utils.min_cost_flow import solve_min_cost_flow
+from utils.sharding import connected_components, group_components
+from utils.spatial_index import CenterIndex
+from utils.tsv_reader import (CENTERS_SCHEMA, PREFS_SCHEMA, SCHOOLS_SCHEMA, Field, SchemaError, parse_table,
+                              read_table, typed_column)
+from utils.tsv_writer import COMPRESSION_SUFFIXES, write_tsv, zstd_available
+from utils.typed_output import parquet_available, write_parquet, write_sqlite
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
 from os import sys, path, makedirs
 import argparse
 import logging
@@ -7,100 +23,86 @@ import random
 import csv
 import math
 
+# heavy modules are imported on first use, so --help and argument errors return at once
+np = lazy_import('numpy')
+multiprocessing = lazy_import('multiprocessing')
+cProfile = lazy_import('cProfile')
+
 # Parameters
 PREF_DISTANCE_THRESHOLD = 2     # Preferred threshold distance in km
 ABS_DISTANCE_THRESHOLD = 7      # Absolute threshold distance in km
 MIN_STUDENT_IN_CENTER = 10      # Min. no of students from a school to be assigned to a center in normal circumstances
 STRETCH_CAPACITY_FACTOR = 0.02  # How much can center capacity be streched if need arises
 PREF_CUTOFF = -4                # Do not allocate students with pref score less than cutoff
+NEAREST_CENTERS_FALLBACK = 10   # No. of closest centers considered when none is within ABS_DISTANCE_THRESHOLD
+THRESHOLD_METRIC = 'matrix'     # With --distance-matrix: compare thresholds with 'matrix' or 'haversine' distances
+MOVED_TOLERANCE_KM = 1e-6       # Incremental mode: previous allocations whose distance changed more than this have moved
+FLOW_COST_UNIT_KM = 0.1        # Flow solver: costs are rounded to this many km, coarser units solve faster
+FLOW_DISTANCE_JITTER = 0.1      # Flow solver: distances are weighted by a random factor in [1, 1 + jitter)
+FLOW_PREF_COST_KM = 100         # Flow solver: cost of one preference score point in km
+FLOW_STRETCH_COST_KM = 10       # Flow solver: extra cost in km per student placed in stretched capacity
+FLOW_PER_CENTER_EXCESS_COST_KM = 5  # Flow solver: extra cost in km per student beyond calc_per_center at one center
+FLOW_UNASSIGNED_COST_KM = 10**6 # Flow solver: cost in km per student left unassigned
+FLOW_MAX_ARCS_PER_SCHOOL = 20   # Flow solver: only the cheapest arcs of a school are in the flow, the rest are used by repair
+FLOW_REPAIR_ROUNDS = 2          # Flow solver: times the flow is solved again without the arcs breaking the greedy rules
 DEFAULT_OUTPUT_DIR = 'results'  # Default directory to create output files if --output not provided
 DEFAULT_OUTPUT_FILENAME = 'school-center.tsv'
+DISTANCE_FILENAME = 'school-center-distance.tsv'
+BATCH_SUMMARY_FILENAME = 'batch-summary.tsv'
+CHECKPOINT_FILENAME = '.checkpoint.pkl'
+
+DISTANCE_COLUMNS = ["scode", "s_count", "school_name", "school_lat", "school_long",
+                    "cscode", "center_name", "center_address", "center_capacity", "distance_km"]
+ALLOCATION_COLUMNS = ["scode", "school", "cscode", "center", "center_address",
+                      "center_lat", "center_long", "allocation", "distance_km"]
+# Types of the non text columns, for typed output formats
+COLUMN_TYPES = {"s_count": int, "school_lat": float, "school_long": float, "center_capacity": int,
+                "center_lat": float, "center_long": float, "allocation": int, "distance_km": float}
+OUTPUT_FORMATS = ['tsv', 'parquet', 'sqlite']
+SUMMARY_COLUMNS = ["seed", "allocated", "not_assigned", "schools_not_assigned", "centers_used",
+                   "stretched_centers", "mean_centers_per_school", "max_centers_per_school",
+                   "mean_distance_km", "p50_distance_km", "p90_distance_km", "max_distance_km"]
 
-configure_logging()
 logger = logging.getLogger(__name__)
 
 
+def parse_tsv(file: Iterable[str]) -> List[Dict[str, str]]:
+    """
+    Parse the lines of school.tsv or centers.tsv into a list of dicts.
+    """
+    return parse_table(''.join(file)).rows()
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """
-    Calculate the great circle distance between two points
-    on the earth specified in decimal degrees
-    - Reference: https://en.wikipedia.org/wiki/Haversine_formula
-    """
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-
-    # Haversine formula 
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    radius_earth = 6371    # Average Radius of Earth in km
-    distance = radius_earth * c
-    return distance
-
-
-def centers_within_distance(school: Dict[str, str], centers: Dict[str, str], distance_threshold: float, relax_threshold: bool) -> List[Dict[str, any]]:
-    """
-    Return List of centers that are within given distance from school.
-    relax_threshold: If there are no centers within given distance return one that is closest
-    Returned params :
-            {'cscode', 'name', 'address', 'capacity', 'lat', 'long', 'distance_km'}
-
-    """
-    def center_to_dict(c, distance):
-        return {'cscode': c['cscode'], 
-                 'name': c['name'], 
-                 'address': c['address'], 
-                 'capacity': c['capacity'], 
-                 'lat': c['lat'], 
-                 'long': c['long'], 
-                 'distance_km': distance}
-
-    def sort_key(c):
-        # intent: sort by preference score DESC then by distance_km ASC
-        # leaky abstraction - sorted requires a single numeric value for each element
-        return c['distance_km'] * random.uniform(1, 5) - get_pref(school['scode'], c['cscode']) * 100
-    
-    school_lat = school.get('lat')
-    school_long = school.get('long')
-    if len(school_lat) == 0 or len(school_long) == 0:
-        return []
-
-    qualifying_centers = []
-    # nearest_distance = None
-    # nearest_center = None
-    for c in centers:
-        if school['scode'] == c['cscode'] \
-            or is_allocated(c['cscode'], s['scode']) \
-            or get_pref(school['scode'], c['cscode']) <= PREF_CUTOFF:
-            continue
-        distance = haversine_distance(float(school_lat), float(
-            school_long), float(c.get('lat')), float(c.get('long')))
-        # if nearest_center is None or distance < nearest_distance:
-        #     nearest_center = c
-        #     nearest_distance = distance
-        qualifying_centers.append(center_to_dict(c, distance))
-
-    within_distance = [ c for c in qualifying_centers if c['distance_km'] <= distance_threshold ]
-    if len(within_distance) > 0:
-        return sorted(within_distance, key=sort_key) 
-    elif relax_threshold: # if there are no centers within given threshold, return one that is closest
-        return sorted(qualifying_centers, key=sort_key) 
-    else: 
-        return []
 
-def read_tsv(file_path: str) -> List[Dict[str, str]]:
+def parse_prefs(file: Iterable[str]) -> Dict[str, Dict[str, int]]:
+    """
+    Parse the lines of pref.tsv into a dict of dicts key scode and then cscode
+    """
+    table = parse_table(''.join(file), PREFS_SCHEMA)
+    return prefs_from_table(table.text['scode'], table.text['cscode'], table.typed['pref'].tolist())
+
+
+def prefs_from_table(scodes: List[str], cscodes: List[str], scores: List[int]) -> Dict[str, Dict[str, int]]:
+    """
+    Build the dict of dicts key scode and then cscode, summing the scores of repeated pairs.
+    """
+    prefs = {}
+    for scode, cscode, score in zip(scodes, cscodes, scores):
+        school_prefs = prefs.setdefault(scode, {})
+        school_prefs[cscode] = school_prefs.get(cscode, 0) + score
+    return prefs
+
+
+def read_tsv(file_path: str, schema: Sequence[Field] = ()) -> List[Dict[str, str]]:
     """
     Function to read the tsv file for school.tsv and centers.tsv
     Return a list of schools/centers as dicts.
+    schema: Columns to validate, e.g. SCHOOLS_SCHEMA; every bad row is logged before exiting
     """
-    data = []
     try:
-        with open(file_path, 'r', newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file, delimiter='\t')
-            for row in reader:
-                data.append(dict(row))
+        data = read_table(file_path, schema).rows()
+    except SchemaError as e:
+        logger.error(str(e))
+        sys.exit(1)
     except FileNotFoundError as e:
         logger.error(f"File '{file_path} : {e}' not found.")
         sys.exit(1)
@@ -121,18 +123,12 @@ def read_prefs(file_path: str) -> Dict[str, Dict[str, int]]:
     Read the tsv file for pref.tsv
     Return a dict of dicts key scode and then cscode
     """
-    prefs = {}
     try:
-        with open(file_path, 'r', newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file, delimiter='\t')
-            for row in reader:
-                if prefs.get(row['scode']):
-                    if prefs[row['scode']].get(row['cscode']):
-                        prefs[row['scode']][row['cscode']] += int(row['pref'])
-                    else:
-                        prefs[row['scode']][row['cscode']] = int(row['pref'])
-                else:
-                    prefs[row['scode']] = {row['cscode']: int(row['pref'])}
+        table = read_table(file_path, PREFS_SCHEMA)
+        prefs = prefs_from_table(table.text['scode'], table.text['cscode'], table.typed['pref'].tolist())
+    except SchemaError as e:
+        logger.error(str(e))
+        sys.exit(1)
     except FileNotFoundError as e:
         logger.error(f"File '{file_path} :{e}' not found.")
         sys.exit(1)
@@ -148,20 +144,6 @@ def read_prefs(file_path: str) -> Dict[str, Dict[str, int]]:
     return prefs
 
 
-def get_pref(scode, cscode) -> int:
-    """
-    Return the preference score for the given school and center.
-    If the school has no preference for the center return 0.
-    """
-    if prefs.get(scode):
-        if prefs[scode].get(cscode):
-            return prefs[scode][cscode]
-        else:
-            return 0
-    else:
-        return 0
-
-
 def calc_per_center(count: int) -> int:
     """
     Return the number of students that can be allocated to a center based on student count.
@@ -174,166 +156,1246 @@ def calc_per_center(count: int) -> int:
         return 200
 
 
-def school_sort_key(s):
-    # intent: allocate students from schools with large students count first
-    # to avoid excessive fragmentation
-    return (-1 if int(s['count']) > 500 else 1) * random.uniform(1, 100)
+@dataclass
+class AllocationParams:
+    """
+    Tunable parameters of an allocation run, defaulting to the module level parameters.
+    """
+    pref_distance_threshold: float = PREF_DISTANCE_THRESHOLD
+    abs_distance_threshold: float = ABS_DISTANCE_THRESHOLD
+    min_student_in_center: int = MIN_STUDENT_IN_CENTER
+    stretch_capacity_factor: float = STRETCH_CAPACITY_FACTOR
+    pref_cutoff: int = PREF_CUTOFF
+    nearest_centers_fallback: int = NEAREST_CENTERS_FALLBACK
+    threshold_metric: str = THRESHOLD_METRIC
+
+
+def build_distance_engine(schools: List[Dict[str, str]], centers: List[Dict[str, str]],
+                          params: Optional[AllocationParams] = None,
+                          distance_cache: Optional[DistanceCache] = None,
+                          precompute: bool = False,
+                          distance_matrix: Optional[Dict[str, Dict[str, float]]] = None) -> DistanceEngine:
+    """
+    Return a distance engine over the given schools and centers with a spatial index of centers.
+    distance_cache: Load the distances within abs_distance_threshold from this cache
+    precompute: Compute the distances within abs_distance_threshold up front, for
+                engines shared by many allocations
+    distance_matrix: Precomputed distances as returned by read_distance_matrix, used instead
+                     of haversine for the pairs it lists
+    """
+    params = params or AllocationParams()
+    center_index = CenterIndex(parse_coords(centers), cell_km=params.abs_distance_threshold)
+    distance_engine = DistanceEngine(parse_coords(schools), center_index.coords, index=center_index)
+    if distance_cache is not None:
+        distance_engine.sparse = distance_cache.load(distance_engine, params.abs_distance_threshold)
+    elif precompute:
+        distance_engine.sparse, _, _ = update_distances(distance_engine, params.abs_distance_threshold)
+    if distance_matrix is not None:
+        # the straight-line sparse distances (and cache) stay as they are, the matrix is layered on top
+        distance_engine = MatrixDistanceEngine.from_engine(distance_engine, distance_matrix, schools, centers,
+                                                           params.threshold_metric)
+    return distance_engine
+
+
+@dataclass
+class AllocationResult:
+    """
+    In-memory outcome of an allocation run.
+    allocations: Rows of school-center.tsv keyed by ALLOCATION_COLUMNS
+    distances: Rows of school-center-distance.tsv keyed by DISTANCE_COLUMNS
+    centers_remaining_cap: Remaining capacity per cscode (-ve if stretched capacity is used)
+    remaining: Count of students not allocated
+    unassigned: Count of students not allocated per scode, for schools with any
+    """
+    allocations: List[Dict[str, any]] = field(default_factory=list)
+    distances: List[Dict[str, any]] = field(default_factory=list)
+    centers_remaining_cap: Dict[str, int] = field(default_factory=dict)
+    remaining: int = 0
+    unassigned: Dict[str, int] = field(default_factory=dict)
+
+
+class AllocationStore:
+    """
+    Sparse school x center allocation counts keyed by positions in schools and centers.
+    """
+
+    def __init__(self, num_centers: int):
+        self.num_centers = num_centers
+        self.counts: Dict[int, int] = {}            # school_index * num_centers + center_index -> count
+        self.schools_at: Dict[int, set] = {}        # center_index -> school indexes allocated to it
+
+    def add(self, school_index: int, center_index: int, count: int):
+        key = school_index * self.num_centers + center_index
+        self.counts[key] = self.counts.get(key, 0) + count
+        self.schools_at.setdefault(center_index, set()).add(school_index)
+
+    def get(self, school_index: int, center_index: int) -> int:
+        return self.counts.get(school_index * self.num_centers + center_index, 0)
+
+    def items(self):
+        """
+        Yield (school_index, center_index, count) of every allocation.
+        """
+        for key, count in self.counts.items():
+            yield *divmod(key, self.num_centers), count
+
+    def __len__(self):
+        return len(self.counts)
+
+
+def log_left(school: Dict[str, str], left: int, num_centers: int):
+    """
+    Warn that students of a school are left unallocated, with the numbers as extra fields for --log-jsonl.
+    """
+    logger.warning(f"{left}/{school['count']} left for {school['scode']} {school['name-address']} centers: {num_centers}",
+                   extra={'scode': school['scode'], 'left': int(left), 'count': int(school['count']),
+                          'centers': num_centers})
+
+
+class Allocator:
+    """
+    Allocate exam centers to the students of each school.
+
+    schools, centers: Lists of dicts as returned by read_tsv
+    prefs: Preference scores as returned by read_prefs
+    seed: Initialization seed for the Random Number Generator
+    distance_engine: Prebuilt engine for these schools and centers, shared
+                     across allocations of the same inputs
+    metrics: Collects phase timings and per-school counters of the run
+    distance_top: Keep only this many best ranked candidates per school in
+                  result.distances (0 keeps none, None keeps all)
+    checkpoint: Save the state of run() to resume it after a crash
+    distance_matrix: Precomputed distances as returned by read_distance_matrix
+    """
+
+    def __init__(self, schools: List[Dict[str, str]], centers: List[Dict[str, str]],
+                 prefs: Dict[str, Dict[str, int]], seed: Optional[float] = None,
+                 params: Optional[AllocationParams] = None, distance_cache: Optional[DistanceCache] = None,
+                 distance_engine: Optional[DistanceEngine] = None, metrics: Optional[Metrics] = None,
+                 distance_top: Optional[int] = None, checkpoint: Optional[Checkpoint] = None,
+                 distance_matrix: Optional[Dict[str, Dict[str, float]]] = None):
+        self.params = params or AllocationParams()
+        self.checkpoint = checkpoint
+        self.metrics = metrics or Metrics()
+        self.distance_top = distance_top
+        self.random = random.Random(seed)
+        self.schools = schools
+        # array backed state indexed by positions in schools and centers
+        self.counts = typed_column(schools, 'count').astype(np.int32)
+        self.capacity = typed_column(centers, 'capacity').astype(np.int32)
+        self.order = sorted(range(len(schools)), key=lambda i: self.school_sort_key(self.counts[i]))
+        self.centers = centers
+        self.prefs = prefs
+        with self.metrics.phase('distances'):
+            self.distance_engine = distance_engine or build_distance_engine(
+                schools, centers, self.params, distance_cache, distance_matrix=distance_matrix)
+
+        # batched draws for ranking centers, seeded from the seeded rng
+        self.np_random = np.random.default_rng(self.random.getrandbits(128))
+
+        self.remaining_cap = self.capacity.copy()
+        self.allocations = AllocationStore(len(centers))    # to track mutual allocations
+        self.center_positions = {}
+        for i, c in enumerate(centers):
+            self.center_positions.setdefault(c['cscode'], i)
+        # center of the same institution as each school (cscode == scode), -1 if none
+        self.school_centers = np.array([self.center_positions.get(s['scode'], -1) for s in schools], dtype=np.intp)
+
+    @property
+    def centers_remaining_cap(self) -> Dict[str, int]:
+        """
+        Remaining capacity per cscode (-ve if stretched capacity is used).
+        """
+        return {c['cscode']: cap for c, cap in zip(self.centers, self.remaining_cap.tolist())}
+
+    def school_sort_key(self, count: int):
+        # intent: allocate students from schools with large students count first
+        # to avoid excessive fragmentation
+        return (-1 if count > 500 else 1) * self.random.uniform(1, 100)
+
+    def allocate(self, school_index: int, center_index: int, count: int):
+        """
+        Allocate the given number of students to the given center.
+        """
+        self.allocations.add(school_index, center_index, count)
+        self.remaining_cap[center_index] -= count
+
+    def is_allocated(self, school_index: int, center_index: int) -> bool:
+        """
+        Return true if the given school has been allocated to the given center.
+        """
+        return self.allocations.get(school_index, center_index) > 0
+
+    def pref_vector(self, scode: str) -> np.ndarray:
+        """
+        Return the preference scores of the school for every center, aligned with centers.
+        """
+        prefs = np.zeros(len(self.centers))
+        for cscode, pref in self.prefs.get(scode, {}).items():
+            if cscode in self.center_positions:
+                prefs[self.center_positions[cscode]] = pref
+        return prefs
 
+    def qualifying(self, school_index: int, center_indexes: np.ndarray, prefs: np.ndarray):
+        """
+        Return the given centers that the school may be allocated to with their exact
+        distances and preference scores: excludes the school itself, centers whose
+        school already has students allocated to this school and prefs at or below pref_cutoff.
+        """
+        own_center = self.school_centers[school_index]
+        excluded = [own_center]
+        if own_center >= 0:
+            # centers of schools that already have students allocated to this school
+            excluded.extend(self.school_centers[list(self.allocations.schools_at.get(own_center, ()))])
+        center_indexes = np.asarray(center_indexes, dtype=np.intp)
+        keep = (prefs[center_indexes] > self.params.pref_cutoff) & ~np.isin(center_indexes, excluded)
+        center_indexes = center_indexes[keep]
+        with self.metrics.phase('distances'):
+            distances = np.array(self.distance_engine.exact(school_index, center_indexes))
+        return center_indexes, distances, prefs[center_indexes]
 
-def allocate(scode: str, cscode: str, count: int):
+    def within_threshold(self, school_index: int, center_indexes: np.ndarray, distances: np.ndarray,
+                         distance_threshold: float) -> np.ndarray:
+        """
+        Return a mask of the centers within the threshold in the engine's threshold metric.
+        """
+        return self.distance_engine.threshold_distances(school_index, center_indexes, distances) <= distance_threshold
+
+    def school_candidates(self, school_index: int):
+        """
+        Return (center indexes, distances, prefs) of qualifying centers within
+        abs_distance_threshold of the school, shared by both threshold passes.
+        """
+        if np.isnan(self.distance_engine.school_coords[school_index]).any():
+            empty = np.empty(0, dtype=np.intp)
+            return empty, np.empty(0), np.empty(0)
+        threshold = self.params.abs_distance_threshold
+        with self.metrics.phase('distances'):
+            within = self.distance_engine.within(school_index, threshold)
+        center_indexes, distances, prefs = self.qualifying(
+            school_index, within, self.pref_vector(self.schools[school_index]['scode']))
+        keep = self.within_threshold(school_index, center_indexes, distances, threshold)
+        return center_indexes[keep], distances[keep], prefs[keep]
+
+    def nearest_candidates(self, school_index: int):
+        """
+        Return (center indexes, distances, prefs) of the nearest_centers_fallback
+        closest qualifying centers of the school.
+        """
+        wanted = self.params.nearest_centers_fallback
+        prefs = self.pref_vector(self.schools[school_index]['scode'])
+        k = wanted
+        while True:
+            with self.metrics.phase('distances'):
+                nearest = self.distance_engine.nearest(school_index, k)
+            nearest = self.qualifying(school_index, nearest, prefs)
+            if len(nearest[0]) >= wanted or k >= len(self.centers):
+                return nearest
+            k *= 2  # some of the closest centers were excluded, look further
+
+    def rank(self, center_indexes: np.ndarray, distances: np.ndarray, prefs: np.ndarray):
+        """
+        Order centers by preference score DESC then by randomly weighted distance ASC.
+        Return the ordered center indexes and distances.
+        """
+        # leaky abstraction - a single numeric key for each center
+        keys = distances * self.np_random.uniform(1, 5, len(center_indexes)) - prefs * 100
+        order = np.argsort(keys, kind='stable')
+        return center_indexes[order], distances[order]
+
+    def ranked_centers(self, school_index: int, distance_threshold: float, relax_threshold: bool, candidates=None):
+        """
+        Return the ranked indexes and distances of centers within given distance from school.
+        relax_threshold: If there are no centers within given distance return the
+                         nearest_centers_fallback closest ones
+        candidates: school_candidates of the school, if already computed
+        """
+        with self.metrics.phase('ranked_centers'):
+            if np.isnan(self.distance_engine.school_coords[school_index]).any():
+                return np.empty(0, dtype=np.intp), np.empty(0)
+            scode = self.schools[school_index]['scode']
+            if candidates is None or distance_threshold > self.params.abs_distance_threshold:
+                with self.metrics.phase('distances'):
+                    within = self.distance_engine.within(school_index, distance_threshold)
+                candidates = self.qualifying(school_index, within, self.pref_vector(scode))
+            center_indexes, distances, prefs = candidates
+            keep = self.within_threshold(school_index, center_indexes, distances, distance_threshold)
+            if keep.any():
+                return self.rank(center_indexes[keep], distances[keep], prefs[keep])
+            elif relax_threshold: # if there are no centers within given threshold, return the closest ones
+                return self.rank(*self.nearest_candidates(school_index))
+            else: 
+                return np.empty(0, dtype=np.intp), np.empty(0)
+
+    def centers_within_distance(self, school: Dict[str, str], school_index: int, distance_threshold: float,
+                                relax_threshold: bool) -> List[Dict[str, any]]:
+        """
+        Return List of centers that are within given distance from school.
+        school_index: Position of the school in schools (and row in the distance engine)
+        relax_threshold: If there are no centers within given distance return the
+                         nearest_centers_fallback closest ones
+        Returned params :
+                {'cscode', 'name', 'address', 'capacity', 'lat', 'long', 'distance_km'}
+
+        """
+        center_indexes, distances = self.ranked_centers(school_index, distance_threshold, relax_threshold)
+        return [{'cscode': self.centers[i]['cscode'],
+                 'name': self.centers[i]['name'],
+                 'address': self.centers[i]['address'],
+                 'capacity': self.centers[i]['capacity'],
+                 'lat': self.centers[i]['lat'],
+                 'long': self.centers[i]['long'],
+                 'distance_km': d} for i, d in zip(center_indexes.tolist(), distances.tolist())]
+
+    def distance_row(self, school_index: int, center_index: int, distance: float) -> Dict[str, any]:
+        """
+        Return the school-center-distance.tsv row of a candidate center.
+        """
+        s, c = self.schools[school_index], self.centers[center_index]
+        return {'scode': s['scode'],
+                's_count': s['count'],
+                'school_name': s['name-address'],
+                'school_lat': s['lat'],
+                'school_long': s['long'],
+                'cscode': c['cscode'],
+                'center_name': c['name'],
+                'center_address': c['address'],
+                'center_capacity': c['capacity'],
+                'distance_km': distance}
+
+    def allocation_row(self, school_index: int, center_index: int, distance: float) -> Dict[str, any]:
+        """
+        Return the school-center.tsv row of an allocated center.
+        """
+        s, c = self.schools[school_index], self.centers[center_index]
+        return {'scode': s['scode'],
+                'school': s['name-address'],
+                'cscode': c['cscode'],
+                'center': c['name'],
+                'center_address': c['address'],
+                'center_lat': c['lat'],
+                'center_long': c['long'],
+                'allocation': self.allocations.get(school_index, center_index),
+                'distance_km': distance}
+
+    def allocate_school(self, school_index: int, result: AllocationResult, to_allot: Optional[int] = None) -> int:
+        """
+        Allocate centers to the students of one school and append its output rows to result.
+        to_allot: No. of students to allocate if not the whole school (per center sizes still
+                  follow the school's student count)
+        Return the count of students that could not be allocated.
+        """
+        params = self.params
+        s = self.schools[school_index]
+        remaining_cap = self.remaining_cap
+        metrics = self.metrics
+        candidates = self.school_candidates(school_index)
+        metrics.count(s['scode'], 'candidates', len(candidates[0]))
+        center_indexes, distances = self.ranked_centers(
+            school_index, params.pref_distance_threshold, False, candidates)
+        num_centers_for_school = len(center_indexes)
+        per_center = calc_per_center(int(self.counts[school_index]))
+        if to_allot is None:
+            to_allot = int(self.counts[school_index])
+
+        allocated_centers = {}  # center index -> distance_km
+
+        # per_center = math.ceil(to_allot / min(calc_num_centers(to_allot), len(centers_for_school)))
+        for rank, (ci, distance) in enumerate(zip(center_indexes.tolist(), distances.tolist())):
+            if self.distance_top is None or rank < self.distance_top:
+                result.distances.append(self.distance_row(school_index, ci, distance))
+            center_cap = int(remaining_cap[ci])
+            next_allot = min(to_allot, per_center, max(center_cap, params.min_student_in_center))
+            if to_allot > 0 and next_allot > 0 and center_cap >= next_allot:
+                allocated_centers[ci] = distance
+                self.allocate(school_index, ci, next_allot)
+                to_allot -= next_allot
+
+        if to_allot > 0:  # try again with relaxed constraints and more capacity at centers
+            with metrics.phase('relaxed_pass'):
+                left_for_relaxed_pass = to_allot
+                center_indexes, distances = self.ranked_centers(
+                    school_index, params.abs_distance_threshold, True, candidates)
+                for ci, distance in zip(center_indexes.tolist(), distances.tolist()):
+                    stretched_capacity = math.floor(
+                        int(self.capacity[ci]) * params.stretch_capacity_factor + int(remaining_cap[ci]))
+                    next_allot = min(to_allot, max(
+                        stretched_capacity, params.min_student_in_center))
+                    if next_allot > 0 and stretched_capacity >= next_allot:
+                        allocated_centers[ci] = distance
+                        stretched = next_allot - max(0, int(remaining_cap[ci]))
+                        metrics.count(s['scode'], 'stretched_students', max(0, stretched))
+                        self.allocate(school_index, ci, next_allot)
+                        to_allot -= next_allot
+                        if to_allot == 0:
+                            break
+                metrics.count(s['scode'], 'relaxed_pass')
+                metrics.count(s['scode'], 'relaxed_pass_students', left_for_relaxed_pass - to_allot)
+
+        for ci, distance in allocated_centers.items():
+            result.allocations.append(self.allocation_row(school_index, ci, distance))
+
+        if to_allot > 0:
+            log_left(s, to_allot, num_centers_for_school)
+        return to_allot
+
+    def state(self, position: int, result: AllocationResult) -> Dict[str, any]:
+        """
+        Return everything run() needs to continue from the given position in order. The order itself
+        is saved too, as an unseeded run draws another one when resumed.
+        """
+        return {'position': position,
+                'order': self.order,
+                'result': result,
+                'allocations': self.allocations,
+                'remaining_cap': self.remaining_cap,
+                'random': self.random.getstate(),
+                'np_random': self.np_random.bit_generator.state}
+
+    def restore(self, state: Dict[str, any]):
+        self.order = state['order']
+        self.allocations = state['allocations']
+        self.remaining_cap = state['remaining_cap']
+        self.random.setstate(state['random'])
+        self.np_random.bit_generator.state = state['np_random']
+        return state['position'], state['result']
+
+    def run(self) -> AllocationResult:
+        """
+        Allocate every school in school_sort_key order and return the results.
+        With a checkpoint, resume from its saved state and save the state periodically.
+        """
+        checkpoint = self.checkpoint
+        start, result = 0, AllocationResult()
+        state = checkpoint.load() if checkpoint else None
+        if state is not None:
+            start, result = self.restore(state)
+        for position in range(start, len(self.order)):
+            if checkpoint and position > start and checkpoint.due():
+                checkpoint.save(self.state(position, result))
+            school_index = self.order[position]
+            left = self.allocate_school(school_index, result)
+            if left > 0:
+                result.remaining += left
+                result.unassigned[self.schools[school_index]['scode']] = left
+        result.centers_remaining_cap = self.centers_remaining_cap
+        return result
+
+
+class FlowAllocator(Allocator):
     """
-    Allocate the given number of students to the given center.
+    Allocate exam centers by solving a min-cost flow over all schools at once.
+
+    Schools are sources with their student count, centers are sinks with their
+    capacity plus stretch_capacity_factor of extra capacity at FLOW_STRETCH_COST_KM
+    per student. A school-center arc exists for qualifying centers within
+    abs_distance_threshold (or the nearest_centers_fallback closest ones) and costs
+    the randomly weighted distance minus the preference score; students beyond
+    calc_per_center at one center cost FLOW_PER_CENTER_EXCESS_COST_KM more each.
+    Students that cannot be placed flow through a FLOW_UNASSIGNED_COST_KM arc.
+
+    Only the FLOW_MAX_ARCS_PER_SCHOOL cheapest arcs of a school are in the flow.
+
+    The flow cannot express two rules of the greedy solver, so its solution is
+    repaired: of two schools allocated to each other's center the arc of one is
+    dropped, chosen at random unless it is the last center of one of them, and a
+    school keeps at most one center with fewer than min_student_in_center of its
+    students, the arcs of the others are dropped. The flow is solved again without
+    the dropped arcs up to FLOW_REPAIR_ROUNDS times; the students of arcs still
+    breaking the rules after that, and those left unassigned, are placed by
+    place_released over all candidate arcs, under the rules of the greedy relaxed pass.
     """
-    if scode not in allocations:
-        allocations[scode] = {cscode: count}
-    elif cscode not in allocations[scode]:
-        allocations[scode][cscode] = count
+
+    def arc_cost(self, distances: np.ndarray, prefs: np.ndarray) -> np.ndarray:
+        """
+        Return integer arc costs in FLOW_COST_UNIT_KM: randomly weighted distance minus preference score.
+        """
+        weights = self.np_random.uniform(1, 1 + FLOW_DISTANCE_JITTER, len(distances))
+        return np.rint((distances * weights - prefs * FLOW_PREF_COST_KM) / FLOW_COST_UNIT_KM).astype(np.int64)
+
+    def candidate_arcs(self):
+        """
+        Collect the school-center arcs of every school in allocation order into flat arrays
+        (school, center, distance, cost) and return them with the [start, end) range of each school's arcs.
+        """
+        schools, centers, distances, costs = [], [], [], []
+        spans = {}
+        for school_index in self.order:
+            center_indexes, school_distances, prefs = self.school_candidates(school_index)
+            if len(center_indexes) == 0 and not np.isnan(self.distance_engine.school_coords[school_index]).any():
+                center_indexes, school_distances, prefs = self.nearest_candidates(school_index)
+            self.metrics.count(self.schools[school_index]['scode'], 'candidates', len(center_indexes))
+            spans[school_index] = (len(centers), len(centers) + len(center_indexes))
+            schools.extend([school_index] * len(center_indexes))
+            centers.extend(center_indexes.tolist())
+            distances.extend(school_distances.tolist())
+            costs.extend(self.arc_cost(school_distances, prefs).tolist())
+        return (np.array(schools, dtype=np.intp), np.array(centers, dtype=np.intp),
+                np.array(distances, dtype=np.float64), np.array(costs, dtype=np.int64), spans)
+
+    def solve_flow(self, arc_schools: np.ndarray, arc_centers: np.ndarray, arc_costs: np.ndarray,
+                   alive: np.ndarray) -> np.ndarray:
+        """
+        Return the students sent along every arc by a min-cost flow over the alive arcs.
+        """
+        num_schools, num_centers = len(self.schools), len(self.centers)
+        sink = num_schools + num_centers
+        counts = self.counts.astype(np.int64)
+        capacity = self.capacity.astype(np.int64)
+        schools, centers = arc_schools[alive], arc_centers[alive]
+        # arc costs must be non-negative for the python solver, shifting every arc out of a school keeps the optimum
+        offset = max(0, -int(arc_costs.min(initial=0)))
+        costs = arc_costs[alive] + offset
+        per_center = np.minimum(counts[schools], self.per_center[schools])
+        excess = counts[schools] - per_center
+        over = excess > 0
+        school_nodes, center_nodes = np.arange(num_schools), num_schools + np.arange(num_centers)
+        tails = np.concatenate((schools, schools[over], school_nodes, center_nodes, center_nodes))
+        heads = np.concatenate((num_schools + centers, num_schools + centers[over], np.full(num_schools, sink),
+                                np.full(num_centers, sink), np.full(num_centers, sink)))
+        capacities = np.concatenate((per_center, excess[over], counts, capacity,
+                                     np.floor(capacity * self.params.stretch_capacity_factor).astype(np.int64)))
+        unit_costs = np.concatenate((
+            costs, costs[over] + round(FLOW_PER_CENTER_EXCESS_COST_KM / FLOW_COST_UNIT_KM),
+            np.full(num_schools, round(FLOW_UNASSIGNED_COST_KM / FLOW_COST_UNIT_KM) + offset),
+            np.zeros(num_centers, dtype=np.int64),
+            np.full(num_centers, round(FLOW_STRETCH_COST_KM / FLOW_COST_UNIT_KM))))
+        supplies = np.concatenate((counts, np.zeros(num_centers, dtype=np.int64), [-counts.sum()]))
+        flows = solve_min_cost_flow(sink + 1, tails, heads, capacities, unit_costs, supplies)
+
+        students = flows[:len(schools)].copy()
+        students[over] += flows[len(schools):len(schools) + int(over.sum())]
+        arc_flow = np.zeros(len(arc_schools), dtype=np.int64)
+        arc_flow[alive] = students
+        return arc_flow
+
+    def mutual_arcs(self, arc_schools: List[int], arc_centers: List[int], arc_flow: np.ndarray) -> List[int]:
+        """
+        Return one used arc of every two schools allocated to each other's center, chosen at random
+        unless the other school has no other center.
+        """
+        center_schools = self.center_schools
+        used = np.flatnonzero(arc_flow > 0).tolist()
+        used_arcs = {(arc_schools[i], arc_centers[i]): i for i in used}
+        centers_used = np.bincount(np.asarray(arc_schools)[used], minlength=len(self.schools))
+        dropped = set()
+        for i in used:
+            school_index, other = arc_schools[i], center_schools.get(arc_centers[i])
+            j = used_arcs.get((other, int(self.school_centers[school_index])))
+            if j is None or i in dropped or j in dropped:
+                continue
+            # never take away a school's last center, otherwise pick at random
+            if centers_used[other] == 1 or (centers_used[school_index] > 1 and self.random.random() < 0.5):
+                drop, school = i, school_index
+            else:
+                drop, school = j, other
+            dropped.add(drop)
+            centers_used[school] -= 1
+        return sorted(dropped)
+
+    def small_arcs(self, spans: Dict[int, tuple], arc_flow: np.ndarray) -> List[int]:
+        """
+        Return the used arcs with fewer than min_student_in_center students, all but the largest of each school.
+        """
+        small = (arc_flow > 0) & (arc_flow < self.params.min_student_in_center)
+        dropped = []
+        for school_index in self.order:
+            start, end = spans[school_index]
+            arcs = start + np.flatnonzero(small[start:end])
+            if len(arcs) > 1:
+                dropped.extend(arcs[np.argsort(arc_flow[arcs], kind='stable')[:-1]].tolist())
+        return dropped
+
+    def place_released(self, school_index: int, arcs: List[int], arc_centers: List[int], to_allot: int) -> int:
+        """
+        Place students released from the flow solution at the school's centers in cost order, first
+        those it already has students at, as the greedy relaxed pass does: within stretched capacity,
+        new centers with at least min_student_in_center students unless the rest is fewer, and never
+        at the center of a school that has students at this school's center. A school gets a second
+        center with fewer than min_student_in_center students only if the rest cannot be placed otherwise.
+        Return the count of students that could not be placed.
+        """
+        params = self.params
+        own_center = int(self.school_centers[school_index])
+        center_schools = self.center_schools
+        placed = [i for i in arcs if self.is_allocated(school_index, arc_centers[i])]
+        arcs = placed + [i for i in arcs if i not in placed]
+        has_small = any(self.allocations.get(school_index, arc_centers[i]) < params.min_student_in_center
+                        for i in placed)
+        for allow_small in (not has_small, True):
+            for i in arcs:
+                if to_allot == 0:
+                    return 0
+                ci = arc_centers[i]
+                other = center_schools.get(ci)
+                if other is not None and own_center >= 0 and self.is_allocated(other, own_center):
+                    continue
+                stretched_capacity = math.floor(
+                    int(self.capacity[ci]) * params.stretch_capacity_factor + int(self.remaining_cap[ci]))
+                new_small = False
+                if self.is_allocated(school_index, ci):
+                    next_allot = min(to_allot, stretched_capacity)
+                else:
+                    next_allot = min(to_allot, max(stretched_capacity, params.min_student_in_center))
+                    new_small = next_allot < params.min_student_in_center
+                    if new_small and not allow_small:
+                        continue
+                if next_allot > 0 and stretched_capacity >= next_allot:
+                    self.allocate(school_index, ci, next_allot)
+                    to_allot -= next_allot
+                    allow_small = allow_small and not new_small
+        return to_allot
+
+    def run(self) -> AllocationResult:
+        params = self.params
+        self.per_center = np.array([calc_per_center(int(count)) for count in self.counts], dtype=np.int64)
+        self.center_schools = {c: i for i, c in enumerate(self.school_centers.tolist()) if c >= 0}
+        arc_schools, arc_centers, arc_distances, arc_costs, spans = self.candidate_arcs()
+        school_list, center_list = arc_schools.tolist(), arc_centers.tolist()
+        alive = np.zeros(len(arc_schools), dtype=bool)
+        for start, end in spans.values():
+            alive[start + np.argsort(arc_costs[start:end], kind='stable')[:FLOW_MAX_ARCS_PER_SCHOOL]] = True
+        with self.metrics.phase('flow_solve'):
+            for repair_round in range(FLOW_REPAIR_ROUNDS + 1):
+                arc_flow = self.solve_flow(arc_schools, arc_centers, arc_costs, alive)
+                broken = self.mutual_arcs(school_list, center_list, arc_flow) + self.small_arcs(spans, arc_flow)
+                if not broken or repair_round == FLOW_REPAIR_ROUNDS:
+                    break
+                alive[broken] = False
+        logger.info(f"Flow solved in {repair_round + 1} rounds, {len(broken)} arcs left to repair")
+
+        # release the students of arcs still breaking the mutual and min_student_in_center rules
+        released = self.counts.astype(np.int64) - np.bincount(arc_schools, arc_flow, len(self.schools)).astype(np.int64)
+        for i in broken:
+            released[school_list[i]] += arc_flow[i]
+            arc_flow[i] = 0
+        distance_list, cost_list, flow_list = arc_distances.tolist(), arc_costs.tolist(), arc_flow.tolist()
+        for i in np.flatnonzero(arc_flow > 0).tolist():
+            self.allocate(school_list[i], center_list[i], flow_list[i])
+        by_cost = {school_index: sorted(range(*spans[school_index]), key=cost_list.__getitem__)
+                   for school_index in self.order}
+        for school_index in self.order:
+            if released[school_index]:
+                self.metrics.count(self.schools[school_index]['scode'], 'flow_released_students',
+                                   int(released[school_index]))
+                self.place_released(school_index, by_cost[school_index], center_list, int(released[school_index]))
+
+        result = AllocationResult()
+        for school_index in self.order:
+            arcs = by_cost[school_index]
+            preferred = [i for i in arcs if distance_list[i] <= params.pref_distance_threshold]
+            result.distances.extend(self.distance_row(school_index, center_list[i], distance_list[i])
+                                    for i in preferred[:self.distance_top])
+            allocated = 0
+            for i in arcs:
+                if self.is_allocated(school_index, center_list[i]):
+                    allocated += self.allocations.get(school_index, center_list[i])
+                    result.allocations.append(self.allocation_row(school_index, center_list[i], distance_list[i]))
+            left = int(self.counts[school_index]) - allocated
+            if left > 0:
+                s = self.schools[school_index]
+                log_left(s, left, len(arcs))
+                result.remaining += left
+                result.unassigned[s['scode']] = left
+        result.centers_remaining_cap = self.centers_remaining_cap
+        return result
+
+
+class IncrementalAllocator(Allocator):
+    """
+    Update a previous allocation (rows of school-center.tsv) after edits to the inputs.
+
+    Previous allocations stay unless the new inputs invalidate them: removed schools
+    or centers, prefs now at or below pref_cutoff, moved schools or centers, mutual
+    allocations, fewer students than allocated, or less (stretched) capacity than
+    allocated. Only the released students and new students are placed again, in
+    school_sort_key order and under the same constraints as a full run.
+    """
+
+    def __init__(self, schools: List[Dict[str, str]], centers: List[Dict[str, str]],
+                 prefs: Dict[str, Dict[str, int]], previous: List[Dict[str, str]],
+                 seed: Optional[float] = None, params: Optional[AllocationParams] = None, **kwargs):
+        super().__init__(schools, centers, prefs, seed, params, **kwargs)
+        self.previous = previous
+        self.released: Dict[str, int] = {}     # reason -> no. of students released
+
+    def release(self, reason: str, count: int):
+        self.released[reason] = self.released.get(reason, 0) + count
+
+    def kept_allocations(self) -> List[List]:
+        """
+        Return [school index, center index, count, distance] of the previous rows that
+        are still valid, in previous order, and count the released students by reason.
+        """
+        school_positions = {}
+        for i, s in enumerate(self.schools):
+            school_positions.setdefault(s['scode'], i)
+        kept = []
+        for row in self.previous:
+            count = int(row['allocation'])
+            si, ci = school_positions.get(row['scode']), self.center_positions.get(row['cscode'])
+            if si is None:
+                self.release('school removed', count)
+            elif ci is None:
+                self.release('center removed', count)
+            elif ci == self.school_centers[si]:
+                self.release('own center', count)
+            elif self.prefs.get(row['scode'], {}).get(row['cscode'], 0) <= self.params.pref_cutoff:
+                self.release('pref cutoff', count)
+            else:
+                kept.append([si, ci, count, float(row['distance_km'])])
+        if not kept:
+            return kept
+
+        # moved schools or centers: the distance no longer matches the previous one
+        school_indexes, center_indexes, _, previous_distances = zip(*kept)
+        distances = self.distance_engine.pairs(school_indexes, center_indexes)
+        moved = ~(np.abs(distances - previous_distances) <= MOVED_TOLERANCE_KM)
+        for k, is_moved in zip(kept, moved.tolist()):
+            if is_moved:
+                self.release('moved', k[2])
+                k[2] = 0
+
+        # mutual allocations (possible after codes change): the later row goes
+        school_of_center = {c: i for i, c in enumerate(self.school_centers.tolist()) if c >= 0}
+        pairs = set()
+        for k in kept:
+            other, own = school_of_center.get(k[1]), self.school_centers[k[0]]
+            if k[2] > 0 and other is not None and (other, own) in pairs:
+                self.release('mutual', k[2])
+                k[2] = 0
+            elif k[2] > 0:
+                pairs.add((k[0], k[1]))
+
+        # fewer students than allocated: release from the school's last rows
+        allocated = np.zeros(len(self.schools), dtype=np.int64)
+        for si, _, count, _ in kept:
+            allocated[si] += count
+        for k in reversed(kept):
+            excess = min(k[2], int(allocated[k[0]] - self.counts[k[0]]))
+            if excess > 0:
+                self.release('count decreased', excess)
+                k[2] -= excess
+                allocated[k[0]] -= excess
+
+        # more students than the stretched capacity of the center: release its last rows
+        limit = np.floor(self.capacity * (1 + self.params.stretch_capacity_factor)).astype(np.int64)
+        used = np.zeros(len(self.centers), dtype=np.int64)
+        for _, ci, count, _ in kept:
+            used[ci] += count
+        for k in reversed(kept):
+            excess = min(k[2], int(used[k[1]] - limit[k[1]]))
+            if excess > 0:
+                self.release('capacity decreased', excess)
+                k[2] -= excess
+                used[k[1]] -= excess
+        return [k for k in kept if k[2] > 0]
+
+    def run(self) -> AllocationResult:
+        """
+        Keep the valid previous allocations, place the other students and return the
+        results in previous order (new schools last). result.distances only has the
+        candidates of the schools placed again.
+        """
+        centers_of = {}     # school index -> {center index: distance}, in output order
+        allocated = np.zeros(len(self.schools), dtype=np.int64)
+        for si, ci, count, distance in self.kept_allocations():
+            self.allocate(si, ci, count)
+            centers_of.setdefault(si, {})[ci] = distance
+            allocated[si] += count
+
+        result = AllocationResult()
+        placed = AllocationResult()
+        affected = [si for si in self.order if allocated[si] < self.counts[si]]
+        for si in affected:
+            left = self.allocate_school(si, placed, int(self.counts[si] - allocated[si]))
+            if left > 0:
+                result.remaining += left
+                result.unassigned[self.schools[si]['scode']] = left
+        school_positions = {s['scode']: i for i, s in reversed(list(enumerate(self.schools)))}
+        for row in placed.allocations:
+            centers = centers_of.setdefault(school_positions[row['scode']], {})
+            centers.setdefault(self.center_positions[row['cscode']], row['distance_km'])
+        for si, centers in centers_of.items():
+            result.allocations.extend(self.allocation_row(si, ci, distance) for ci, distance in centers.items())
+        result.distances = placed.distances
+        result.centers_remaining_cap = self.centers_remaining_cap
+        logger.info(f"Kept {int(allocated.sum())} previously allocated students, released "
+                    f"{sum(self.released.values())} {self.released}, placed {len(affected)} schools again")
+        return result
+
+
+SOLVERS = {'greedy': Allocator, 'flow': FlowAllocator}
+
+
+def allocate_centers(schools: List[Dict[str, str]], centers: List[Dict[str, str]],
+                     prefs: Dict[str, Dict[str, int]], seed: Optional[float] = None,
+                     params: Optional[AllocationParams] = None, solver: str = 'greedy', **kwargs) -> AllocationResult:
+    """
+    Allocate centers to schools in memory and return the results.
+    solver: 'greedy' single pass in school_sort_key order, or 'flow' min-cost flow
+    """
+    return SOLVERS[solver](schools, centers, prefs, seed, params, **kwargs).run()
+
+
+def shard_inputs(schools: List[Dict[str, str]], centers: List[Dict[str, str]],
+                 params: Optional[AllocationParams] = None,
+                 distance_cache: Optional[DistanceCache] = None,
+                 distance_matrix: Optional[Dict[str, Dict[str, float]]] = None) -> List[Dict[str, np.ndarray]]:
+    """
+    Split schools and centers into independent shards: connected components of the
+    graph linking every school to the centers within abs_distance_threshold (its
+    nearest_centers_fallback closest ones if there are none, and the matrix pairs
+    within the threshold) and to its own center.
+    Return {'schools', 'centers'} position arrays per shard, ordered by first school.
+    Centers that no school can reach are left out.
+    """
+    params = params or AllocationParams()
+    distance_engine = build_distance_engine(schools, centers, params, distance_cache, precompute=True,
+                                            distance_matrix=distance_matrix)
+    sparse = distance_engine.sparse
+    num_schools = len(schools)
+    sources = [np.repeat(np.arange(num_schools), np.diff(sparse.indptr))]
+    targets = [num_schools + sparse.indices.astype(np.intp)]
+    for school_index in np.flatnonzero(np.diff(sparse.indptr) == 0).tolist():
+        if not np.isnan(distance_engine.school_coords[school_index]).any():
+            nearest = distance_engine.nearest(school_index, params.nearest_centers_fallback)
+            sources.append(np.full(len(nearest), school_index))
+            targets.append(num_schools + np.asarray(nearest, dtype=np.intp))
+    listed_schools, listed_centers = distance_engine.listed_within(params.abs_distance_threshold)
+    sources.append(listed_schools)
+    targets.append(num_schools + listed_centers)
+    # a school and its own center must stay together to rule out mutual allocation
+    center_positions = {c['cscode']: i for i, c in reversed(list(enumerate(centers)))}
+    own = [(i, center_positions[s['scode']]) for i, s in enumerate(schools) if s['scode'] in center_positions]
+    if own:
+        own_schools, own_centers = zip(*own)
+        sources.append(np.array(own_schools))
+        targets.append(num_schools + np.array(own_centers))
+    labels = connected_components(num_schools + len(centers), np.concatenate(sources), np.concatenate(targets))
+    return [{'schools': nodes[nodes < num_schools], 'centers': nodes[nodes >= num_schools] - num_schools}
+            for nodes in group_components(labels) if nodes[0] < num_schools]
+
+
+# Inputs shared read-only by the shard worker processes, set before the pool starts
+_shard_inputs = None
+
+
+def _init_shard_worker(inputs):
+    global _shard_inputs
+    _shard_inputs = inputs
+
+
+def _run_shard(shard_number: int) -> AllocationResult:
+    schools, centers, prefs, seed, params, solver, distance_top, distance_matrix, shards = _shard_inputs
+    shard = shards[shard_number]
+    # every shard gets its own seed so that results do not depend on scheduling
+    shard_seed = None if seed is None else f"{seed}:{shard_number}"
+    return SOLVERS[solver]([schools[i] for i in shard['schools'].tolist()],
+                           [centers[i] for i in shard['centers'].tolist()],
+                           prefs, shard_seed, params, distance_top=distance_top, distance_matrix=distance_matrix).run()
+
+
+def allocate_sharded(schools: List[Dict[str, str]], centers: List[Dict[str, str]],
+                     prefs: Dict[str, Dict[str, int]], seed: Optional[float] = None,
+                     params: Optional[AllocationParams] = None, solver: str = 'greedy',
+                     jobs: Optional[int] = None, distance_cache: Optional[DistanceCache] = None,
+                     distance_top: Optional[int] = None, checkpoint: Optional[Checkpoint] = None,
+                     distance_matrix: Optional[Dict[str, Dict[str, float]]] = None) -> AllocationResult:
+    """
+    Allocate every shard of shard_inputs independently on a pool of jobs worker
+    processes and merge the results in shard order, so that a given seed always
+    gives the same allocation.
+    checkpoint: Skip the shards done by the run it saved and save the done shards periodically
+    """
+    params = params or AllocationParams()
+    shards = shard_inputs(schools, centers, params, distance_cache, distance_matrix)
+    logger.info(f"{len(shards)} shards, largest has {max((len(s['schools']) for s in shards), default=0)} schools")
+    inputs = (schools, centers, prefs, seed, params, solver, distance_top, distance_matrix, shards)
+    # largest shards first to balance the workers, merged back in shard order below
+    by_size = sorted(range(len(shards)), key=lambda i: -len(shards[i]['schools']))
+    shard_results = resume_items(by_size, jobs, _run_shard, _init_shard_worker, inputs, checkpoint)
+
+    result = AllocationResult()
+    result.centers_remaining_cap = {c['cscode']: int(c['capacity']) for c in centers}
+    for shard_number in range(len(shards)):
+        shard_result = shard_results[shard_number]
+        result.allocations.extend(shard_result.allocations)
+        result.distances.extend(shard_result.distances)
+        result.centers_remaining_cap.update(shard_result.centers_remaining_cap)
+        result.remaining += shard_result.remaining
+        result.unassigned.update(shard_result.unassigned)
+    return result
+
+
+def write_results(result: AllocationResult, output_dirname: str, output_filename: str,
+                  distance_file: bool = True, compression: Optional[str] = None, output_format: str = 'tsv'):
+    """
+    Write the allocations and the intermediate school-center distances.
+    distance_file: Also write school-center-distance.tsv
+    compression: 'gzip' or 'zstd' to compress both TSV files (adds .gz or .zst)
+    output_format: 'tsv', 'parquet' (one .parquet file instead of each TSV) or
+                   'sqlite' (one .sqlite database with allocations and distances tables)
+    Parquet and SQLite columns are typed (codes stay text) and SQLite tables are indexed on scode and cscode.
+    """
+    makedirs(output_dirname, exist_ok=True) # Create the output directory if not exists
+    tables = {'distances': (DISTANCE_FILENAME, DISTANCE_COLUMNS, result.distances),
+              'allocations': (output_filename, ALLOCATION_COLUMNS, result.allocations)}
+    if not distance_file:
+        del tables['distances']
+    if output_format == 'sqlite':
+        write_sqlite(path.join(output_dirname, path.splitext(output_filename)[0] + '.sqlite'),
+                     {name: (columns, COLUMN_TYPES, rows) for name, (_, columns, rows) in tables.items()})
+        return
+    for filename, columns, rows in tables.values():
+        if output_format == 'parquet':
+            write_parquet(path.join(output_dirname, path.splitext(filename)[0] + '.parquet'),
+                          (columns, COLUMN_TYPES, rows))
+        else:
+            write_tsv(path.join(output_dirname, filename), columns, rows, compression)
+
+
+def weighted_percentile(values: List[float], weights: List[int], q: float) -> float:
+    """
+    Return the q-th (0-100) percentile of values where each value is repeated weight times.
+    """
+    total = sum(weights)
+    if total == 0:
+        return 0.0
+    cumulative = 0
+    for value, weight in sorted(zip(values, weights)):
+        cumulative += weight
+        if cumulative >= total * q / 100:
+            return value
+    return value
+
+
+def summarize(result: AllocationResult, seed: Optional[float] = None) -> Dict[str, any]:
+    """
+    Return fairness measures of an allocation keyed by SUMMARY_COLUMNS: student
+    weighted distances, fragmentation of schools across centers and unassigned students.
+    """
+    distances = [row['distance_km'] for row in result.allocations]
+    counts = [row['allocation'] for row in result.allocations]
+    allocated = sum(counts)
+    centers_per_school = {}
+    for row in result.allocations:
+        centers_per_school[row['scode']] = centers_per_school.get(row['scode'], 0) + 1
+    return {'seed': seed,
+            'allocated': allocated,
+            'not_assigned': result.remaining,
+            'schools_not_assigned': len(result.unassigned),
+            'centers_used': len({row['cscode'] for row in result.allocations}),
+            'stretched_centers': sum(1 for v in result.centers_remaining_cap.values() if v < 0),
+            'mean_centers_per_school': len(result.allocations) / len(centers_per_school) if centers_per_school else 0,
+            'max_centers_per_school': max(centers_per_school.values(), default=0),
+            'mean_distance_km': sum(d * n for d, n in zip(distances, counts)) / allocated if allocated else 0,
+            'p50_distance_km': weighted_percentile(distances, counts, 50),
+            'p90_distance_km': weighted_percentile(distances, counts, 90),
+            'max_distance_km': max(distances, default=0)}
+
+
+def parse_seeds(value: str) -> List[int]:
+    """
+    Parse a seed list like '1..500' or '1,5,10..20' (ranges are inclusive).
+    """
+    seeds = []
+    try:
+        for part in value.split(','):
+            if '..' in part:
+                start, end = part.split('..')
+                seeds.extend(range(int(start), int(end) + 1))
+            elif part.strip():
+                seeds.append(int(part))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid seed list '{value}', expected e.g. 1..500 or 1,5,10..20")
+    return seeds
+
+
+def imap_workers(function, items: List, jobs: Optional[int], initializer, inputs):
+    """
+    Yield function(item) for every item in order, computed on a pool of jobs worker processes
+    (in this process if jobs is 1) after initializer(inputs) ran in each of them.
+    """
+    if jobs == 1:
+        initializer(inputs)
+        yield from map(function, items)
+        return
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # workers inherit the inputs from the parent's memory
+        initializer(inputs)
+        pool = multiprocessing.get_context('fork').Pool(jobs)
     else:
-        allocations[scode][cscode] += count
+        pool = multiprocessing.Pool(jobs, initializer=initializer, initargs=(inputs,))
+    with pool:
+        yield from pool.imap(function, items)
 
 
-def is_allocated(scode1: str, scode2: str) -> bool:
+def resume_items(items: List, jobs: Optional[int], function, initializer, inputs,
+                 checkpoint: Optional[Checkpoint] = None) -> Dict[any, any]:
     """
-    Return true if the given school has been allocated to the given center.
+    Return {item: function(item)} for every item, computed by imap_workers. With a checkpoint,
+    items done by the run it saved are not computed again and done items are saved periodically.
     """
-    return allocations.get(scode1, {}).get(scode2) is not None
+    done = (checkpoint.load() if checkpoint else None) or {}
+    todo = [item for item in items if item not in done]
+    for item, value in zip(todo, imap_workers(function, todo, jobs, initializer, inputs)):
+        done[item] = value
+        if checkpoint and checkpoint.due():
+            checkpoint.save(done)
+    return done
 
 
-parser = argparse.ArgumentParser(
-    prog='center randomizer',
-    description='Assigns centers to exam centers to students')
-parser.add_argument('schools_tsv', default='schools.tsv',
-                    help="Tab separated (TSV) file containing school details")
-parser.add_argument('centers_tsv', default='centers.tsv',
-                    help="Tab separated (TSV) file containing center details")
-parser.add_argument('prefs_tsv', default='prefs.tsv',
-                    help="Tab separated (TSV) file containing preference scores")
-parser.add_argument('-o', '--output', default = DEFAULT_OUTPUT_FILENAME, 
-                    help='Output file')
-parser.add_argument('-s', '--seed', action='store', metavar='SEEDVALUE',
-                     default=None, type=float, 
-                     help='Initialization seed for Random Number Generator')
+# Inputs shared read-only by the batch worker processes, set before the pool starts
+_batch_inputs = None
 
-args = parser.parse_args()
 
-random = random.Random(args.seed) #overwrites the random module to use seeded rng
+def _init_batch_worker(inputs):
+    global _batch_inputs
+    _batch_inputs = inputs
 
-schools = sorted(read_tsv(args.schools_tsv), key= school_sort_key)
-centers = read_tsv(args.centers_tsv)
-centers_remaining_cap = {c['cscode']: int(c['capacity']) for c in centers}
-prefs = read_prefs(args.prefs_tsv)
 
-remaining = 0       # stores count of non allocated students
-allocations = {}    # to track mutual allocations
+def _run_batch_seed(seed: int):
+    schools, centers, prefs, params, solver, distance_top, distance_engine, keep_seeds = _batch_inputs
+    # only kept seeds are written, the others need no candidate rows
+    result = SOLVERS[solver](schools, centers, prefs, float(seed), params, distance_engine=distance_engine,
+                             distance_top=distance_top if seed in keep_seeds else 0).run()
+    return summarize(result, seed), (result if seed in keep_seeds else None)
 
 
-def get_output_dir():
-    dirname = path.dirname(args.output)
+def run_batch(schools: List[Dict[str, str]], centers: List[Dict[str, str]], prefs: Dict[str, Dict[str, int]],
+              seeds: List[int], jobs: Optional[int] = None, keep_seeds: Iterable[int] = (),
+              params: Optional[AllocationParams] = None, distance_cache: Optional[DistanceCache] = None,
+              solver: str = 'greedy', distance_top: Optional[int] = None, checkpoint: Optional[Checkpoint] = None,
+              distance_matrix: Optional[Dict[str, Dict[str, float]]] = None):
+    """
+    Run one allocation per seed on a pool of jobs worker processes.
+    Distances are computed once and shared with the workers (copy-on-write where fork is available).
+    Yield (summary, result) per seed in the given order; result is None unless the seed is in keep_seeds.
+    checkpoint: Skip the seeds done by the run it saved and save the done seeds periodically
+    """
+    params = params or AllocationParams()
+    distance_engine = build_distance_engine(schools, centers, params, distance_cache, precompute=True,
+                                            distance_matrix=distance_matrix)
+    inputs = (schools, centers, prefs, params, solver, distance_top, distance_engine, set(keep_seeds))
+    if checkpoint is None:
+        yield from imap_workers(_run_batch_seed, seeds, jobs, _init_batch_worker, inputs)
+        return
+    done = resume_items(seeds, jobs, _run_batch_seed, _init_batch_worker, inputs, checkpoint)
+    yield from (done[seed] for seed in seeds)
+
+
+def log_summary(result: AllocationResult):
+    logger.info("Remaining capacity at each center (remaining_capacity cscode):")
+    logger.info(sorted([(v, k)
+                for k, v in result.centers_remaining_cap.items() if v != 0]))
+    logger.info(
+        f"Total remaining capacity across all centers: {sum({k:v for k, v in result.centers_remaining_cap.items() if v != 0}.values())}")
+    logger.info(f"Students not assigned: {result.remaining}")
+
+
+def get_output_dir(output: str) -> str:
+    dirname = path.dirname(output)
     if(dirname):
         return dirname
     else:
         return DEFAULT_OUTPUT_DIR
 
-def get_output_filename():
-    basename = path.basename(args.output)
+
+def get_output_filename(output: str) -> str:
+    basename = path.basename(output)
     if(basename):
         return basename
     else:
         return DEFAULT_OUTPUT_FILENAME
 
 
-output_dirname = get_output_dir()
-output_filename = get_output_filename()
-makedirs(output_dirname, exist_ok=True) # Create the output directory if not exists
-
-with open(path.join(output_dirname, "school-center-distance.tsv"), 'w', encoding='utf-8') as intermediate_file, \
-open(path.join(output_dirname, output_filename), 'w', encoding='utf-8') as a_file:
-    writer = csv.writer(intermediate_file, delimiter="\t")
-    writer.writerow(["scode", 
-                     "s_count", 
-                     "school_name", 
-                     "school_lat", 
-                     "school_long",
-                     "cscode", 
-                     "center_name", 
-                     "center_address", 
-                     "center_capacity", 
-                     "distance_km"])
-
-    allocation_file = csv.writer(a_file, delimiter='\t')
-    allocation_file.writerow(["scode", 
-                              "school", 
-                              "cscode", 
-                              "center", 
-                              "center_address", 
-                              "center_lat",
-                              "center_long",
-                              "allocation", 
-                              "distance_km"])
-
-    for s in schools:
-        centers_for_school = centers_within_distance(
-            s, centers, PREF_DISTANCE_THRESHOLD, False)
-        to_allot = int(s['count'])
-        per_center = calc_per_center(to_allot)
-
-        allocated_centers = {}
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='center randomizer',
+        description='Assigns centers to exam centers to students')
+    parser.add_argument('schools_tsv', default='schools.tsv',
+                        help="Tab separated (TSV) file containing school details")
+    parser.add_argument('centers_tsv', default='centers.tsv',
+                        help="Tab separated (TSV) file containing center details")
+    parser.add_argument('prefs_tsv', default='prefs.tsv',
+                        help="Tab separated (TSV) file containing preference scores")
+    parser.add_argument('-o', '--output', default = DEFAULT_OUTPUT_FILENAME, 
+                        help='Output file')
+    parser.add_argument('-s', '--seed', action='store', metavar='SEEDVALUE',
+                         default=None, type=float, 
+                         help='Initialization seed for Random Number Generator')
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default='greedy',
+                        help='greedy: single pass over schools (default), flow: min-cost flow over all schools at once')
+    parser.add_argument('--sharded', action='store_true',
+                        help='Split schools and centers into independent regional shards and allocate them in '
+                             'parallel (see --jobs)')
+    parser.add_argument('--previous', metavar='FILE', default=None,
+                        help='Incremental mode: keep the allocations of this previous school-center.tsv that the '
+                             'inputs still allow and only place the released and new students')
+    parser.add_argument('--seeds', metavar='SEEDS', default=None, type=parse_seeds,
+                        help='Batch mode: run one allocation per seed, e.g. 1..500 or 1,5,10..20, and '
+                             f'write a summary per seed to {BATCH_SUMMARY_FILENAME}')
+    parser.add_argument('-j', '--jobs', metavar='N', default=None, type=int,
+                        help='No. of worker processes in batch or sharded mode (default: no. of CPUs)')
+    parser.add_argument('--keep-seeds', metavar='SEEDS', default=[], type=parse_seeds,
+                        help='Batch mode: also write the allocation files of these seeds to seed-<SEED>/')
+    parser.add_argument('--no-distance-file', action='store_true',
+                        help=f'Do not write {DISTANCE_FILENAME}')
+    parser.add_argument('--distance-file-top', metavar='K', default=None, type=int,
+                        help=f'Write only the K best ranked candidate centers per school to {DISTANCE_FILENAME}')
+    parser.add_argument('--compress', choices=sorted(COMPRESSION_SUFFIXES), default=None,
+                        help='Compress the output TSV files (zstd needs the zstandard package)')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='tsv', dest='output_format',
+                        help='tsv (default), parquet: typed .parquet files (needs pyarrow), or sqlite: one typed '
+                             '.sqlite database with allocations and distances tables indexed on scode and cscode')
+    parser.add_argument('--profile', action='store_true',
+                        help=f'Profile the run with cProfile, write the stats to {path.relpath(PROFILE_TARGET)} and log '
+                             'the phase metrics')
+    parser.add_argument('--metrics-out', metavar='FILE', default=None,
+                        help='Write phase timings, call counts and per-school counters as JSON to FILE')
+    parser.add_argument('--log-queue', action='store_true',
+                        help='Format and write log records on a background thread, off the allocation loop')
+    parser.add_argument('--log-jsonl', metavar='FILE', default=None,
+                        help='Also append warnings, e.g. per school students left unallocated, as JSON lines to FILE')
+    parser.add_argument('--distance-cache', metavar='DIR', default=None,
+                        help='Directory to cache computed school-center distances across runs')
+    parser.add_argument('--distance-cache-size', metavar='MB', default=DEFAULT_CACHE_SIZE_MB, type=int,
+                        help=f'Size limit of the distance cache directory (default: {DEFAULT_CACHE_SIZE_MB} MB)')
+    parser.add_argument('--distance-matrix', metavar='FILE', default=None,
+                        help='TSV of precomputed scode, cscode, distance (e.g. road km or travel minutes) used '
+                             'instead of straight-line distance for the pairs it lists')
+    parser.add_argument('--threshold-metric', choices=THRESHOLD_METRICS, default=THRESHOLD_METRIC,
+                        help='Compare the distance thresholds with the matrix distances or straight-line '
+                             f'haversine km (default: {THRESHOLD_METRIC})')
+    parser.add_argument('--checkpoint-interval', metavar='SECONDS', default=None, type=float,
+                        help=f'Save a checkpoint to {CHECKPOINT_FILENAME} in the output directory at most every '
+                             f'SECONDS (default with --resume: {DEFAULT_INTERVAL_S})')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume from the checkpoint of an interrupted run with the same inputs and options')
+    return parser
 
-        # per_center = math.ceil(to_allot / min(calc_num_centers(to_allot), len(centers_for_school)))
-        for c in centers_for_school:
-            writer.writerow([s['scode'], 
-                             s['count'], 
-                             s['name-address'], 
-                             s['lat'], 
-                             s['long'],
-                             c['cscode'], 
-                             c['name'], 
-                             c['address'], 
-                             c['capacity'], 
-                             c['distance_km']])
-            next_allot = min(to_allot, per_center, max(
-                centers_remaining_cap[c['cscode']], MIN_STUDENT_IN_CENTER))
-            if to_allot > 0 and next_allot > 0 and centers_remaining_cap[c['cscode']] >= next_allot:
-                allocated_centers[c['cscode']] = c
-                allocate(s['scode'], c['cscode'], next_allot)
-                # allocation.writerow([s['scode'], s['name-address'], c['cscode'], c['name'], c['address'], next_allot, c['distance_km']])
-                to_allot -= next_allot
-                centers_remaining_cap[c['cscode']] -= next_allot
 
-        if to_allot > 0:  # try again with relaxed constraints and more capacity at centers
-            expanded_centers = centers_within_distance(
-                s, centers, ABS_DISTANCE_THRESHOLD, True)
-            for c in expanded_centers:
-                stretched_capacity = math.floor(
-                    int(c['capacity']) * STRETCH_CAPACITY_FACTOR + centers_remaining_cap[c['cscode']])
-                next_allot = min(to_allot, max(
-                    stretched_capacity, MIN_STUDENT_IN_CENTER))
-                if to_allot > 0 and next_allot > 0 and stretched_capacity >= next_allot:
-                    allocated_centers[c['cscode']] = c
-                    allocate(s['scode'], c['cscode'], next_allot)
-                    # allocation.writerow([s['scode'], s['name-address'], c['cscode'], c['name'], c['address'], next_allot, c['distance_km']])
-                    to_allot -= next_allot
-                    centers_remaining_cap[c['cscode']] -= next_allot
-
-        for c in allocated_centers.values():
-            allocation_file.writerow([s['scode'], 
-                                      s['name-address'], 
-                                      c['cscode'], 
-                                      c['name'],
-                                      c['address'], 
-                                      c['lat'],
-                                      c['long'],
-                                      allocations[s['scode']][c['cscode']], 
-                                      c['distance_km']])
+def distance_top(args) -> Optional[int]:
+    """
+    Return the no. of candidate rows per school to keep for the distance file.
+    """
+    return 0 if args.no_distance_file else args.distance_file_top
 
-        if to_allot > 0:
-            remaining += to_allot
-            logger.warning(
-                f"{to_allot}/{s['count']} left for {s['scode']} {s['name-address']} centers: {len(centers_for_school)}")
 
-    logger.info("Remaining capacity at each center (remaining_capacity cscode):")
-    logger.info(sorted([(v, k)
-                for k, v in centers_remaining_cap.items() if v != 0]))
-    logger.info(
-        f"Total remaining capacity across all centers: {sum({k:v for k, v in centers_remaining_cap.items() if v != 0}.values())}")
-    logger.info(f"Students not assigned: {remaining}")
+def build_checkpoint(args, schools, centers, prefs, params: AllocationParams,
+                     distance_matrix: Optional[Dict[str, Dict[str, float]]] = None) -> Optional[Checkpoint]:
+    """
+    Return the checkpoint of this run if --checkpoint-interval or --resume is given, keyed by
+    every input and option that changes its outcome.
+    """
+    if args.checkpoint_interval is None and not args.resume:
+        return None
+    output_dirname = get_output_dir(args.output)
+    makedirs(output_dirname, exist_ok=True)
+    key = inputs_key(args.seed, args.seeds, args.keep_seeds, args.solver, args.sharded, distance_top(args),
+                     asdict(params), schools, centers, prefs, distance_matrix)
+    interval = DEFAULT_INTERVAL_S if args.checkpoint_interval is None else args.checkpoint_interval
+    return Checkpoint(path.join(output_dirname, CHECKPOINT_FILENAME), key, args.resume, interval)
+
+
+def main_batch(args, schools, centers, prefs, distance_cache, checkpoint: Optional[Checkpoint] = None,
+               params: Optional[AllocationParams] = None,
+               distance_matrix: Optional[Dict[str, Dict[str, float]]] = None) -> List[Dict[str, any]]:
+    output_dirname = get_output_dir(args.output)
+    makedirs(output_dirname, exist_ok=True)
+    summaries = []
+    with open(path.join(output_dirname, BATCH_SUMMARY_FILENAME), 'w', encoding='utf-8') as summary_file:
+        writer = csv.DictWriter(summary_file, fieldnames=SUMMARY_COLUMNS, delimiter='\t')
+        writer.writeheader()
+        for summary, result in run_batch(schools, centers, prefs, args.seeds, args.jobs, args.keep_seeds, params,
+                                         distance_cache=distance_cache, solver=args.solver,
+                                         distance_top=distance_top(args), checkpoint=checkpoint,
+                                         distance_matrix=distance_matrix):
+            writer.writerow(summary)
+            summaries.append(summary)
+            if result is not None:
+                write_results(result, path.join(output_dirname, f"seed-{summary['seed']}"),
+                              get_output_filename(args.output), not args.no_distance_file, args.compress,
+                              args.output_format)
+    logger.info(f"Batch of {len(summaries)} seeds written to {path.join(output_dirname, BATCH_SUMMARY_FILENAME)}")
+    return summaries
+
+
+def run(args, metrics: Metrics):
+    with metrics.phase('read'):
+        schools = read_tsv(args.schools_tsv, SCHOOLS_SCHEMA)
+        centers = read_tsv(args.centers_tsv, CENTERS_SCHEMA)
+        prefs = read_prefs(args.prefs_tsv)
+        distance_matrix = read_distance_matrix(args.distance_matrix) if args.distance_matrix else None
+    params = AllocationParams(threshold_metric=args.threshold_metric)
+    distance_cache = None
+    if args.distance_cache:
+        distance_cache = DistanceCache(args.distance_cache, args.distance_cache_size * 2**20)
+    checkpoint = build_checkpoint(args, schools, centers, prefs, params, distance_matrix)
+
+    if args.seeds:
+        with metrics.phase('batch'):
+            summaries = main_batch(args, schools, centers, prefs, distance_cache, checkpoint, params, distance_matrix)
+        if checkpoint:
+            checkpoint.clear()
+        return summaries
+
+    with metrics.phase('allocate'):
+        if args.previous:
+            result = IncrementalAllocator(schools, centers, prefs, read_tsv(args.previous), args.seed, params,
+                                          distance_cache=distance_cache, metrics=metrics,
+                                          distance_top=distance_top(args), distance_matrix=distance_matrix).run()
+        elif args.sharded:
+            result = allocate_sharded(schools, centers, prefs, args.seed, params, solver=args.solver, jobs=args.jobs,
+                                      distance_cache=distance_cache, distance_top=distance_top(args),
+                                      checkpoint=checkpoint, distance_matrix=distance_matrix)
+        else:
+            result = allocate_centers(schools, centers, prefs, args.seed, params, solver=args.solver,
+                                      distance_cache=distance_cache, metrics=metrics, distance_top=distance_top(args),
+                                      checkpoint=checkpoint, distance_matrix=distance_matrix)
+    with metrics.phase('write'):
+        write_results(result, get_output_dir(args.output), get_output_filename(args.output),
+                      not args.no_distance_file, args.compress, args.output_format)
+    if checkpoint:
+        checkpoint.clear()
+    log_summary(result)
+    return result
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.seeds and args.sharded:
+        parser.error('--sharded applies to single runs, batch mode already runs seeds in parallel')
+    if args.previous and (args.seeds or args.sharded or args.solver != 'greedy'):
+        parser.error('--previous updates a single greedy run, it cannot be combined with --seeds, --sharded or '
+                     '--solver flow')
+    if args.previous and (args.resume or args.checkpoint_interval is not None):
+        parser.error('--previous runs are not checkpointed, rerun them instead of resuming')
+    if args.compress == 'zstd' and not zstd_available():
+        parser.error('--compress zstd needs the zstandard package: pip install zstandard')
+    if args.compress and args.output_format != 'tsv':
+        parser.error('--compress applies to the tsv format only')
+    if args.output_format == 'parquet' and not parquet_available():
+        parser.error('--format parquet needs the pyarrow package: pip install pyarrow')
+
+    configure_logging(args.log_queue, args.log_jsonl)
+    metrics = Metrics()
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        result = run(args, metrics)
+    finally:
+        if profiler:
+            profiler.disable()
+            write_profile(profiler)
+    if args.profile or args.metrics_out:
+        metrics.write(args.metrics_out)
+    return result
+
+
+if __name__ == '__main__':
+    main()
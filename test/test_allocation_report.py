@@ -0,0 +1,75 @@
+import unittest
+import sys
+import os
+import gzip
+import shutil
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation_report import DistanceHistogram, build_report, find_allocations, main
+from school_center import read_tsv, weighted_percentile
+from test.utils.custom_tsv_parser import ParseTSVFile
+from test.utils.shared_run import CENTERS_TSV, shared_run
+
+
+class TestAllocationReport(unittest.TestCase):
+    """_Tests to validate the fairness report over allocations_"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.allocation_tsv = os.path.join(shared_run(), "school-center.tsv")
+        cls.centers = read_tsv(CENTERS_TSV)
+        cls.rows = read_tsv(cls.allocation_tsv)
+
+    def test_histogram_percentiles(self):
+        """_Test if histogram percentiles are within one bin of the exact weighted percentiles_"""
+        histogram = DistanceHistogram()
+        for row in self.rows:
+            histogram.add(float(row["distance_km"]), int(row["allocation"]))
+        distances = [float(row["distance_km"]) for row in self.rows]
+        students = [int(row["allocation"]) for row in self.rows]
+        for q in (50, 90):
+            exact = weighted_percentile(distances, students, q)
+            self.assertGreaterEqual(histogram.percentile(q), exact)
+            self.assertLess(histogram.percentile(q) - exact, histogram.bin_km)
+        self.assertEqual(histogram.students, sum(students))
+
+    def test_runs_aggregate(self):
+        """_Test if the same allocation twice counts every pair in every run and doubles totals_"""
+        once = build_report(self.centers, [self.allocation_tsv]).to_dict()
+        twice = build_report(self.centers, [self.allocation_tsv] * 2)
+        result = twice.to_dict()
+        self.assertEqual(result["runs"], 2)
+        self.assertEqual(result["distance"]["students"], 2 * once["distance"]["students"])
+        self.assertEqual(result["distance"]["p90_km"], once["distance"]["p90_km"])
+        self.assertEqual(result["pairs"]["in_every_run"], result["pairs"]["distinct"])
+        self.assertEqual(result["pairs"]["distinct"], len(self.rows))
+        self.assertEqual(result["centers"]["mean_utilization"], once["centers"]["mean_utilization"])
+        self.assertEqual(sum(result["centers_per_school"]["histogram"].values()),
+                         2 * len({row["scode"] for row in self.rows}))
+
+    def test_cli_batch_directory(self):
+        """_Test if a directory of compressed and plain allocations is reported with pair frequencies_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            for seed, opener in (("seed-1", open), ("seed-2", gzip.open)):
+                os.makedirs(os.path.join(output_dir, seed))
+                name = "school-center.tsv" + (".gz" if opener is gzip.open else "")
+                with open(self.allocation_tsv, "rb") as source, opener(os.path.join(output_dir, seed, name), "wb") as target:
+                    shutil.copyfileobj(source, target)
+            self.assertEqual(len(find_allocations([output_dir])), 2)
+            pairs_tsv = os.path.join(output_dir, "pairs.tsv")
+            runs_tsv = os.path.join(output_dir, "runs.tsv")
+            result = main([CENTERS_TSV, output_dir, "-o", os.path.join(output_dir, "report.json"),
+                           "--pairs", pairs_tsv, "--runs", runs_tsv])
+            self.assertEqual(result["runs"], 2)
+            pairs = ParseTSVFile(pairs_tsv).get_rows()
+            self.assertEqual({row["runs"] for row in pairs}, {"2"})
+            runs = ParseTSVFile(runs_tsv).get_rows()
+            self.assertEqual([row["run"] for row in runs], find_allocations([output_dir]))
+        self.assertEqual({int(row["students"]) for row in runs}, {result["distance"]["students"] // 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import sys
+import os
+import asyncio
+import tempfile
+
+from aiohttp import FormData
+from aiohttp.test_utils import AioHTTPTestCase
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation_service import AllocationService, Job
+from test.utils.shared_run import CENTERS_TSV, PREFS_TSV, SCHOOLS_TSV, SEED, shared_run
+
+POLL_INTERVAL_S = 0.1
+
+
+def read_bytes(file_path):
+    with open(file_path, "rb") as file:
+        return file.read()
+
+
+def job_form(schools=SCHOOLS_TSV, seed=SEED):
+    """_Return a multipart form of the sample inputs_"""
+    form = FormData()
+    form.add_field("schools", read_bytes(schools), filename="schools.tsv")
+    form.add_field("centers", read_bytes(CENTERS_TSV), filename="centers.tsv")
+    form.add_field("prefs", read_bytes(PREFS_TSV), filename="prefs.tsv")
+    form.add_field("seed", str(seed))
+    return form
+
+
+class TestAllocationService(AioHTTPTestCase):
+    """_Tests to validate the allocation job service on a local server_"""
+
+    async def get_application(self):
+        self.jobs_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.jobs_dir.cleanup)
+        self.service = AllocationService(self.jobs_dir.name, workers=1, queue_size=2)
+        return self.service.application()
+
+    async def wait_for(self, job_id):
+        while True:
+            async with self.client.get(f"/jobs/{job_id}") as response:
+                job = await response.json()
+            if job["status"] not in ("queued", "running"):
+                return job
+            await asyncio.sleep(POLL_INTERVAL_S)
+
+    async def test_job_result_and_dedupe(self):
+        """_Test if a job returns the CLI's allocation and resubmitting its inputs returns it without a rerun_"""
+        async with self.client.post("/jobs", data=job_form()) as response:
+            self.assertEqual(response.status, 202)
+            job_id = (await response.json())["id"]
+            self.assertEqual(response.headers["Location"], f"/jobs/{job_id}")
+        job = await self.wait_for(job_id)
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["summary"]["not_assigned"], 0)
+
+        async with self.client.get(f"/jobs/{job_id}/result") as response:
+            self.assertEqual(response.status, 200)
+            self.assertEqual(await response.read(), read_bytes(os.path.join(shared_run(), "school-center.tsv")))
+        async with self.client.get(f"/jobs/{job_id}/distances") as response:
+            self.assertEqual(await response.read(),
+                             read_bytes(os.path.join(shared_run(), "school-center-distance.tsv")))
+
+        async with self.client.post("/jobs", data=job_form()) as response:
+            self.assertEqual(response.status, 200)
+            self.assertEqual(await response.json(), job)
+        async with self.client.post("/jobs", data=job_form(seed=SEED + 1)) as response:
+            self.assertEqual(response.status, 202)
+            self.assertNotEqual((await response.json())["id"], job_id)
+
+        # a restarted service keeps returning the done job
+        restarted = AllocationService(self.jobs_dir.name)
+        restarted.load_jobs()
+        self.assertEqual(restarted.jobs[job_id], Job(**job))
+
+    async def test_invalid_inputs(self):
+        """_Test if bad rows fail the job with their errors and bad requests are refused_"""
+        bad_schools = os.path.join(self.jobs_dir.name, "bad.tsv")
+        with open(bad_schools, "w", encoding="utf-8") as file:
+            file.write("scode\tcount\tname-address\tlat\tlong\n1\tmany\tschool\t27.7\t85.3\n")
+        async with self.client.post("/jobs", data=job_form(schools=bad_schools)) as response:
+            job_id = (await response.json())["id"]
+        job = await self.wait_for(job_id)
+        self.assertEqual(job["status"], "failed")
+        self.assertIn("line 2, count='many': not an integer", job["error"])
+        async with self.client.get(f"/jobs/{job_id}/result") as response:
+            self.assertEqual(response.status, 409)
+
+        form = FormData()
+        form.add_field("schools", read_bytes(SCHOOLS_TSV), filename="schools.tsv")
+        async with self.client.post("/jobs", data=form) as response:
+            self.assertEqual(response.status, 400)
+            self.assertIn("centers, prefs", await response.text())
+        async with self.client.post("/jobs", data=job_form(seed="x")) as response:
+            self.assertEqual(response.status, 400)
+        async with self.client.get("/jobs/unknown") as response:
+            self.assertEqual(response.status, 404)
+        self.assertFalse([name for name in os.listdir(self.jobs_dir.name) if name.startswith(".upload-")])
+
+    async def test_worker_death(self):
+        """_Test if a job fails when its worker process dies and later jobs run on a new pool_"""
+        broken = self.service.pool
+        # start the worker process, then kill it
+        await asyncio.wrap_future(broken.submit(os.getpid))
+        for process in list(broken._processes.values()):
+            process.kill()
+            process.join()
+        async with self.client.post("/jobs", data=job_form()) as response:
+            job_id = (await response.json())["id"]
+        job = await self.wait_for(job_id)
+        self.assertEqual(job["status"], "failed")
+        self.assertIn("worker process died", job["error"])
+        self.assertIsNot(self.service.pool, broken)
+
+        async with self.client.post("/jobs", data=job_form()) as response:
+            self.assertEqual(response.status, 202)
+        self.assertEqual((await self.wait_for(job_id))["status"], "done")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generate_data import CENTER_COLUMNS, PREF_COLUMNS, SCHOOL_COLUMNS, generate, write_dataset
+from benchmarks.run_benchmarks import run_phases
+from test.utils.custom_tsv_parser import ParseTSVFile
+
+
+class TestGenerateData(unittest.TestCase):
+    """_Tests to validate the synthetic data generator_"""
+
+    def test_same_seed_same_data(self):
+        """_Test if the generator is reproducible for a seed and differs across seeds_"""
+        self.assertEqual(generate(300, seed=1), generate(300, seed=1))
+        self.assertNotEqual(generate(300, seed=1)[0], generate(300, seed=2)[0])
+
+    def test_centers_cover_students(self):
+        """_Test if centers are schools and their capacity covers the students_"""
+        schools, centers, prefs = generate(1000, seed=3)
+        self.assertEqual(len(schools), 1000)
+        scodes = {s["scode"] for s in schools}
+        self.assertTrue({c["cscode"] for c in centers} <= scodes)
+        self.assertGreaterEqual(sum(int(c["capacity"]) for c in centers), sum(int(s["count"]) for s in schools))
+        self.assertTrue(all(p["scode"] in scodes and p["scode"] != p["cscode"] for p in prefs))
+
+    def test_written_columns(self):
+        """_Test if the written files have the columns of the sample data_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            files = write_dataset(output_dir, 200)
+            for file_path, columns in zip(files, (SCHOOL_COLUMNS, CENTER_COLUMNS, PREF_COLUMNS)):
+                with open(file_path, encoding="utf-8") as file:
+                    self.assertEqual(file.readline().rstrip("\n").split("\t"), columns)
+            self.assertEqual(len(ParseTSVFile(files[0]).get_rows()), 200)
+
+
+class TestRunBenchmarks(unittest.TestCase):
+    """_Tests to validate the phase measurements of the benchmark harness_"""
+
+    def test_run_phases(self):
+        """_Test if every phase is timed and every student is accounted for_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            files = write_dataset(output_dir, 400)
+            result = run_phases(*files)
+            schools = ParseTSVFile(files[0]).get_rows()
+        self.assertEqual(list(result["seconds"]), ["parse", "distances", "ranking", "allocation", "output"])
+        self.assertEqual(list(result["peak_rss_mb"]), list(result["seconds"]))
+        self.assertEqual(result["allocated"] + result["not_assigned"], sum(int(s["count"]) for s in schools))
+
+
+if __name__ == "__main__":
+    unittest.main()
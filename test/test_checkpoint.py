@@ -0,0 +1,48 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.checkpoint import Checkpoint, inputs_key
+
+
+class TestCheckpoint(unittest.TestCase):
+    """_Tests to validate saving and resuming checkpoints_"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.dir.name, "checkpoint.pkl")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_inputs_key(self):
+        """_Test if the key depends on the inputs but not on dict order_"""
+        self.assertEqual(inputs_key({"a": 1, "b": 2}, [1]), inputs_key({"b": 2, "a": 1}, [1]))
+        self.assertNotEqual(inputs_key({"a": 1}, [1]), inputs_key({"a": 1}, [2]))
+
+    def test_resume_same_inputs(self):
+        """_Test if a saved state is loaded only when resuming with the same key_"""
+        Checkpoint(self.file_path, "key").save({"position": 3})
+        self.assertFalse(os.path.exists(self.file_path + ".partial"))
+        self.assertEqual(Checkpoint(self.file_path, "key", resume=True).load(), {"position": 3})
+        self.assertIsNone(Checkpoint(self.file_path, "key").load())
+        with self.assertLogs("utils.checkpoint", "WARNING"):
+            self.assertIsNone(Checkpoint(self.file_path, "other", resume=True).load())
+
+    def test_due_and_clear(self):
+        """_Test if saves are due after the interval and clear removes the file_"""
+        checkpoint = Checkpoint(self.file_path, "key", interval=0)
+        self.assertTrue(checkpoint.due())
+        self.assertFalse(Checkpoint(self.file_path, "key", interval=3600).due())
+        checkpoint.save(None)
+        checkpoint.clear()
+        self.assertFalse(os.path.exists(self.file_path))
+        checkpoint.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
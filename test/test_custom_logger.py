@@ -0,0 +1,89 @@
+import unittest
+import sys
+import os
+import csv
+import json
+import subprocess
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CENTERS_TSV = "sample_data/centers_grade12_2081.tsv"
+
+LOG_EVERY_LEVEL = """
+import logging, os, sys
+from utils.custom_logger import configure_logging
+configure_logging(queue=sys.argv[1] == "queue", jsonl_path=sys.argv[2] if len(sys.argv) > 2 else None)
+from school_center import log_left
+logger = logging.getLogger("test")
+logger.info("info line")
+logger.warning("warning line")
+logger.error("error line")
+log_left({"scode": "27001", "count": "120", "name-address": "school"}, 20, 3)
+if os.fork() == 0:
+    logger.warning("child line")
+    os._exit(0)
+os.wait()
+"""
+
+
+def run_python(*args):
+    """_Run python from the repo root and return stdout and stderr_"""
+    completed = subprocess.run([sys.executable, *args], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    return completed.stdout, completed.stderr
+
+
+class TestCustomLogger(unittest.TestCase):
+    """_Tests to validate console deduplication, the queue listener and the JSONL sink_"""
+
+    def assert_printed_once(self, stdout, stderr):
+        for line in ("🚀 ", "🔔 "):
+            self.assertNotIn(line, stderr)
+        self.assertEqual(stdout.count("info line"), 1)
+        self.assertEqual(stdout.count("warning line"), 1)
+        self.assertEqual(stdout.count("20/120 left for 27001 school centers: 3"), 1)
+        self.assertEqual(stdout.count("child line"), 1)
+        self.assertIn("🔔 ", stdout.split("warning line")[0].splitlines()[-1])
+        self.assertNotIn("error line", stdout)
+        self.assertEqual(stderr.count("error line"), 1)
+
+    def test_console_once_per_record(self):
+        """_Test if every record is printed once, with the emoji of its level_"""
+        self.assert_printed_once(*run_python("-c", LOG_EVERY_LEVEL, "direct"))
+
+    def test_queue_and_jsonl(self):
+        """_Test if queued records, also of forked workers, are all written and warnings reach the JSONL sink_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            jsonl_path = os.path.join(output_dir, "not-yet-created", "log.jsonl")
+            self.assert_printed_once(*run_python("-c", LOG_EVERY_LEVEL, "queue", jsonl_path))
+            with open(jsonl_path, encoding="utf-8") as file:
+                lines = [json.loads(line) for line in file]
+        self.assertEqual([line["message"] for line in lines],
+                         ["warning line", "error line", "20/120 left for 27001 school centers: 3", "child line"])
+        self.assertEqual({key: lines[2][key] for key in ("level", "logger", "scode", "left", "count", "centers")},
+                         {"level": "WARNING", "logger": "school_center", "scode": "27001", "left": 20, "count": 120,
+                          "centers": 3})
+
+    def test_cli_jsonl(self):
+        """_Test if a run with --log-queue --log-jsonl writes one JSON line per school left unallocated_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            centers_tsv = os.path.join(output_dir, "centers.tsv")
+            with open(CENTERS_TSV, encoding="utf-8") as source, open(centers_tsv, "w", encoding="utf-8") as target:
+                rows = list(csv.DictReader(source, delimiter="\t"))
+                writer = csv.DictWriter(target, fieldnames=list(rows[0]), delimiter="\t")
+                writer.writeheader()
+                writer.writerows(dict(row, capacity=int(row["capacity"]) // 2) for row in rows)
+            jsonl_path = os.path.join(output_dir, "log.jsonl")
+            stdout, _ = run_python("school_center.py", "sample_data/schools_grade12_2081.tsv", centers_tsv,
+                                   "sample_data/prefs.tsv", "-s", "7", "-o", output_dir + os.sep,
+                                   "--log-queue", "--log-jsonl", jsonl_path)
+            with open(jsonl_path, encoding="utf-8") as file:
+                lines = [json.loads(line) for line in file]
+        left = [line for line in stdout.splitlines() if " left for " in line]
+        self.assertTrue(left)
+        self.assertEqual(len(lines), len(left))
+        not_assigned = int(stdout.split("Students not assigned: ")[1].split()[0])
+        self.assertEqual(sum(line["left"] for line in lines), not_assigned)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import sys
+import os
+
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test.utils.custom_tsv_parser import ParseTSVFile
+from utils.distance import DistanceEngine, haversine_distance, parse_coords
+
+
+class TestDistanceEngine(unittest.TestCase):
+    """_Tests to validate the vectorized distance engine against the
+    scalar haversine formula on the sample data_
+    """
+
+    def setUp(self):
+        self.schools = ParseTSVFile("sample_data/schools_grade12_2081.tsv").get_rows()[:50]
+        self.centers = ParseTSVFile("sample_data/centers_grade12_2081.tsv").get_rows()
+        self.engine = DistanceEngine.from_records(self.schools, self.centers, block_size=16)
+
+    def scalar(self, s, c):
+        return haversine_distance(float(s["lat"]), float(s["long"]), float(c["lat"]), float(c["long"]))
+
+    def test_exact_matches_scalar(self):
+        """_Test if exact distances are identical to haversine_distance_"""
+        for i, s in enumerate(self.schools):
+            expected = [self.scalar(s, c) for c in self.centers]
+            self.assertEqual(self.engine.exact(i, range(len(self.centers))), expected)
+
+    def test_rows_and_matrix_close_to_scalar(self):
+        """_Test if vectorized rows and the full matrix agree with haversine_distance_"""
+        matrix = self.engine.matrix()
+        self.assertEqual(matrix.shape, (len(self.schools), len(self.centers)))
+        for i, s in enumerate(self.schools):
+            expected = [self.scalar(s, c) for c in self.centers]
+            np.testing.assert_allclose(self.engine.row(i), expected, rtol=0, atol=1e-9)
+            np.testing.assert_array_equal(matrix[i], self.engine.row(i))
+
+    def test_within_threshold(self):
+        """_Test if the screened centers include every center within the threshold_"""
+        for i, s in enumerate(self.schools):
+            expected = [j for j, c in enumerate(self.centers) if self.scalar(s, c) <= 2]
+            self.assertTrue(set(expected).issubset(self.engine.within(i, 2).tolist()))
+
+    def test_blank_coordinates_are_nan(self):
+        """_Test if blank coordinates are parsed as NaN_"""
+        coords = parse_coords([{"lat": "", "long": ""}, {"lat": "27.7", "long": "85.3"}])
+        self.assertTrue(np.isnan(coords[0]).all())
+        self.assertEqual(coords[1].tolist(), [27.7, 85.3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import sys
+import os
+import tempfile
+
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test.utils.custom_tsv_parser import ParseTSVFile
+from utils.distance import DistanceEngine, parse_coords
+from utils.distance_cache import DistanceCache, update_distances
+from utils.spatial_index import CenterIndex
+
+
+def make_engine(school_coords, center_coords):
+    return DistanceEngine(school_coords, center_coords, index=CenterIndex(center_coords))
+
+
+class TestDistanceCache(unittest.TestCase):
+    """_Tests to validate reuse, partial recomputation and eviction of the
+    on-disk distance cache_
+    """
+
+    def setUp(self):
+        self.schools = parse_coords(ParseTSVFile("sample_data/schools_grade12_2081.tsv").get_rows())[:80]
+        self.centers = parse_coords(ParseTSVFile("sample_data/centers_grade12_2081.tsv").get_rows())
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = DistanceCache(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def assertSameDistances(self, engine, sparse, radius):
+        expected, _, _ = update_distances(engine, radius)
+        for i in range(len(engine.school_coords)):
+            indices, distances = sparse.row(i)
+            expected_indices, expected_distances = expected.row(i)
+            self.assertEqual(indices.tolist(), expected_indices.tolist())
+            np.testing.assert_array_equal(distances, expected_distances)
+
+    def test_rerun_hits_cache(self):
+        """_Test if a rerun with the same coordinates reads the cached entry_"""
+        first = self.cache.load(make_engine(self.schools, self.centers), 7)
+        with self.assertLogs("utils.distance_cache", level="INFO") as logs:
+            second = self.cache.load(make_engine(self.schools, self.centers), 7)
+        self.assertIn("hit", logs.output[0])
+        np.testing.assert_array_equal(first.indptr, second.indptr)
+        np.testing.assert_array_equal(first.distances, second.distances)
+
+    def test_edited_rows_and_columns_are_recomputed(self):
+        """_Test if only the edited schools and centers are recomputed_"""
+        self.cache.load(make_engine(self.schools, self.centers), 7)
+        schools, centers = self.schools.copy(), self.centers.copy()
+        schools[3] += 0.01
+        centers[[5, 9]] -= 0.01
+        centers = np.vstack([centers, [[27.7, 85.3]]])
+        engine = make_engine(schools, centers)
+        with self.assertLogs("utils.distance_cache", level="INFO") as logs:
+            sparse = self.cache.load(engine, 7)
+        self.assertIn(f"recomputed 1/{len(schools)} rows and 3/{len(centers)} columns", logs.output[0])
+        self.assertSameDistances(engine, sparse, 7)
+        engine.sparse = sparse
+        self.assertEqual(engine.within(0, 2).tolist(), make_engine(schools, centers).within(0, 2).tolist())
+
+    def test_eviction_keeps_cache_bounded(self):
+        """_Test if least recently used entries are evicted over the size limit_"""
+        self.cache.load(make_engine(self.schools, self.centers), 7)
+        entry_size = sum(os.path.getsize(os.path.join(self.temp_dir.name, f)) for f in os.listdir(self.temp_dir.name))
+        self.cache.max_bytes = entry_size
+        self.cache.load(make_engine(self.schools[:40], self.centers), 7)
+        self.assertEqual(len(os.listdir(self.temp_dir.name)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import sys
+import os
+import tempfile
+
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from school_center import AllocationParams, allocate_centers, build_distance_engine, main, read_prefs, read_tsv
+from utils.distance_matrix import MatrixDistanceEngine, read_distance_matrix
+from validate_allocation import validate
+
+SCHOOLS_TSV = "sample_data/schools_grade12_2081.tsv"
+CENTERS_TSV = "sample_data/centers_grade12_2081.tsv"
+PREFS_TSV = "sample_data/prefs.tsv"
+
+
+class TestDistanceMatrix(unittest.TestCase):
+    """_Tests to validate precomputed matrix distances with haversine fallback_"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.schools = read_tsv(SCHOOLS_TSV)
+        cls.centers = read_tsv(CENTERS_TSV)
+        cls.prefs = read_prefs(PREFS_TSV)
+        cls.plain = build_distance_engine(cls.schools, cls.centers)
+        # road distances: 1.5 times the straight line for the centers within 5 km of the first 200 schools
+        cls.matrix = {}
+        for si, s in enumerate(cls.schools[:200]):
+            within = cls.plain.within(si, 5)
+            for ci, distance in zip(within.tolist(), cls.plain.exact(si, within)):
+                cls.matrix.setdefault(s["scode"], {})[cls.centers[ci]["cscode"]] = round(distance * 1.5, 3)
+
+    def engine(self, threshold_metric="matrix"):
+        return build_distance_engine(self.schools, self.centers, AllocationParams(threshold_metric=threshold_metric),
+                                     distance_matrix=self.matrix)
+
+    def test_read_distance_matrix(self):
+        """_Test if the matrix file is read into a dict of dicts key scode and then cscode_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            matrix_tsv = os.path.join(output_dir, "matrix.tsv")
+            with open(matrix_tsv, "w", encoding="utf-8") as file:
+                file.write("scode\tcscode\tdistance\n27001\t27003\t4.5\n27001\t27051\t12\n27002\t27003\t0\n")
+            self.assertEqual(read_distance_matrix(matrix_tsv), {"27001": {"27003": 4.5, "27051": 12.0},
+                                                                 "27002": {"27003": 0.0}})
+
+    def test_listed_pairs_and_fallback(self):
+        """_Test if listed pairs use the matrix and the others haversine_"""
+        engine = self.engine()
+        self.assertIsInstance(engine, MatrixDistanceEngine)
+        all_centers = range(len(self.centers))
+        for si in (0, 199, 200, len(self.schools) - 1):
+            listed = self.matrix.get(self.schools[si]["scode"], {})
+            expected = [listed.get(c["cscode"], d) for c, d in zip(self.centers, self.plain.exact(si, all_centers))]
+            self.assertEqual(engine.exact(si, all_centers), expected)
+        np.testing.assert_allclose(engine.pairs([0, 200], [5, 5]), [engine.exact(0, [5])[0], engine.exact(200, [5])[0]])
+
+    def test_threshold_metrics(self):
+        """_Test if thresholds apply to matrix distances or to straight-line distances_"""
+        by_matrix, by_haversine = self.engine("matrix"), self.engine("haversine")
+        for si in (0, 50, 250):
+            exact = np.array(by_matrix.exact(si, range(len(self.centers))))
+            within = by_matrix.within(si, 3)
+            self.assertEqual(within.tolist(), np.flatnonzero(exact <= 3).tolist())
+            self.assertEqual(by_haversine.within(si, 3).tolist(), self.plain.within(si, 3).tolist())
+
+    def test_allocation_with_matrix(self):
+        """_Test if allocations report matrix distances and follow the rules under both threshold metrics_"""
+        for threshold_metric in ("matrix", "haversine"):
+            params = AllocationParams(threshold_metric=threshold_metric)
+            result = allocate_centers(self.schools, self.centers, self.prefs, seed=7, params=params,
+                                      distance_matrix=self.matrix)
+            rows = [dict(row, allocation=str(row["allocation"]), distance_km=str(row["distance_km"]))
+                    for row in result.allocations]
+            errors = [v for v in validate(self.schools, self.centers, self.prefs, rows, params, self.matrix)
+                      if v.severity == "error"]
+            self.assertEqual(errors, [])
+            listed = [row for row in result.allocations if row["cscode"] in self.matrix.get(row["scode"], {})]
+            self.assertTrue(listed)
+            self.assertTrue(all(row["distance_km"] == self.matrix[row["scode"]][row["cscode"]] for row in listed))
+
+    def test_cli_distance_matrix(self):
+        """_Test if the command line reads the matrix and threshold metric_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            matrix_tsv = os.path.join(output_dir, "matrix.tsv")
+            with open(matrix_tsv, "w", encoding="utf-8") as file:
+                file.write("scode\tcscode\tdistance\n")
+                for scode, distances in self.matrix.items():
+                    file.writelines(f"{scode}\t{cscode}\t{d}\n" for cscode, d in distances.items())
+            expected = allocate_centers(self.schools, self.centers, self.prefs, seed=7, distance_matrix=self.matrix,
+                                        params=AllocationParams(threshold_metric="haversine"))
+            result = main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, "-s", "7", "-o", output_dir + "/",
+                           "--distance-matrix", matrix_tsv, "--threshold-metric", "haversine"])
+            self.assertEqual(result.allocations, expected.allocations)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import sys
+import os
+
+import pandas as pd
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test.utils.shared_run import shared_run
+from utils.filter_index import FILTER_COLUMNS, build_filter_index, build_filter_indexes
+
+
+class TestFilterIndex(unittest.TestCase):
+    """_Tests to validate the school and center lookup of the app's filter_"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = pd.read_csv(os.path.join(shared_run(), "school-center.tsv"), sep="\t",
+                             dtype={"scode": str, "cscode": str})
+
+    def test_labels_are_aligned(self):
+        """_Test if each label pairs a code with its own name, once per code_"""
+        df = pd.DataFrame({"scode": ["1", "2", "1", "3"], "school": ["A", "B", "A", "B"]})
+        index = build_filter_index(df, "scode", "school")
+        self.assertEqual(index.labels, ["1 | A", "2 | B", "3 | B"])
+        self.assertEqual(index.select(df, "1 | A").index.tolist(), [0, 2])
+        self.assertTrue(index.select(df, "4 | D").empty)
+
+    def test_lookup_matches_mask(self):
+        """_Test if looking up a label returns the rows a boolean mask on its code returns_"""
+        indexes = build_filter_indexes(self.df)
+        self.assertEqual(list(indexes), list(FILTER_COLUMNS))
+        for filter_type, (code_column, name_column) in FILTER_COLUMNS.items():
+            index = indexes[filter_type]
+            self.assertEqual(len(index.labels), self.df[code_column].nunique())
+            for label in index.labels:
+                code, name = label.split(" | ", 1)
+                expected = self.df[self.df[code_column] == code]
+                pd.testing.assert_frame_equal(index.select(self.df, label), expected)
+                self.assertEqual(expected[name_column].iloc[0], name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import sys
+import os
+import subprocess
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# import school_center may take this share of import numpy timed on the same machine and run;
+# measured ~0.35 with lazy imports, above 1 when numpy is imported eagerly
+IMPORT_BUDGET_OF_NUMPY = 0.6
+HEAVY_MODULES = ["numpy", "pandas", "multiprocessing", "cProfile", "pstats", "sqlite3", "logging.config"]
+RUNS = 3
+
+
+def run_python(*args, pycache_dir):
+    """_Run python from the repo root with bytecode caching on, as in a deployment, and return stderr and stdout_"""
+    # without pytest-cov's subprocess coverage, which imports modules of its own
+    env = {name: value for name, value in os.environ.items()
+           if not name.startswith(("COV_CORE_", "COVERAGE_")) and name != "PYTHONDONTWRITEBYTECODE"}
+    env["PYTHONPYCACHEPREFIX"] = pycache_dir
+    completed = subprocess.run([sys.executable, *args], cwd=ROOT_DIR, env=env, capture_output=True, text=True,
+                               check=True)
+    return completed.stderr, completed.stdout
+
+
+def import_times(stderr):
+    """_Parse -X importtime output into the cumulative microseconds per module_"""
+    times = {}
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    """_Tests to validate the import budget of the command line startup path_"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pycache_dir = tempfile.TemporaryDirectory()
+        # the first run writes the bytecode cache
+        run_python("-c", "import school_center, numpy", pycache_dir=cls.pycache_dir.name)
+        cls.runs = [run_python("-X", "importtime", "-c", "import logging, school_center; print(logging.getLogger().handlers)",
+                               pycache_dir=cls.pycache_dir.name) for _ in range(RUNS)]
+        cls.numpy_runs = [run_python("-X", "importtime", "-c", "import numpy", pycache_dir=cls.pycache_dir.name)
+                          for _ in range(RUNS)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pycache_dir.cleanup()
+
+    def test_import_budget(self):
+        """_Test if importing school_center stays within its budget relative to importing numpy_"""
+        best = min(import_times(stderr)["school_center"] for stderr, _ in self.runs)
+        numpy_best = min(import_times(stderr)["numpy"] for stderr, _ in self.numpy_runs)
+        self.assertLess(best, numpy_best * IMPORT_BUDGET_OF_NUMPY)
+
+    def test_heavy_modules_deferred(self):
+        """_Test if importing school_center neither loads heavy modules nor configures logging_"""
+        stderr, stdout = self.runs[0]
+        loaded = [name for name in import_times(stderr)
+                  if any(name == heavy or name.startswith(heavy + ".") for heavy in HEAVY_MODULES)]
+        self.assertEqual(loaded, [])
+        self.assertEqual(stdout.strip(), "[]")
+
+    def test_help(self):
+        """_Test if the lazy imports leave --help working_"""
+        _, stdout = run_python("school_center.py", "--help", pycache_dir=self.pycache_dir.name)
+        self.assertIn("usage:", stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import sys
+import os
+
+import pandas as pd
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.map_layers import build_map, icon_data_uri, marker_tooltips
+
+SCHOOLS_TSV = "sample_data/schools_grade12_2081.tsv"
+
+
+def sample_map_data(centers=20):
+    """_Return map rows of the sample schools, the first few of them as centers with allocations_"""
+    schools = pd.read_csv(SCHOOLS_TSV, sep="\t")
+    map_data = pd.DataFrame({"lat": schools["lat"], "long": schools["long"], "name": schools["name-address"],
+                             "allocation": float("nan"), "type": "School"})
+    map_data.loc[:centers - 1, "type"] = "Center"
+    map_data.loc[:centers - 1, "allocation"] = range(centers)
+    return map_data
+
+
+class TestMapLayers(unittest.TestCase):
+    """_Tests to validate the vectorized map layers_"""
+
+    def setUp(self):
+        self.map_data = sample_map_data()
+
+    def test_tooltips(self):
+        """_Test if tooltips escape names and show allocations of centers only_"""
+        map_data = pd.DataFrame({"lat": [27.5, 27.6], "long": [85.3, 85.4], "name": ["a & b school", "center <1>"],
+                                 "allocation": [float("nan"), 42], "type": ["School", "Center"]})
+        school, center = marker_tooltips(map_data).tolist()
+        self.assertIn("<h6>A &amp; B School</h6>", school)
+        self.assertIn("🏫 School", school)
+        self.assertNotIn("Allocation", school)
+        self.assertIn("<h6>Center &lt;1&gt;</h6>", center)
+        self.assertIn("<b>Allocation:</b> 42<br/>", center)
+
+    def test_map_uses_bundled_icons(self):
+        """_Test if all markers are one clustered layer whose icons are embedded in the map_"""
+        html = build_map(self.map_data).get_root().render()
+        self.assertIn(icon_data_uri("School"), html)
+        self.assertIn(icon_data_uri("Center"), html)
+        self.assertNotIn("flaticon", html)
+        self.assertNotIn("vecteezy", html)
+        self.assertEqual(html.count("markerClusterGroup("), 1)
+        self.assertEqual(html.count("L.marker("), 1)
+
+    def test_heatmap(self):
+        """_Test if allocation circles are one GeoJSON layer of the allocated rows_"""
+        m = build_map(self.map_data, show_heatmap=True)
+        layers = [child for child in m._children.values() if child._name == "GeoJson"]
+        self.assertEqual(len(layers), 1)
+        radii = [f["properties"]["radius"] for f in layers[0].data["features"]]
+        self.assertEqual(len(radii), 19)
+        self.assertEqual(max(radii), 25)
+        self.assertNotIn("GeoJson", [child._name for child in build_map(self.map_data)._children.values()])
+
+
+if __name__ == "__main__":
+    unittest.main()
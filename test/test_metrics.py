@@ -0,0 +1,69 @@
+import unittest
+import sys
+import os
+import cProfile
+import json
+import pstats
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import Metrics, write_profile
+
+
+class TestMetrics(unittest.TestCase):
+    """_Tests to validate phase timings, counters and profile output_"""
+
+    def test_phases_and_counters(self):
+        """_Test if nested phases are timed and counters add up per school and in total_"""
+        metrics = Metrics()
+        for _ in range(3):
+            with metrics.phase("outer"), metrics.phase("inner"):
+                pass
+        metrics.count("27001", "candidates", 4)
+        metrics.count("27001", "candidates", 2)
+        metrics.count("27002", "candidates")
+        result = metrics.to_dict()
+        self.assertEqual(result["phases"]["outer"]["calls"], 3)
+        self.assertGreaterEqual(result["phases"]["outer"]["seconds"], result["phases"]["inner"]["seconds"])
+        self.assertEqual(result["schools"], {"27001": {"candidates": 6}, "27002": {"candidates": 1}})
+        self.assertEqual(result["totals"], {"candidates": 7})
+
+    def test_phase_timed_on_error(self):
+        """_Test if a phase that raises is still counted_"""
+        metrics = Metrics()
+        with self.assertRaises(ValueError), metrics.phase("failing"):
+            raise ValueError()
+        self.assertEqual(metrics.phases["failing"]["calls"], 1)
+
+    def test_write(self):
+        """_Test if the full metrics go to the file and only a summary line to the metrics log_"""
+        metrics = Metrics()
+        with metrics.phase("outer"):
+            metrics.count("27001", "candidates", 4)
+        with tempfile.TemporaryDirectory() as output_dir:
+            file_path = os.path.join(output_dir, "metrics.json")
+            with self.assertLogs("metrics", "INFO") as logs:
+                metrics.write(file_path)
+            with open(file_path, encoding="utf-8") as file:
+                self.assertEqual(json.load(file)["schools"], {"27001": {"candidates": 4}})
+        summary = json.loads(logs.records[0].getMessage())
+        self.assertEqual(summary["totals"], {"candidates": 4})
+        self.assertEqual(summary["schools"], 1)
+        self.assertEqual(list(summary["phases"]), ["outer"])
+
+    def test_write_profile(self):
+        """_Test if the profile is written in pstats format_"""
+        profiler = cProfile.Profile()
+        profiler.enable()
+        sorted(range(100))
+        profiler.disable()
+        with tempfile.TemporaryDirectory() as output_dir:
+            file_path = os.path.join(output_dir, "profile.pstats")
+            write_profile(profiler, file_path)
+            self.assertGreater(pstats.Stats(file_path).total_calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
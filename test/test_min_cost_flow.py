@@ -0,0 +1,122 @@
+import unittest
+import sys
+import os
+import itertools
+import random
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils.min_cost_flow import MinCostFlow, ortools_available, solve_min_cost_flow
+
+
+def brute_force_transport(supply, demand, costs):
+    """_Return the cheapest cost of sending all supply to demand nodes by trying every split_"""
+    best = None
+    splits = [[split for split in itertools.product(*(range(min(s, d) + 1) for d in demand)) if sum(split) == s]
+              for s in supply]
+    for plan in itertools.product(*splits):
+        if all(sum(row[j] for row in plan) <= d for j, d in enumerate(demand)):
+            cost = sum(row[j] * costs[i][j] for i, row in enumerate(plan) for j in range(len(demand)))
+            best = cost if best is None else min(best, cost)
+    return best
+
+
+class TestMinCostFlow(unittest.TestCase):
+    """_Tests to validate the min-cost flow solver against brute force
+    transportation problems_
+    """
+
+    def test_matches_brute_force(self):
+        """_Test if small transportation problems are solved at the optimal cost_"""
+        rng = random.Random(3)
+        for _ in range(30):
+            supply = [rng.randint(0, 3) for _ in range(3)]
+            demand = [rng.randint(1, 4) for _ in range(3)]
+            if sum(supply) > sum(demand):
+                continue
+            costs = [[rng.randint(0, 9) for _ in demand] for _ in supply]
+            flow = MinCostFlow(len(supply) + len(demand) + 2)
+            sink = len(supply) + len(demand) + 1
+            for i, s in enumerate(supply):
+                flow.add_edge(0, 1 + i, s, 0)
+                for j in range(len(demand)):
+                    flow.add_edge(1 + i, 1 + len(supply) + j, s, costs[i][j])
+            for j, d in enumerate(demand):
+                flow.add_edge(1 + len(supply) + j, sink, d, 0)
+            self.assertEqual(flow.solve(0, sink), (sum(supply), brute_force_transport(supply, demand, costs)))
+
+    def test_edge_flows_and_limit(self):
+        """_Test if edge flows respect capacities and max_flow caps the total_"""
+        flow = MinCostFlow(4)
+        cheap = flow.add_edge(0, 1, 2, 1)
+        expensive = flow.add_edge(0, 2, 5, 4)
+        flow.add_edge(1, 3, 5, 0)
+        flow.add_edge(2, 3, 5, 0)
+        self.assertEqual(flow.solve(0, 3, max_flow=3), (3, 6))
+        self.assertEqual((flow.flow(cheap), flow.flow(expensive)), (2, 1))
+
+    def test_negative_cost_rejected(self):
+        """_Test if negative edge costs are rejected_"""
+        with self.assertRaises(ValueError):
+            MinCostFlow(2).add_edge(0, 1, 1, -1)
+
+
+def random_transport(rng):
+    """_Return a random feasible transportation problem as solve_min_cost_flow arrays_"""
+    supply, demand = [1], [0]
+    while sum(supply) > sum(demand):
+        supply = [rng.randint(0, 5) for _ in range(4)]
+        demand = [rng.randint(2, 6) for _ in range(3)]
+    tails = np.repeat(np.arange(4), 3)
+    heads = np.tile(np.arange(4, 7), 4)
+    capacities = np.full(12, 5, dtype=np.int64)
+    costs = np.array([rng.randint(0, 9) for _ in range(12)], dtype=np.int64)
+    # a dummy sink takes the demand left over
+    tails, heads = np.concatenate((tails, np.arange(4, 7))), np.concatenate((heads, np.full(3, 7)))
+    capacities, costs = np.concatenate((capacities, demand)), np.concatenate((costs, np.zeros(3, dtype=np.int64)))
+    supplies = np.array(supply + [0, 0, 0, -sum(supply)], dtype=np.int64)
+    return supply, demand, tails, heads, capacities, costs, supplies
+
+
+class TestSolveMinCostFlow(unittest.TestCase):
+    """_Tests to validate solve_min_cost_flow and its backends_"""
+
+    def test_python_backend(self):
+        """_Test if the python backend meets the supplies at the brute force cost_"""
+        rng = random.Random(5)
+        for _ in range(20):
+            supply, demand, tails, heads, capacities, costs, supplies = random_transport(rng)
+            flows = solve_min_cost_flow(8, tails, heads, capacities, costs, supplies, backend='python')
+            self.assertTrue(((flows >= 0) & (flows <= capacities)).all())
+            self.assertEqual(np.bincount(tails, flows, 8)[:4].tolist(), supply)
+            matrix = costs[:12].reshape(4, 3).tolist()
+            self.assertEqual(int((flows * costs).sum()), brute_force_transport(supply, demand, matrix))
+
+    @unittest.skipUnless(ortools_available(), "ortools is not installed")
+    def test_backends_agree(self):
+        """_Test if OR-Tools finds flows of the same cost as the python backend_"""
+        rng = random.Random(6)
+        for _ in range(20):
+            _, _, tails, heads, capacities, costs, supplies = random_transport(rng)
+            python = solve_min_cost_flow(8, tails, heads, capacities, costs, supplies, backend='python')
+            ortools = solve_min_cost_flow(8, tails, heads, capacities, costs, supplies, backend='ortools')
+            self.assertEqual(int((python * costs).sum()), int((ortools * costs).sum()))
+
+    def test_errors(self):
+        """_Test if unknown backends, unbalanced and unmet supplies are rejected_"""
+        tails, heads = np.array([0]), np.array([1])
+        capacities, costs = np.array([1]), np.array([1])
+        with self.assertRaises(ValueError):
+            solve_min_cost_flow(2, tails, heads, capacities, costs, np.array([1, -1]), backend='simplex')
+        with self.assertRaises(ValueError):
+            solve_min_cost_flow(2, tails, heads, capacities, costs, np.array([1, 0]), backend='python')
+        for backend in ['python'] + (['ortools'] if ortools_available() else []):
+            with self.assertRaises(ValueError):
+                solve_min_cost_flow(2, tails, heads, capacities, costs, np.array([2, -2]), backend=backend)
+
+
+if __name__ == "__main__":
+    unittest.main()
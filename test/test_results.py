@@ -1,50 +1,34 @@
 import unittest
 import sys
 import os
-import subprocess
 import warnings
 
 # Add the parent directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from school_center import read_prefs, read_tsv
 from test.utils.custom_tsv_parser import ParseTSVFile
-
-PREF_CUTOFF = -4
-
-
-def get_scode_cscode_id(data):
-    # Create an id with scode and center with sorted values of scode and center
-    school_centers = []
-    for row in data:
-        scode = int(row["scode"])
-        center = int(row["cscode"])
-        sccode_center_id = sorted((scode, center))
-        sccode_center_id = "_".join(map(str, sccode_center_id))
-        school_centers.append(sccode_center_id)
-    return school_centers
+from test.utils.shared_run import CENTERS_TSV, PREFS_TSV, SCHOOLS_TSV, shared_run
+from validate_allocation import AllocationChecker
 
 
 class TestSchoolCenter(unittest.TestCase):
     """_Tests to validate the outcome of the output are matching
     as per the requirements
 
-    Needs the ouptut from the results/school-center.tsv and
-    results/school-center-distance.tsv files to be present
+    Checks the school-center.tsv and school-center-distance.tsv files
+    of the run shared by the test session
 
     """
 
-    def setUp(self):
-        self.school_center_file = "results/school-center.tsv"
-        self.school_center_distance_file = "results/school-center-distance.tsv"
-        self.school_center_pref_file = "sample_data/prefs.tsv"
-        schools_tsv = "sample_data/schools_grade12_2081.tsv"
-        centers_tsv = "sample_data/centers_grade12_2081.tsv"
-        cmd = f"python school_center.py {schools_tsv} {centers_tsv} {self.school_center_pref_file}"
-        subprocess.run(cmd, shell=True)
-
-    def tearDown(self):
-        os.remove(self.school_center_file)
-        os.remove(self.school_center_distance_file)
+    @classmethod
+    def setUpClass(cls):
+        output_dir = shared_run()
+        cls.school_center_file = os.path.join(output_dir, "school-center.tsv")
+        cls.school_center_distance_file = os.path.join(output_dir, "school-center-distance.tsv")
+        cls.school_center_pref_file = PREFS_TSV
+        cls.checker = AllocationChecker(read_tsv(SCHOOLS_TSV), read_tsv(CENTERS_TSV), read_prefs(PREFS_TSV),
+                                        read_tsv(cls.school_center_file))
 
     def test_results_exists(self):
         """_Test if the application in running which output the results in the
@@ -102,23 +86,13 @@ class TestSchoolCenter(unittest.TestCase):
             Pass: If the scode's center is not same as cscode's center
             Fail: If the scode's center is same as cscode's center
         """
-        scf = ParseTSVFile(self.school_center_file)
-        data = scf.get_rows()
-        scodes_centers = []
-
-        scodes_centers = get_scode_cscode_id(data)
-
-        # Check if there are any duplicates id if duplicate then there is a collision between school and center
-        duplicates = [
-            item for item in set(scodes_centers) if scodes_centers.count(item) > 1
-        ]
+        duplicates = [f"{v.scode}_{v.cscode}" for v in self.checker.check_mutual()]
 
         self.assertFalse(
             duplicates,
             f"Duplicate values found in scode_center_code: {', '.join(duplicates)}",
         )
 
-    @unittest.skip ("needs review")
     def test_undesired_cscode_scode_pair(self):
         """_Test if the schools and the centers are not matched based on the
         cost preferences defined in the prefs.tsv file_
@@ -131,28 +105,10 @@ class TestSchoolCenter(unittest.TestCase):
             Fail: If the schools with same management are each other's center
         """
 
-        scf = ParseTSVFile(self.school_center_file)
-        cpf = ParseTSVFile(self.school_center_pref_file)
-        data_scf = scf.get_rows()
-        data_cpf = cpf.get_rows()
-        for cpf_data in data_cpf:
-            if int(cpf_data["pref"]) < PREF_CUTOFF:
-                data_cpf.remove(cpf_data)
-
-        failures = []
-
-        scodes_centers = get_scode_cscode_id(data_scf)
-
-        undesired_csodes_centers = get_scode_cscode_id(data_cpf)
-        for undesired_cscodes_center in undesired_csodes_centers:
-            if undesired_cscodes_center in scodes_centers:
-                failures.append(
-                    f"Schools with undesired centers {undesired_cscodes_center}"
-                )
+        failures = [f"Schools with undesired centers {v.scode}_{v.cscode}" for v in self.checker.check_pref_cutoff()]
 
         assert len(failures) == 0, f'{len(failures)} rows failed. {chr(10).join(failures)}'
 
 
-
 if __name__ == "__main__":
     unittest.main()
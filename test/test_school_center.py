@@ -0,0 +1,405 @@
+import unittest
+import sys
+import os
+import tempfile
+import json
+import csv
+import gzip
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from school_center import (AllocationParams, AllocationStore, Allocator, IncrementalAllocator, allocate_centers,
+                           allocate_sharded, main, parse_seeds, read_prefs, read_tsv, run_batch, shard_inputs, summarize)
+from test.utils.custom_tsv_parser import ParseTSVFile
+from utils.checkpoint import Checkpoint
+from utils.typed_output import read_sqlite
+
+SCHOOLS_TSV = "sample_data/schools_grade12_2081.tsv"
+CENTERS_TSV = "sample_data/centers_grade12_2081.tsv"
+PREFS_TSV = "sample_data/prefs.tsv"
+
+
+class TestAllocateCenters(unittest.TestCase):
+    """_Tests to validate the importable allocation API without spawning
+    a new process_
+    """
+
+    def setUp(self):
+        self.schools = read_tsv(SCHOOLS_TSV)
+        self.centers = read_tsv(CENTERS_TSV)
+        self.prefs = read_prefs(PREFS_TSV)
+
+    def test_same_seed_same_result(self):
+        """_Test if runs with the same seed allocate identically_"""
+        first = allocate_centers(self.schools, self.centers, self.prefs, seed=7)
+        second = allocate_centers(self.schools, self.centers, self.prefs, seed=7)
+        self.assertEqual(first.allocations, second.allocations)
+        self.assertEqual(first.remaining, second.remaining)
+
+    def test_every_student_accounted_for(self):
+        """_Test if allocated and remaining students add up to the school counts_"""
+        result = allocate_centers(self.schools, self.centers, self.prefs, seed=7)
+        total = sum(int(s["count"]) for s in self.schools)
+        allocated = sum(row["allocation"] for row in result.allocations)
+        self.assertEqual(allocated + result.remaining, total)
+        capacity = sum(int(c["capacity"]) for c in self.centers)
+        self.assertEqual(capacity - sum(result.centers_remaining_cap.values()), allocated)
+
+    def test_params_override_thresholds(self):
+        """_Test if allocation params restrict the considered centers_"""
+        params = AllocationParams(pref_distance_threshold=1, abs_distance_threshold=1, nearest_centers_fallback=1)
+        result = allocate_centers(self.schools, self.centers, self.prefs, seed=7, params=params)
+        far = [row for row in result.distances if row["distance_km"] > 1]
+        self.assertEqual(far, [])
+
+    def test_ranking_follows_prefs(self):
+        """_Test if preferred centers rank first and centers below PREF_CUTOFF are excluded_"""
+        allocator = Allocator(self.schools, self.centers, self.prefs, seed=7)
+        school_index = 0
+        scode = self.schools[school_index]["scode"]
+        ranked = allocator.centers_within_distance(self.schools[school_index], school_index, 2, False)
+        preferred, excluded = ranked[-1]["cscode"], ranked[0]["cscode"]
+        allocator.prefs = {scode: {preferred: 2, excluded: -5}}
+        ranked = [c["cscode"] for c in allocator.centers_within_distance(self.schools[school_index], school_index, 2, False)]
+        self.assertEqual(ranked[0], preferred)
+        self.assertNotIn(excluded, ranked)
+
+    def test_cli_writes_results(self):
+        """_Test if the command line wrapper writes both output files_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            output = os.path.join(output_dir, "allocation.tsv")
+            result = main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, "-s", "7", "-o", output])
+            rows = ParseTSVFile(output).get_rows()
+            self.assertEqual(len(rows), len(result.allocations))
+            self.assertTrue(os.path.exists(os.path.join(output_dir, "school-center-distance.tsv")))
+
+    def test_cli_rejects_invalid_inputs(self):
+        """_Test if the command line wrapper reports every bad row and exits before allocating_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            schools_tsv = os.path.join(output_dir, "schools.tsv")
+            with open(schools_tsv, "w", encoding="utf-8") as file:
+                file.write("scode\tcount\tname-address\tlat\tlong\n27001\tmany\tA\t\t85.3\n27002\t10\tB\t27.7\t85.3\n")
+            with self.assertLogs("school_center", "ERROR") as logs, self.assertRaises(SystemExit):
+                main([schools_tsv, CENTERS_TSV, PREFS_TSV, "-o", output_dir + "/"])
+            self.assertIn("line 2, count='many': not an integer", logs.output[0])
+            self.assertNotIn("lat=", logs.output[0])
+            self.assertFalse(os.path.exists(os.path.join(output_dir, "school-center.tsv")))
+
+    def test_cli_school_without_coordinates(self):
+        """_Test if a school with blank coordinates is left unassigned rather than rejected_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            schools_tsv = os.path.join(output_dir, "schools.tsv")
+            with open(SCHOOLS_TSV, encoding="utf-8") as source, open(schools_tsv, "w", encoding="utf-8") as file:
+                lines = source.readlines()
+                cells = lines[1].rstrip("\n").split("\t")
+                cells[3] = cells[4] = ""
+                file.writelines([lines[0], "\t".join(cells) + "\n"] + lines[2:])
+            result = main([schools_tsv, CENTERS_TSV, PREFS_TSV, "-s", "7", "-o", output_dir + "/"])
+        self.assertEqual(result.unassigned[cells[0]], int(cells[1]))
+        self.assertNotIn(cells[0], {row["scode"] for row in result.allocations})
+
+    def test_cli_distance_file_options(self):
+        """_Test if the distance file can be limited to the top candidates, compressed or skipped_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            output = os.path.join(output_dir, "allocation.tsv")
+            result = main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, "-s", "7", "-o", output, "--distance-file-top", "2",
+                           "--compress", "gzip"])
+            with gzip.open(os.path.join(output_dir, "school-center-distance.tsv.gz"), "rt", encoding="utf-8") as file:
+                rows = list(csv.DictReader(file, delimiter="\t"))
+            self.assertEqual(len(rows), len(result.distances))
+            per_school = {}
+            for row in rows:
+                per_school[row["scode"]] = per_school.get(row["scode"], 0) + 1
+            self.assertLessEqual(max(per_school.values()), 2)
+            self.assertEqual(result.allocations, allocate_centers(self.schools, self.centers, self.prefs, seed=7).allocations)
+            self.assertTrue(os.path.exists(output + ".gz"))
+
+            no_distances_dir = os.path.join(output_dir, "no-distances")
+            main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, "-s", "7", "-o", os.path.join(no_distances_dir, "allocation.tsv"),
+                  "--no-distance-file"])
+            self.assertEqual(os.listdir(no_distances_dir), ["allocation.tsv"])
+
+    def test_cli_sqlite_format(self):
+        """_Test if the sqlite format holds the same allocations as the TSV output_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, "-s", "7", "-o", os.path.join(output_dir, "allocation.tsv"),
+                           "--format", "sqlite"])
+            self.assertEqual(os.listdir(output_dir), ["allocation.sqlite"])
+            rows = read_sqlite(os.path.join(output_dir, "allocation.sqlite"), "allocations")
+            self.assertEqual(len(read_sqlite(os.path.join(output_dir, "allocation.sqlite"), "distances")),
+                             len(result.distances))
+        self.assertEqual([(row["scode"], row["cscode"], row["allocation"]) for row in rows],
+                         [(row["scode"], row["cscode"], row["allocation"]) for row in result.allocations])
+
+    def test_cli_metrics_out(self):
+        """_Test if the metrics file has phase timings and per-school counters_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            metrics_file = os.path.join(output_dir, "metrics.json")
+            main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, "-s", "7", "-o", os.path.join(output_dir, "allocation.tsv"),
+                  "--metrics-out", metrics_file])
+            with open(metrics_file, encoding="utf-8") as file:
+                metrics = json.load(file)
+        for phase in ("read", "distances", "ranked_centers", "allocate", "write"):
+            self.assertGreater(metrics["phases"][phase]["calls"], 0)
+        self.assertEqual(len(metrics["schools"]), len(self.schools))
+        self.assertEqual(metrics["totals"]["relaxed_pass"], metrics["phases"]["relaxed_pass"]["calls"])
+
+    def test_allocation_store(self):
+        """_Test if the sparse allocation store accumulates counts per school and center_"""
+        store = AllocationStore(num_centers=5)
+        store.add(3, 4, 10)
+        store.add(3, 4, 5)
+        store.add(0, 4, 1)
+        self.assertEqual(store.get(3, 4), 15)
+        self.assertEqual(store.get(4, 3), 0)
+        self.assertEqual(sorted(store.items()), [(0, 4, 1), (3, 4, 15)])
+        self.assertEqual(store.schools_at[4], {0, 3})
+
+
+class TestFlowSolver(unittest.TestCase):
+    """_Tests to validate the min-cost flow solver mode_"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.schools = read_tsv(SCHOOLS_TSV)
+        cls.centers = read_tsv(CENTERS_TSV)
+        cls.prefs = read_prefs(PREFS_TSV)
+        cls.result = allocate_centers(cls.schools, cls.centers, cls.prefs, seed=7, solver="flow")
+
+    def test_every_student_allocated(self):
+        """_Test if the flow solver places every student within the stretched capacities_"""
+        allocated = sum(row["allocation"] for row in self.result.allocations)
+        self.assertEqual(self.result.remaining, 0)
+        self.assertEqual(allocated, sum(int(s["count"]) for s in self.schools))
+        stretch = AllocationParams().stretch_capacity_factor
+        for c in self.centers:
+            self.assertGreaterEqual(self.result.centers_remaining_cap[c["cscode"]],
+                                    -int(int(c["capacity"]) * stretch))
+
+    def test_no_mutual_or_own_center(self):
+        """_Test if no school is its own center or the center of its center_"""
+        pairs = {(row["scode"], row["cscode"]) for row in self.result.allocations}
+        for scode, cscode in pairs:
+            self.assertNotEqual(scode, cscode)
+            self.assertNotIn((cscode, scode), pairs)
+
+    def test_min_student_in_center(self):
+        """_Test if a school has at most one center with fewer than MIN_STUDENT_IN_CENTER of its students_"""
+        small = {}
+        for row in self.result.allocations:
+            if row["allocation"] < AllocationParams().min_student_in_center:
+                small[row["scode"]] = small.get(row["scode"], 0) + 1
+        self.assertLessEqual(max(small.values(), default=0), 1)
+
+    def test_cli_solver_option(self):
+        """_Test if the command line wrapper accepts the flow solver_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, "-s", "7", "--solver", "flow",
+                           "-o", os.path.join(output_dir, "allocation.tsv")])
+            self.assertEqual(result.allocations, self.result.allocations)
+
+
+class TestIncrementalAllocation(unittest.TestCase):
+    """_Tests to validate re-allocation after small input edits_"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.schools = read_tsv(SCHOOLS_TSV)
+        cls.centers = read_tsv(CENTERS_TSV)
+        cls.prefs = read_prefs(PREFS_TSV)
+        cls.previous = allocate_centers(cls.schools, cls.centers, cls.prefs, seed=7).allocations
+
+    def test_unchanged_inputs_keep_everything(self):
+        """_Test if unchanged inputs give back the previous allocation_"""
+        result = IncrementalAllocator(self.schools, self.centers, self.prefs, self.previous, seed=1).run()
+        self.assertEqual(result.allocations, self.previous)
+        self.assertEqual(result.distances, [])
+
+    def test_edits_only_move_affected_students(self):
+        """_Test if a dropped center, a grown school and a new pref only move the students they affect_"""
+        dropped = self.previous[0]["cscode"]
+        grown = next(row["scode"] for row in self.previous if row["cscode"] != dropped)
+        banned = next(row for row in self.previous if row["cscode"] != dropped and row["scode"] != grown)
+        schools = [dict(s, count=str(int(s["count"]) + 50)) if s["scode"] == grown else s for s in self.schools]
+        centers = [c for c in self.centers if c["cscode"] != dropped]
+        prefs = dict(self.prefs, **{banned["scode"]: {banned["cscode"]: -5}})
+
+        result = IncrementalAllocator(schools, centers, prefs, self.previous, seed=1).run()
+        affected = {grown, banned["scode"]} | {row["scode"] for row in self.previous if row["cscode"] == dropped}
+        self.assertEqual([row for row in result.allocations if row["scode"] not in affected],
+                         [row for row in self.previous if row["scode"] not in affected])
+        self.assertNotIn(dropped, {row["cscode"] for row in result.allocations})
+        self.assertNotIn((banned["scode"], banned["cscode"]), {(row["scode"], row["cscode"]) for row in result.allocations})
+        allocated = sum(row["allocation"] for row in result.allocations)
+        self.assertEqual(allocated + result.remaining, sum(int(s["count"]) for s in schools))
+        stretch = AllocationParams().stretch_capacity_factor
+        for c in centers:
+            self.assertGreaterEqual(result.centers_remaining_cap[c["cscode"]], -int(int(c["capacity"]) * stretch))
+        pairs = {(row["scode"], row["cscode"]) for row in result.allocations}
+        self.assertFalse([pair for pair in pairs if pair[::-1] in pairs])
+
+    def test_cli_previous(self):
+        """_Test if the command line wrapper reads the previous allocation file_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            first = os.path.join(output_dir, "first", "allocation.tsv")
+            second = os.path.join(output_dir, "second", "allocation.tsv")
+            main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, "-s", "7", "-o", first])
+            main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, "-s", "8", "-o", second, "--previous", first])
+            with open(first, encoding="utf-8") as a, open(second, encoding="utf-8") as b:
+                self.assertEqual(a.read(), b.read())
+
+
+def shifted_copy(rows, code_key, degrees):
+    """_Return a copy of schools or centers moved east by degrees with new codes_"""
+    return [dict(row, **{code_key: "9" + row[code_key], "long": str(float(row["long"]) + degrees)}) for row in rows]
+
+
+class TestSharding(unittest.TestCase):
+    """_Tests to validate sharded allocation over two regions far apart_"""
+
+    @classmethod
+    def setUpClass(cls):
+        schools = read_tsv(SCHOOLS_TSV)
+        centers = read_tsv(CENTERS_TSV)
+        cls.schools = schools + shifted_copy(schools, "scode", 2)
+        cls.centers = centers + shifted_copy(centers, "cscode", 2)
+        cls.prefs = read_prefs(PREFS_TSV)
+        cls.result = allocate_sharded(cls.schools, cls.centers, cls.prefs, seed=7, jobs=2)
+
+    def test_shards_split_regions(self):
+        """_Test if each region becomes its own shard_"""
+        shards = shard_inputs(self.schools, self.centers)
+        half = len(self.schools) // 2
+        self.assertEqual(len(shards), 2)
+        self.assertEqual(shards[0]["schools"].tolist(), list(range(half)))
+        self.assertEqual(shards[1]["schools"].tolist(), list(range(half, 2 * half)))
+        self.assertTrue(all(shards[1]["centers"] >= len(self.centers) // 2))
+
+    def test_same_seed_same_result(self):
+        """_Test if the merged result does not depend on the no. of workers_"""
+        serial = allocate_sharded(self.schools, self.centers, self.prefs, seed=7, jobs=1)
+        self.assertEqual(serial.allocations, self.result.allocations)
+        self.assertEqual(serial.centers_remaining_cap, self.result.centers_remaining_cap)
+
+    def test_every_student_accounted_for(self):
+        """_Test if allocated and remaining students add up to the school counts_"""
+        allocated = sum(row["allocation"] for row in self.result.allocations)
+        self.assertEqual(allocated + self.result.remaining, sum(int(s["count"]) for s in self.schools))
+        capacity = sum(int(c["capacity"]) for c in self.centers)
+        self.assertEqual(capacity - sum(self.result.centers_remaining_cap.values()), allocated)
+        for row in self.result.allocations:
+            self.assertEqual(row["scode"].startswith("9"), row["cscode"].startswith("9"))
+
+
+class TestBatchMode(unittest.TestCase):
+    """_Tests to validate multi-seed batch runs_"""
+
+    def setUp(self):
+        self.schools = read_tsv(SCHOOLS_TSV)
+        self.centers = read_tsv(CENTERS_TSV)
+        self.prefs = read_prefs(PREFS_TSV)
+
+    def test_parse_seeds(self):
+        """_Test if seed ranges are inclusive and can be combined_"""
+        self.assertEqual(parse_seeds("1..3,7,10..11"), [1, 2, 3, 7, 10, 11])
+
+    def test_batch_matches_single_runs(self):
+        """_Test if each seed of a parallel batch matches a single run with that seed_"""
+        runs = list(run_batch(self.schools, self.centers, self.prefs, [1, 2, 3], jobs=2, keep_seeds=[2]))
+        self.assertEqual([summary["seed"] for summary, _ in runs], [1, 2, 3])
+        self.assertEqual([result is not None for _, result in runs], [False, True, False])
+        for summary, result in runs:
+            single = allocate_centers(self.schools, self.centers, self.prefs, seed=summary["seed"])
+            self.assertEqual(summary, summarize(single, summary["seed"]))
+        self.assertEqual(runs[1][1].allocations, allocate_centers(self.schools, self.centers, self.prefs, seed=2).allocations)
+
+    def test_cli_writes_summary_and_kept_seeds(self):
+        """_Test if batch mode writes one summary row per seed and the kept allocations_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, "--seeds", "1..2", "--keep-seeds", "2", "-j", "1",
+                  "-o", output_dir + "/"])
+            summary = ParseTSVFile(os.path.join(output_dir, "batch-summary.tsv")).get_rows()
+            self.assertEqual([row["seed"] for row in summary], ["1", "2"])
+            self.assertTrue(os.path.exists(os.path.join(output_dir, "seed-2", "school-center.tsv")))
+            self.assertFalse(os.path.exists(os.path.join(output_dir, "seed-1")))
+
+
+class InterruptingCheckpoint(Checkpoint):
+    """_Checkpoint that saves every time and interrupts the run after the given no. of saves_"""
+
+    def __init__(self, file_path, key, saves):
+        super().__init__(file_path, key, interval=0)
+        self.saves = saves
+
+    def save(self, state):
+        super().save(state)
+        self.saves -= 1
+        if self.saves == 0:
+            raise KeyboardInterrupt()
+
+
+class TestCheckpointResume(unittest.TestCase):
+    """_Tests to validate that resumed runs match uninterrupted runs_"""
+
+    def setUp(self):
+        self.schools = read_tsv(SCHOOLS_TSV)
+        self.centers = read_tsv(CENTERS_TSV)
+        self.prefs = read_prefs(PREFS_TSV)
+        self.dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.dir.name, "checkpoint.pkl")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_resumed_allocation_matches(self):
+        """_Test if an allocation interrupted halfway and resumed matches an uninterrupted run_"""
+        expected = allocate_centers(self.schools, self.centers, self.prefs, seed=7)
+        with self.assertRaises(KeyboardInterrupt):
+            allocate_centers(self.schools, self.centers, self.prefs, seed=7,
+                             checkpoint=InterruptingCheckpoint(self.file_path, "key", len(self.schools) // 2))
+        resumed = allocate_centers(self.schools, self.centers, self.prefs, seed=7,
+                                   checkpoint=Checkpoint(self.file_path, "key", resume=True))
+        self.assertEqual(resumed.allocations, expected.allocations)
+        self.assertEqual(resumed.distances, expected.distances)
+        self.assertEqual(resumed.centers_remaining_cap, expected.centers_remaining_cap)
+        self.assertEqual(resumed.unassigned, expected.unassigned)
+
+    def test_resumed_unseeded_allocation(self):
+        """_Test if an unseeded allocation resumes in the order of the interrupted run, placing every student once_"""
+        with self.assertRaises(KeyboardInterrupt):
+            allocate_centers(self.schools, self.centers, self.prefs,
+                             checkpoint=InterruptingCheckpoint(self.file_path, "key", len(self.schools) // 2))
+        resumed = allocate_centers(self.schools, self.centers, self.prefs,
+                                   checkpoint=Checkpoint(self.file_path, "key", resume=True))
+        placed = {}
+        for row in resumed.allocations:
+            placed[row["scode"]] = placed.get(row["scode"], 0) + int(row["allocation"])
+        for school in self.schools:
+            self.assertEqual(placed.get(school["scode"], 0) + resumed.unassigned.get(school["scode"], 0),
+                             int(school["count"]), school["scode"])
+
+    def test_resumed_batch_skips_done_seeds(self):
+        """_Test if a resumed batch only runs the seeds missing from the checkpoint_"""
+        with self.assertRaises(KeyboardInterrupt):
+            list(run_batch(self.schools, self.centers, self.prefs, [1, 2, 3], jobs=1,
+                           checkpoint=InterruptingCheckpoint(self.file_path, "key", 1)))
+        checkpoint = Checkpoint(self.file_path, "key", resume=True)
+        self.assertEqual(list(checkpoint.load()), [1])
+        runs = list(run_batch(self.schools, self.centers, self.prefs, [1, 2, 3], jobs=1, checkpoint=checkpoint))
+        expected = list(run_batch(self.schools, self.centers, self.prefs, [1, 2, 3], jobs=1))
+        self.assertEqual(runs, expected)
+
+    def test_cli_resume(self):
+        """_Test if the cli resumes from its checkpoint and removes it once the output is written_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            args = [SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, "-s", "7", "-o", output_dir + "/"]
+            expected = main(args)
+            main(args + ["--checkpoint-interval", "0"])
+            self.assertFalse(os.path.exists(os.path.join(output_dir, ".checkpoint.pkl")))
+            resumed = main(args + ["--resume"])
+            self.assertEqual(resumed.allocations, expected.allocations)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import sys
+import os
+import random
+
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.sharding import connected_components, group_components
+
+
+def brute_force_labels(num_nodes, edges):
+    """_Return the smallest node index reachable from every node by graph search_"""
+    neighbours = [set() for _ in range(num_nodes)]
+    for u, v in edges:
+        neighbours[u].add(v)
+        neighbours[v].add(u)
+    labels = []
+    for node in range(num_nodes):
+        seen, stack = {node}, [node]
+        while stack:
+            for v in neighbours[stack.pop()] - seen:
+                seen.add(v)
+                stack.append(v)
+        labels.append(min(seen))
+    return labels
+
+
+class TestConnectedComponents(unittest.TestCase):
+    """_Tests to validate vectorized connected components against graph search_"""
+
+    def test_matches_brute_force(self):
+        """_Test if random sparse graphs get the same labels as a graph search_"""
+        rng = random.Random(5)
+        for _ in range(50):
+            num_nodes = rng.randint(1, 60)
+            edges = [(rng.randrange(num_nodes), rng.randrange(num_nodes)) for _ in range(rng.randint(0, 50))]
+            sources, targets = zip(*edges) if edges else ((), ())
+            labels = connected_components(num_nodes, np.array(sources), np.array(targets))
+            self.assertEqual(labels.tolist(), brute_force_labels(num_nodes, edges))
+
+    def test_long_chain(self):
+        """_Test if a chain given in reverse order collapses into one component_"""
+        labels = connected_components(1000, np.arange(999, 0, -1), np.arange(998, -1, -1))
+        self.assertTrue((labels == 0).all())
+
+    def test_group_components(self):
+        """_Test if components are grouped in order of their smallest node_"""
+        groups = group_components(np.array([0, 1, 0, 3, 1, 3]))
+        self.assertEqual([g.tolist() for g in groups], [[0, 2], [1, 4], [3, 5]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import sys
+import os
+
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test.utils.custom_tsv_parser import ParseTSVFile
+from utils.distance import haversine_matrix, parse_coords
+from utils.spatial_index import CenterIndex
+
+
+class TestCenterIndex(unittest.TestCase):
+    """_Tests to validate radius and nearest queries of the center index
+    against a brute force scan over the sample data_
+    """
+
+    def setUp(self):
+        self.schools = parse_coords(ParseTSVFile("sample_data/schools_grade12_2081.tsv").get_rows())[:60]
+        self.centers = parse_coords(ParseTSVFile("sample_data/centers_grade12_2081.tsv").get_rows())
+        self.distances = haversine_matrix(self.schools, self.centers)
+        self.index = CenterIndex(self.centers, cell_km=2)
+
+    def test_within_matches_brute_force(self):
+        """_Test if radius queries return every center within the radius and nothing else_"""
+        for radius in (0.5, 2, 7, 50):
+            for (lat, long), row in zip(self.schools, self.distances):
+                expected = np.flatnonzero(row <= radius).tolist()
+                self.assertEqual(self.index.within(lat, long, radius).tolist(), expected)
+
+    def test_nearest_matches_brute_force(self):
+        """_Test if k nearest queries return the k closest centers_"""
+        for k in (1, 10, len(self.centers) + 5):
+            for (lat, long), row in zip(self.schools, self.distances):
+                expected = sorted(np.argsort(row, kind="stable")[:k].tolist())
+                self.assertEqual(self.index.nearest(lat, long, k).tolist(), expected)
+
+    def test_missing_coordinates_are_skipped(self):
+        """_Test if centers without coordinates are never returned_"""
+        coords = np.array([[27.7, 85.3], [np.nan, np.nan], [27.71, 85.31]])
+        index = CenterIndex(coords)
+        self.assertEqual(index.within(27.7, 85.3, 5).tolist(), [0, 2])
+        self.assertEqual(index.nearest(27.7, 85.3, 5).tolist(), [0, 2])
+        self.assertEqual(CenterIndex(np.empty((0, 2))).nearest(27.7, 85.3, 1).tolist(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
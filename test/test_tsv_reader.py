@@ -0,0 +1,97 @@
+import unittest
+import sys
+import os
+import csv
+import pickle
+import tempfile
+
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.distance import parse_coords
+from utils.tsv_reader import (CENTERS_SCHEMA, PREFS_SCHEMA, SCHOOLS_SCHEMA, SchemaError, parse_table, read_table,
+                              typed_column)
+
+SCHOOLS_TSV = "sample_data/schools_grade12_2081.tsv"
+
+
+class TestTsvReader(unittest.TestCase):
+    """_Tests to validate typed TSV ingestion and schema validation_"""
+
+    def test_rows_match_dict_reader(self):
+        """_Test if the memory mapped reader reads the same rows as csv.DictReader_"""
+        with open(SCHOOLS_TSV, newline="", encoding="utf-8") as file:
+            expected = [dict(row) for row in csv.DictReader(file, delimiter="\t")]
+        table = read_table(SCHOOLS_TSV, SCHOOLS_SCHEMA)
+        self.assertEqual(table.rows(), expected)
+        self.assertEqual(len(table), len(expected))
+        self.assertEqual(table.typed["count"].tolist(), [int(row["count"]) for row in expected])
+        self.assertEqual(table.typed["lat"].tolist(), [float(row["lat"]) for row in expected])
+
+    def test_crlf_bom_and_blank_lines(self):
+        """_Test if CRLF line endings, a byte order mark and blank lines are handled_"""
+        table = parse_table("\ufeffscode\tcscode\tpref\r\n27001\t27999\t-5\r\n\r\n27002\t27001\t10\r\n", PREFS_SCHEMA)
+        self.assertEqual(table.text["scode"], ["27001", "27002"])
+        self.assertEqual(table.typed["pref"].tolist(), [-5, 10])
+
+    def test_reports_every_bad_row(self):
+        """_Test if all bad rows are reported at once with their line and column_"""
+        text = ("cscode\tcapacity\tlat\tlong\n"
+                "27003\t500\t27.7\t85.3\n"
+                "27004\tmany\t\t85.3\n"
+                "\t-1\t127.7\t85.3\n"
+                "27006\t100\t27.7\n")
+        with self.assertRaises(SchemaError) as raised:
+            parse_table(text, CENTERS_SCHEMA, "centers.tsv")
+        errors = [(error.line, error.column, error.reason) for error in raised.exception.errors]
+        self.assertEqual(errors, [
+            (3, "capacity", "not an integer"),
+            (3, "lat", "missing value"),
+            (4, "capacity", "less than 0"),
+            (4, "cscode", "missing value"),
+            (4, "lat", "outside -90 to 90"),
+            (5, "", "3 fields, expected 4"),
+            (5, "long", "missing value"),
+        ])
+        self.assertIn("7 invalid values in centers.tsv", str(raised.exception))
+
+    def test_line_numbers_after_blank_lines(self):
+        """_Test if bad rows after blank lines are reported with their line in the file_"""
+        with self.assertRaises(SchemaError) as raised:
+            parse_table("scode\tcscode\tpref\n\n27001\t27999\t-5\n\n\n27002\t27001\tten\n", PREFS_SCHEMA)
+        self.assertEqual([(error.line, error.column) for error in raised.exception.errors], [(6, "pref")])
+
+    def test_blank_school_coordinates(self):
+        """_Test if blank school coordinates read as NaN while other bad values are still reported_"""
+        table = parse_table("scode\tcount\tlat\tlong\n27001\t10\t\t\n27002\t20\t27.7\t85.3\n", SCHOOLS_SCHEMA)
+        self.assertTrue(np.isnan(table.typed["lat"][0]))
+        self.assertEqual(table.typed["long"][1], 85.3)
+        self.assertTrue(np.isnan(parse_coords(table.rows())[0]).all())
+        with self.assertRaises(SchemaError) as raised:
+            parse_table("scode\tcount\tlat\tlong\n27001\t10\tnan\t\n", SCHOOLS_SCHEMA)
+        self.assertEqual([error.column for error in raised.exception.errors], ["lat"])
+
+    def test_rows_carry_typed_columns(self):
+        """_Test if rows keep the typed arrays for typed_column and parse_coords, and plain lists are parsed_"""
+        rows = read_table(SCHOOLS_TSV, SCHOOLS_SCHEMA).rows()
+        self.assertIs(typed_column(rows, "count"), rows.typed["count"])
+        self.assertEqual(typed_column(list(rows), "count").tolist(), rows.typed["count"].tolist())
+        self.assertEqual(parse_coords(rows).tolist(), parse_coords(list(rows)).tolist())
+        self.assertEqual(pickle.loads(pickle.dumps(rows)).typed["lat"].tolist(), rows.typed["lat"].tolist())
+
+    def test_missing_column(self):
+        """_Test if a missing schema column is reported_"""
+        with self.assertRaises(SchemaError) as raised:
+            parse_table("scode\tlat\tlong\n27001\t27.7\t85.3\n", SCHOOLS_SCHEMA)
+        self.assertEqual([error.column for error in raised.exception.errors], ["count"])
+
+    def test_empty_file(self):
+        """_Test if an empty file reads as an empty table_"""
+        with tempfile.NamedTemporaryFile(suffix=".tsv") as file:
+            self.assertEqual(read_table(file.name).rows(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
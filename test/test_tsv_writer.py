@@ -0,0 +1,64 @@
+import unittest
+import sys
+import os
+import csv
+import gzip
+import io
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.tsv_writer import output_path, write_tsv, zstd_available
+
+COLUMNS = ["scode", "name", "distance_km"]
+ROWS = [{"scode": str(i), "name": f'school "{i}"\twith tab', "distance_km": i / 7} for i in range(25)]
+
+
+def dict_writer_output(columns, rows):
+    """_Return what csv.DictWriter writes for the rows_"""
+    file = io.StringIO()
+    writer = csv.DictWriter(file, fieldnames=columns, delimiter="\t")
+    writer.writeheader()
+    writer.writerows(rows)
+    return file.getvalue()
+
+
+class TestWriteTSV(unittest.TestCase):
+    """_Tests to validate buffered and compressed TSV output_"""
+
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+
+    def test_matches_dict_writer(self):
+        """_Test if the output is byte for byte what csv.DictWriter writes, also from a generator_"""
+        file_path = write_tsv(os.path.join(self.output_dir.name, "rows.tsv"), COLUMNS, (row for row in ROWS))
+        with open(file_path, encoding="utf-8", newline="") as file:
+            self.assertEqual(file.read(), dict_writer_output(COLUMNS, ROWS))
+
+    def test_gzip(self):
+        """_Test if gzip output gets the .gz suffix and decompresses to the plain output_"""
+        file_path = write_tsv(os.path.join(self.output_dir.name, "rows.tsv"), COLUMNS, ROWS, "gzip")
+        self.assertTrue(file_path.endswith("rows.tsv.gz"))
+        with gzip.open(file_path, "rt", encoding="utf-8", newline="") as file:
+            self.assertEqual(file.read(), dict_writer_output(COLUMNS, ROWS))
+
+    @unittest.skipUnless(zstd_available(), "zstandard is not installed")
+    def test_zstd(self):
+        """_Test if zstd output decompresses to the plain output_"""
+        import zstandard
+        file_path = write_tsv(os.path.join(self.output_dir.name, "rows.tsv"), COLUMNS, ROWS, "zstd")
+        with open(file_path, "rb") as file:
+            text = zstandard.ZstdDecompressor().stream_reader(file).read().decode("utf-8")
+        self.assertEqual(text, dict_writer_output(COLUMNS, ROWS))
+
+    def test_output_path(self):
+        """_Test if the compression suffix is only added once_"""
+        self.assertEqual(output_path("a.tsv"), "a.tsv")
+        self.assertEqual(output_path("a.tsv", "gzip"), "a.tsv.gz")
+        self.assertEqual(output_path("a.tsv.zst", "zstd"), "a.tsv.zst")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.typed_output import parquet_available, read_parquet, read_sqlite, write_parquet, write_sqlite
+
+COLUMNS = ["scode", "cscode", "allocation", "distance_km"]
+TYPES = {"allocation": int, "distance_km": float}
+ROWS = [{"scode": "0" + str(27000 + i), "cscode": str(27100 + i % 3), "allocation": str(i), "distance_km": i / 3}
+        for i in range(10)]
+
+
+class TestTypedOutput(unittest.TestCase):
+    """_Tests to validate typed SQLite and Parquet output_"""
+
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+
+    def test_sqlite_typed_and_indexed(self):
+        """_Test if codes keep leading zeros, numbers are typed and code columns are indexed_"""
+        file_path = write_sqlite(os.path.join(self.output_dir.name, "results.sqlite"),
+                                 {"allocations": (COLUMNS, TYPES, ROWS)})
+        rows = read_sqlite(file_path, "allocations")
+        self.assertEqual(rows[1], {"scode": "027001", "cscode": "27101", "allocation": 1, "distance_km": 1 / 3})
+        self.assertEqual([row["scode"] for row in read_sqlite(file_path, "allocations", cscode="27102")],
+                         ["027002", "027005", "027008"])
+        with sqlite3.connect(file_path) as connection:
+            indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        connection.close()
+        self.assertEqual(indexes, {"allocations_scode", "allocations_cscode"})
+
+    def test_empty_cells_are_null(self):
+        """_Test if empty cells are written as NULL instead of failing the type conversion_"""
+        file_path = write_sqlite(os.path.join(self.output_dir.name, "results.sqlite"),
+                                 {"allocations": (COLUMNS, TYPES, [dict(ROWS[0], distance_km="")])})
+        self.assertIsNone(read_sqlite(file_path, "allocations")[0]["distance_km"])
+
+    @unittest.skipUnless(parquet_available(), "pyarrow is not installed")
+    def test_parquet_roundtrip(self):
+        """_Test if Parquet output keeps the typed rows and can be filtered by code_"""
+        file_path = write_parquet(os.path.join(self.output_dir.name, "results.parquet"), (COLUMNS, TYPES, ROWS))
+        rows = read_parquet(file_path)
+        self.assertEqual(rows[3], {"scode": "027003", "cscode": "27100", "allocation": 3, "distance_km": 1.0})
+        self.assertEqual(len(read_parquet(file_path, [("cscode", "=", "27100")])), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from school_center import read_prefs, read_tsv
+from test.utils.custom_tsv_parser import ParseTSVFile
+from test.utils.shared_run import CENTERS_TSV, PREFS_TSV, SCHOOLS_TSV, shared_run
+from validate_allocation import main, validate
+
+
+class TestValidateAllocation(unittest.TestCase):
+    """_Tests to validate the allocation rule checks on the shared run_"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.allocation_tsv = os.path.join(shared_run(), "school-center.tsv")
+        cls.schools = read_tsv(SCHOOLS_TSV)
+        cls.centers = read_tsv(CENTERS_TSV)
+        cls.prefs = read_prefs(PREFS_TSV)
+        cls.allocations = read_tsv(cls.allocation_tsv)
+
+    def rules(self, allocations, prefs=None):
+        violations = validate(self.schools, self.centers, prefs or self.prefs, allocations)
+        return {v.rule for v in violations if v.severity == "error"}
+
+    def test_shared_run_follows_rules(self):
+        """_Test if the allocation of the sample data breaks no rule_"""
+        self.assertEqual(self.rules(self.allocations), set())
+
+    def test_own_and_mutual_center(self):
+        """_Test if own center and mutual allocations are caught_"""
+        first = self.allocations[0]
+        own = dict(first, cscode=first["scode"])
+        self.assertIn("own_center", self.rules(self.allocations + [own]))
+        mutual = dict(first, scode=first["cscode"], cscode=first["scode"], allocation="0")
+        self.assertIn("mutual", self.rules(self.allocations + [mutual]))
+
+    def test_pref_cutoff(self):
+        """_Test if a center with a pref at or below PREF_CUTOFF is caught_"""
+        first = self.allocations[0]
+        prefs = dict(self.prefs, **{first["scode"]: {first["cscode"]: -5}})
+        self.assertEqual(self.rules(self.allocations, prefs), {"pref_cutoff"})
+
+    def test_capacity_and_school_count(self):
+        """_Test if centers over their stretched capacity and over allocated schools are caught_"""
+        first = self.allocations[0]
+        allocations = [dict(first, allocation="100000")] + self.allocations[1:]
+        self.assertEqual(self.rules(allocations), {"capacity", "school_count"})
+
+    def test_distances(self):
+        """_Test if a wrong distance_km and a far center are caught_"""
+        first = self.allocations[0]
+        wrong = [dict(first, distance_km="0.5")] + self.allocations[1:]
+        self.assertEqual(self.rules(wrong), {"distance_km"})
+        far_center = max(self.centers, key=lambda c: abs(float(c["lat"]) - float(first["center_lat"])))
+        far = [dict(first, cscode=far_center["cscode"])] + self.allocations[1:]
+        self.assertIn("distance", self.rules(far))
+        self.assertIn("distance_km", self.rules(far))
+
+    def test_cli(self):
+        """_Test if the command line writes the violations and fails only on errors_"""
+        with tempfile.TemporaryDirectory() as output_dir:
+            output = os.path.join(output_dir, "violations.tsv")
+            main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, self.allocation_tsv, "-o", output])
+            rows = ParseTSVFile(output).get_rows()
+            self.assertTrue(all(row["severity"] == "warning" for row in rows))
+            if rows:
+                with self.assertRaises(SystemExit):
+                    main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, self.allocation_tsv, "--strict"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import atexit
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+
+from school_center import main
+
+SCHOOLS_TSV = "sample_data/schools_grade12_2081.tsv"
+CENTERS_TSV = "sample_data/centers_grade12_2081.tsv"
+PREFS_TSV = "sample_data/prefs.tsv"
+SEED = 7
+
+
+@lru_cache(maxsize=None)
+def shared_run() -> str:
+    """
+    Run school_center.py once per test session on the sample data and return the output directory
+    holding school-center.tsv and school-center-distance.tsv.
+    """
+    output_dir = tempfile.mkdtemp(prefix="school-center-")
+    atexit.register(shutil.rmtree, output_dir, ignore_errors=True)
+    main([SCHOOLS_TSV, CENTERS_TSV, PREFS_TSV, "-s", str(SEED), "-o", output_dir + os.sep])
+    return output_dir
@@ -0,0 +1,72 @@
+"""Periodic checkpoints of long runs, to resume them after a crash."""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_S = 60     # Min. seconds between two checkpoints
+
+
+def inputs_key(*inputs) -> str:
+    """
+    Return a hash of everything that determines the outcome of a run.
+    """
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=repr).encode('utf-8')).hexdigest()
+
+
+class Checkpoint:
+    """
+    Run state pickled to a file, replaced atomically so that a crash while saving
+    leaves the previous checkpoint intact.
+
+    key: inputs_key of the run, a checkpoint of other inputs is never resumed
+    resume: Load the state saved by an earlier run, otherwise start afresh
+    interval: Min. seconds between saves, see due()
+    """
+
+    def __init__(self, file_path: str, key: str, resume: bool = False, interval: float = DEFAULT_INTERVAL_S):
+        self.file_path = file_path
+        self.key = key
+        self.resume = resume
+        self.interval = interval
+        self.last_save = time.monotonic()
+
+    def due(self) -> bool:
+        """
+        Return true if interval seconds have passed since the last save.
+        """
+        return time.monotonic() - self.last_save >= self.interval
+
+    def save(self, state):
+        temp_path = self.file_path + '.partial'
+        with open(temp_path, 'wb') as file:
+            pickle.dump({'key': self.key, 'state': state}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.file_path)
+        self.last_save = time.monotonic()
+
+    def load(self) -> Optional[any]:
+        """
+        Return the saved state when resuming a run with the same inputs, None otherwise.
+        """
+        if not self.resume or not os.path.exists(self.file_path):
+            return None
+        with open(self.file_path, 'rb') as file:
+            checkpoint = pickle.load(file)
+        if checkpoint['key'] != self.key:
+            logger.warning(f"Checkpoint {self.file_path} is of a run with other inputs, starting afresh")
+            return None
+        logger.info(f"Resuming from checkpoint {self.file_path}")
+        return checkpoint['state']
+
+    def clear(self):
+        """
+        Remove the checkpoint once the run is complete.
+        """
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
@@ -1,39 +1,85 @@
 """Custom logging module with some formatting."""
 
+import atexit
+import json
+import logging
 import os
 import sys
-import logging.config
 from os.path import abspath, dirname, join, exists
+from typing import Optional
 
 
 ROOT_DIR: str = abspath(dirname(dirname(__file__)))
 LOGS_DIR: str = join(ROOT_DIR, "logs")
 LOGS_TARGET: str = join(ROOT_DIR, "logs", "custom_logs.log")
+METRICS_TARGET: str = join(ROOT_DIR, "logs", "metrics.log")
+PROFILE_TARGET: str = join(ROOT_DIR, "logs", "profile.pstats")
+METRICS_LOGGER = "metrics"
 CUSTOM_FILE_HANDLER_PATH = "utils.custom_file_handler.CustomFileHandler"
+JSONL_LEVEL = "WARNING"     # Records written to the --log-jsonl file, e.g. one per school left unallocated
 
-if not exists(LOGS_DIR):
-    os.makedirs(LOGS_DIR)
 
-if not exists(LOGS_TARGET):
-    with open(LOGS_TARGET, "a", encoding="utf-8") as file:
-        os.utime(LOGS_TARGET, None)
+class LevelFormatter(logging.Formatter):
+    """Formatter marking each record with the emoji of its level, so that one console handler serves all levels."""
+
+    EMOJIS = {logging.WARNING: "🔔", logging.ERROR: "❌", logging.CRITICAL: "❌"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        return f"{self.EMOJIS.get(record.levelno, '🚀')} {super().format(record)}"
+
+
+class MaxLevelFilter(logging.Filter):
+    """Pass only records below level, which another handler reports."""
+
+    def __init__(self, level: str):
+        super().__init__()
+        self.level = logging.getLevelName(level)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno < self.level
+
+
+# attributes of every LogRecord; the others are the extra fields of the logging call
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record with its time, level, logger, message and extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = {"time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage()}
+        line.update({key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES})
+        return json.dumps(line, ensure_ascii=False, default=str)
 
 
 LOGGING_CONFIG: dict = {
     "version": 1,
+    "disable_existing_loggers": False,
     "formatters": {
-        "standard": {
-            "datefmt": "%y-%m-%d %H:%M:%S",
-            "format": "🚀 %(asctime)s - %(name)s - %(levelname)s - %(message)s \n",
-        },
-        "warn": {
+        "level": {
+            "()": "utils.custom_logger.LevelFormatter",
             "datefmt": "%y-%m-%d %H:%M:%S",
-            "format": "🔔 %(asctime)s - %(name)s - %(levelname)s - %(message)s \n",
+            "fmt": "%(asctime)s - %(name)s - %(levelname)s - %(message)s \n",
         },
         "error": {
             "datefmt": "%y-%m-%d %H:%M:%S",
             "format": "❌ %(asctime)s - %(name)s - %(levelname)s - %(message)s \n",
         },
+        "metrics": {
+            "format": "%(message)s",
+        },
+        "jsonl": {
+            "()": "utils.custom_logger.JsonLinesFormatter",
+        },
+    },
+    "filters": {
+        "below_error": {
+            "()": "utils.custom_logger.MaxLevelFilter",
+            "level": "ERROR",
+        },
     },
     "handlers": {
         "file_error": {
@@ -44,16 +90,12 @@ LOGGING_CONFIG: dict = {
             "filename": LOGS_TARGET,
             "class": CUSTOM_FILE_HANDLER_PATH,
         },
-        "console_info": {
+        # each record is printed once: below ERROR on stdout, from ERROR on stderr
+        "console": {
             "level": "INFO",
             "stream": sys.stdout,
-            "formatter": "standard",
-            "class": "logging.StreamHandler",
-        },
-        "console_warn": {
-            "level": "WARN",
-            "formatter": "warn",
-            "stream": sys.stdout,
+            "formatter": "level",
+            "filters": ["below_error"],
             "class": "logging.StreamHandler",
         },
         "console_error": {
@@ -62,18 +104,131 @@ LOGGING_CONFIG: dict = {
             "formatter": "error",
             "class": "logging.StreamHandler",
         },
+        "file_metrics": {
+            "mode": "a",
+            "level": "INFO",
+            "encoding": "utf-8",
+            "formatter": "metrics",
+            "filename": METRICS_TARGET,
+            "class": CUSTOM_FILE_HANDLER_PATH,
+        },
     },
     "loggers": {
         "": {
             "level": "INFO",
             "propagate": True,
-            "handlers": ["file_error", "console_info", "console_warn", "console_error"],
-        }
+            "handlers": ["file_error", "console", "console_error"],
+        },
+        # run metrics and profiles, one JSON line per run
+        METRICS_LOGGER: {
+            "level": "INFO",
+            "propagate": False,
+            "handlers": ["file_metrics"],
+        },
     },
 }
 
 
-# Call this once to initialize logger
-def configure_logging() -> None:
-    """Pass the logging configuration to logger."""
-    logging.config.dictConfig(LOGGING_CONFIG)
+_configured = None      # (queue, jsonl_path) of the current configuration
+_listener = None        # QueueListener running the handlers when configured with queue
+
+
+def jsonl_handler_config(jsonl_path: str) -> dict:
+    return {
+        "mode": "a",
+        "level": JSONL_LEVEL,
+        "encoding": "utf-8",
+        "formatter": "jsonl",
+        "filename": jsonl_path,
+        "class": CUSTOM_FILE_HANDLER_PATH,
+    }
+
+
+def prepare_record(record: logging.LogRecord) -> logging.LogRecord:
+    """
+    Merge the arguments into the message before the record is queued, in place: the queue stays in
+    this process, so the record needs neither the copy nor the formatting QueueHandler.prepare does.
+    """
+    record.msg = record.getMessage()
+    record.args = None
+    return record
+
+
+def start_queue_listener():
+    """
+    Move the handlers of the root logger behind a QueueHandler: logging calls only enqueue
+    records, a background thread formats and writes them.
+    """
+    import logging.handlers
+    import queue
+
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    for handler in handlers:
+        root.removeHandler(handler)
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.prepare = prepare_record
+    root.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_logging() -> None:
+    """Write the records still queued and stop the background thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _handlers_in_child() -> None:
+    # a forked worker has no listener thread: it writes through the handlers directly
+    global _listener
+    if _listener is not None:
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        for handler in _listener.handlers:
+            root.addHandler(handler)
+        _listener = None
+
+
+atexit.register(stop_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_handlers_in_child)
+
+
+# Called by the command line entry points, before the first log line; importing modules configures nothing
+def configure_logging(queue: bool = False, jsonl_path: Optional[str] = None) -> None:
+    """
+    Create the logs directory and pass the logging configuration to logger, once per process
+    unless the options change.
+    queue: Format and write records on a background thread (QueueHandler/QueueListener)
+    jsonl_path: Also write records from JSONL_LEVEL as JSON lines to this file, creating its directory
+    """
+    global _configured, _listener
+    if _configured == (queue, jsonl_path):
+        return
+    import logging.config
+
+    if not exists(LOGS_DIR):
+        os.makedirs(LOGS_DIR)
+
+    if not exists(LOGS_TARGET):
+        with open(LOGS_TARGET, "a", encoding="utf-8"):
+            os.utime(LOGS_TARGET, None)
+
+    stop_logging()
+    config = LOGGING_CONFIG
+    if jsonl_path:
+        os.makedirs(dirname(abspath(jsonl_path)), exist_ok=True)
+        root = LOGGING_CONFIG["loggers"][""]
+        config = dict(LOGGING_CONFIG,
+                      handlers=dict(LOGGING_CONFIG["handlers"], jsonl=jsonl_handler_config(jsonl_path)),
+                      loggers=dict(LOGGING_CONFIG["loggers"], **{"": dict(root, handlers=root["handlers"] + ["jsonl"])}))
+    logging.config.dictConfig(config)
+    if queue:
+        _listener = start_queue_listener()
+    _configured = (queue, jsonl_path)
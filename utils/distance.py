@@ -0,0 +1,201 @@
+"""Vectorized haversine distances between schools and centers."""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Sequence
+
+from utils.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+
+RADIUS_EARTH_KM = 6371          # Average Radius of Earth in km
+DEFAULT_BLOCK_SIZE = 1024       # No. of school rows computed per vectorized block
+SCREEN_TOLERANCE_KM = 1e-9      # Slack used when screening thresholds on vectorized distances
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Calculate the great circle distance between two points
+    on the earth specified in decimal degrees
+    - Reference: https://en.wikipedia.org/wiki/Haversine_formula
+    """
+    # Convert decimal degrees to radians
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+
+    # Haversine formula 
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    distance = RADIUS_EARTH_KM * c
+    return distance
+
+
+def parse_coords(rows: Sequence[Dict[str, str]]) -> np.ndarray:
+    """
+    Parse the 'lat' and 'long' fields of schools/centers once into a float array
+    of shape (n, 2). Blank or missing coordinates are stored as NaN.
+    The typed lat and long arrays of tsv_reader.Rows are used as they are.
+    """
+    typed = getattr(rows, 'typed', None)
+    if typed is not None and 'lat' in typed and 'long' in typed:
+        coords = np.column_stack((typed['lat'], typed['long'])).astype(np.float64)
+        coords[np.isnan(coords).any(axis=1)] = np.nan
+        return coords
+    coords = np.full((len(rows), 2), np.nan, dtype=np.float64)
+    for i, row in enumerate(rows):
+        lat, long = row.get('lat'), row.get('long')
+        if lat and long:
+            coords[i] = (float(lat), float(long))
+    return coords
+
+
+def _haversine_terms(lat1, lon1, lat2, lon2):
+    """
+    Return (sqrt(a), sqrt(1 - a)) of the haversine formula for broadcastable
+    arrays of coordinates in decimal degrees.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    return np.sqrt(a), np.sqrt(1-a)
+
+
+def haversine_matrix(from_coords: np.ndarray, to_coords: np.ndarray) -> np.ndarray:
+    """
+    Return the matrix of great circle distances in km from every point in
+    from_coords (n, 2) to every point in to_coords (m, 2) as an (n, m) array.
+    """
+    y, x = _haversine_terms(from_coords[:, 0, None], from_coords[:, 1, None],
+                            to_coords[None, :, 0], to_coords[None, :, 1])
+    return RADIUS_EARTH_KM * 2 * np.arctan2(y, x)
+
+
+def haversine_pairs(from_coords: np.ndarray, to_coords: np.ndarray) -> np.ndarray:
+    """
+    Return the great circle distances in km between matching rows of from_coords
+    and to_coords, both of shape (n, 2).
+    """
+    y, x = _haversine_terms(from_coords[:, 0], from_coords[:, 1], to_coords[:, 0], to_coords[:, 1])
+    return RADIUS_EARTH_KM * 2 * np.arctan2(y, x)
+
+
+class DistanceEngine:
+    """
+    School x center distance matrix computed lazily in vectorized row blocks.
+
+    Rows are served from the block that contains them, so iterating schools in
+    order computes each block exactly once. `exact` returns distances that are
+    bit-for-bit identical to the scalar `haversine_distance` for a subset of
+    centers, which keeps the written distances and the threshold checks stable.
+    When a spatial index over the centers is given, radius and nearest center
+    queries go through it instead of scanning whole rows. Radius queries are
+    answered from `sparse` distances (e.g. loaded from the on-disk distance
+    cache) when those cover the requested radius.
+    """
+
+    def __init__(self, school_coords: np.ndarray, center_coords: np.ndarray,
+                 block_size: int = DEFAULT_BLOCK_SIZE, index=None):
+        self.school_coords = school_coords
+        self.center_coords = center_coords
+        self.block_size = block_size
+        self.index = index
+        self.sparse = None
+        self._block_start = None
+        self._block = None
+
+    @classmethod
+    def from_records(cls, schools: Sequence[Dict[str, str]], centers: Sequence[Dict[str, str]],
+                     block_size: int = DEFAULT_BLOCK_SIZE) -> 'DistanceEngine':
+        return cls(parse_coords(schools), parse_coords(centers), block_size)
+
+    @property
+    def shape(self):
+        return len(self.school_coords), len(self.center_coords)
+
+    def row(self, school_index: int) -> np.ndarray:
+        """
+        Return the distances from the given school to every center.
+        """
+        start = school_index - school_index % self.block_size
+        if self._block_start != start:
+            self._block = haversine_matrix(
+                self.school_coords[start:start + self.block_size], self.center_coords)
+            self._block_start = start
+        return self._block[school_index - start]
+
+    def matrix(self) -> np.ndarray:
+        """
+        Return the full school x center distance matrix.
+        """
+        n, m = self.shape
+        result = np.empty((n, m), dtype=np.float64)
+        for start in range(0, n, self.block_size):
+            result[start:start + self.block_size] = haversine_matrix(
+                self.school_coords[start:start + self.block_size], self.center_coords)
+        return result
+
+    def within(self, school_index: int, distance_threshold: float) -> np.ndarray:
+        """
+        Return indexes of centers that may lie within the given distance from the school.
+        The screen is slightly permissive; confirm with `exact` distances.
+        """
+        if self.sparse is not None and distance_threshold <= self.sparse.radius_km:
+            indices, distances = self.sparse.row(school_index)
+            return indices[distances <= distance_threshold + SCREEN_TOLERANCE_KM]
+        if self.index is not None:
+            lat, long = self.school_coords[school_index]
+            return self.index.within(lat, long, distance_threshold + SCREEN_TOLERANCE_KM)
+        return np.flatnonzero(self.row(school_index) <= distance_threshold + SCREEN_TOLERANCE_KM)
+
+    def nearest(self, school_index: int, k: int) -> np.ndarray:
+        """
+        Return indexes (ascending) of the k centers nearest to the school.
+        """
+        if self.index is not None:
+            lat, long = self.school_coords[school_index]
+            return self.index.nearest(lat, long, k)
+        nearest = np.argsort(self.row(school_index), kind='stable')[:k]
+        return np.sort(nearest)
+
+    def pairs(self, school_indexes: Sequence[int], center_indexes: Sequence[int]) -> np.ndarray:
+        """
+        Return the distances between matching school and center indexes.
+        """
+        return haversine_pairs(self.school_coords[list(school_indexes)], self.center_coords[list(center_indexes)])
+
+    def threshold_distances(self, school_index: int, center_indexes: np.ndarray, distances: np.ndarray) -> np.ndarray:
+        """
+        Return the distances to compare with distance thresholds, given the exact distances to the centers.
+        """
+        return distances
+
+    def listed_within(self, distance_threshold: float):
+        """
+        Return (school indexes, center indexes) of precomputed pairs within the threshold that
+        `within` finds besides the straight-line neighbours; none for straight-line distances.
+        """
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    def exact(self, school_index: int, center_indexes: Sequence[int]) -> List[float]:
+        """
+        Return distances from the school to the given centers, identical to the
+        scalar haversine formula evaluated with the math module.
+        """
+        center_indexes = np.asarray(center_indexes, dtype=np.intp)
+        lat1, lon1 = np.radians(self.school_coords[school_index])
+        to_coords = np.radians(self.center_coords[center_indexes])
+        # trig functions match the math module; squares and atan2 do not, so
+        # those are evaluated on python floats
+        sin_dlat = np.sin((to_coords[:, 0] - lat1)/2).tolist()
+        sin_dlon = np.sin((to_coords[:, 1] - lon1)/2).tolist()
+        cos_lat1 = math.cos(lat1)
+        cos_lat2 = np.cos(to_coords[:, 0]).tolist()
+        distances = []
+        for s_dlat, s_dlon, c_lat2 in zip(sin_dlat, sin_dlon, cos_lat2):
+            a = s_dlat**2 + cos_lat1 * c_lat2 * s_dlon**2
+            distances.append(RADIUS_EARTH_KM * (2 * math.atan2(math.sqrt(a), math.sqrt(1-a))))
+        return distances
@@ -0,0 +1,225 @@
+"""Persistent on-disk cache of school-center distances."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+from os import path
+from typing import Dict, Optional, Tuple
+
+from utils.lazy_import import lazy_import
+
+from utils.distance import SCREEN_TOLERANCE_KM, DistanceEngine, haversine_matrix
+
+np = lazy_import('numpy')
+
+
+DEFAULT_CACHE_SIZE_MB = 512     # Default upper bound of the cache directory size
+CACHE_FILE_SUFFIX = '.npz'
+
+logger = logging.getLogger(__name__)
+
+
+def coords_hash(coords: np.ndarray) -> str:
+    """
+    Return a content hash of a coordinate array.
+    """
+    return hashlib.sha256(np.ascontiguousarray(coords, dtype='<f8').tobytes()).hexdigest()
+
+
+class SparseDistances:
+    """
+    School x center distances no greater than radius_km (plus the screening
+    tolerance) in compressed sparse row form.
+    Row i holds the (ascending) center indexes and distances for school i.
+    """
+
+    def __init__(self, school_coords: np.ndarray, center_coords: np.ndarray, radius_km: float,
+                 indptr: np.ndarray, indices: np.ndarray, distances: np.ndarray):
+        self.school_coords = school_coords
+        self.center_coords = center_coords
+        self.radius_km = radius_km
+        self.indptr = indptr
+        self.indices = indices
+        self.distances = distances
+
+    @classmethod
+    def from_rows(cls, school_coords, center_coords, radius_km, rows) -> 'SparseDistances':
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(indices) for indices, _ in rows])
+        indices = np.concatenate([r[0] for r in rows]).astype(np.int32) if rows else np.empty(0, np.int32)
+        distances = np.concatenate([r[1] for r in rows]).astype(np.float64) if rows else np.empty(0)
+        return cls(school_coords, center_coords, radius_km, indptr, indices, distances)
+
+    def row(self, school_index: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[school_index], self.indptr[school_index + 1]
+        return self.indices[start:end], self.distances[start:end]
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes + self.distances.nbytes
+
+
+def compute_row(engine: DistanceEngine, school_index: int, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the centers within radius_km of the school and their distances.
+    """
+    if np.isnan(engine.school_coords[school_index]).any():
+        return np.empty(0, dtype=np.intp), np.empty(0)
+    indices = engine.within(school_index, radius_km)
+    distances = haversine_matrix(engine.school_coords[school_index:school_index + 1],
+                                 engine.center_coords[indices])[0]
+    keep = distances <= radius_km + SCREEN_TOLERANCE_KM
+    return indices[keep], distances[keep]
+
+
+def _first_positions(coords: np.ndarray) -> Dict[Tuple[float, float], int]:
+    positions = {}
+    for i, key in enumerate(map(tuple, coords.tolist())):
+        positions.setdefault(key, i)
+    return positions
+
+
+def update_distances(engine: DistanceEngine, radius_km: float,
+                     previous: Optional[SparseDistances] = None) -> Tuple[SparseDistances, int, int]:
+    """
+    Compute sparse distances for the engine, reusing rows and columns of a previous
+    result whose coordinates are unchanged.
+    Return the distances with the no. of recomputed rows and columns.
+    """
+    n, m = engine.shape
+    if previous is None or previous.radius_km < radius_km:
+        rows = [compute_row(engine, i, radius_km) for i in range(n)]
+        return SparseDistances.from_rows(engine.school_coords, engine.center_coords, radius_km, rows), n, m
+
+    # map every new school to a previous row and every previous center to a new column by coordinates
+    previous_rows = _first_positions(previous.school_coords)
+    row_source = [previous_rows.get(key, -1) for key in map(tuple, engine.school_coords.tolist())]
+    new_columns = _first_positions(engine.center_coords)
+    column_map = np.full(len(previous.center_coords), -1, dtype=np.int64)
+    for key, column in _first_positions(previous.center_coords).items():
+        column_map[column] = new_columns.get(key, -1)
+    mapped = np.zeros(m, dtype=bool)
+    mapped[column_map[column_map >= 0]] = True
+    fresh_columns = np.flatnonzero(~mapped)
+
+    rows = []
+    for i, source in enumerate(row_source):
+        if source < 0 or np.isnan(engine.school_coords[i]).any():
+            rows.append(compute_row(engine, i, radius_km))
+            continue
+        indices, distances = previous.row(source)
+        keep = distances <= radius_km + SCREEN_TOLERANCE_KM
+        indices, distances = column_map[indices[keep]], distances[keep]
+        keep = indices >= 0
+        indices, distances = indices[keep], distances[keep]
+        if len(fresh_columns):
+            fresh = haversine_matrix(engine.school_coords[i:i + 1], engine.center_coords[fresh_columns])[0]
+            keep = fresh <= radius_km + SCREEN_TOLERANCE_KM
+            indices = np.concatenate([indices, fresh_columns[keep]])
+            distances = np.concatenate([distances, fresh[keep]])
+        order = np.argsort(indices, kind='stable')
+        rows.append((indices[order], distances[order]))
+
+    recomputed_rows = sum(1 for source in row_source if source < 0)
+    sparse = SparseDistances.from_rows(engine.school_coords, engine.center_coords, radius_km, rows)
+    return sparse, recomputed_rows, len(fresh_columns)
+
+
+class DistanceCache:
+    """
+    Directory of sparse distance files keyed by the content hash of the school
+    and center coordinates. Entries are evicted least recently used first once
+    the directory grows beyond max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_SIZE_MB * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, schools_hash: str, centers_hash: str, radius_km: float) -> str:
+        return path.join(self.directory, f"{schools_hash[:16]}-{centers_hash[:16]}-{radius_km:g}km{CACHE_FILE_SUFFIX}")
+
+    def _entries(self):
+        """
+        Return cache entries as (path, stat) pairs, most recently used first.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_FILE_SUFFIX):
+                entry = path.join(self.directory, name)
+                entries.append((entry, os.stat(entry)))
+        return sorted(entries, key=lambda e: e[1].st_mtime_ns, reverse=True)
+
+    def read(self, entry: str) -> Optional[SparseDistances]:
+        try:
+            with np.load(entry) as data:
+                return SparseDistances(data['school_coords'], data['center_coords'], float(data['radius_km']),
+                                       data['indptr'], data['indices'], data['distances'])
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable distance cache entry '{entry}' : {e}")
+            return None
+
+    def write(self, entry: str, sparse: SparseDistances):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            np.savez(file, school_coords=sparse.school_coords, center_coords=sparse.center_coords,
+                     radius_km=sparse.radius_km, indptr=sparse.indptr, indices=sparse.indices,
+                     distances=sparse.distances)
+        os.replace(temp_path, entry)
+
+    def _base_entry(self, schools_hash: str, centers_hash: str, radius_km: float) -> Optional[str]:
+        """
+        Return the entry most likely to share rows and columns with the given coordinates:
+        one with the same schools or centers, else the most recently used one.
+        """
+        fallback = None
+        for entry, _ in self._entries():
+            name = path.basename(entry)
+            entry_schools, entry_centers, entry_radius = name[:-len(CACHE_FILE_SUFFIX)].split('-')
+            if float(entry_radius[:-2]) < radius_km:
+                continue
+            if entry_schools == schools_hash[:16] or entry_centers == centers_hash[:16]:
+                return entry
+            fallback = fallback or entry
+        return fallback
+
+    def evict(self, keep: str = None):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        """
+        total = 0
+        for entry, stat in self._entries():
+            total += stat.st_size
+            if total > self.max_bytes and entry != keep:
+                os.remove(entry)
+                total -= stat.st_size
+                logger.info(f"Evicted distance cache entry '{entry}'")
+
+    def load(self, engine: DistanceEngine, radius_km: float) -> SparseDistances:
+        """
+        Return sparse distances within radius_km for the engine's schools and centers,
+        from the cache when possible. Only rows and columns whose coordinates changed
+        since the closest cached entry are recomputed.
+        """
+        schools_hash = coords_hash(engine.school_coords)
+        centers_hash = coords_hash(engine.center_coords)
+        entry = self._entry_path(schools_hash, centers_hash, radius_km)
+        if path.exists(entry):
+            sparse = self.read(entry)
+            if sparse is not None:
+                os.utime(entry)
+                logger.info(f"Distance cache hit '{entry}'")
+                return sparse
+
+        base = self._base_entry(schools_hash, centers_hash, radius_km)
+        previous = self.read(base) if base else None
+        sparse, recomputed_rows, recomputed_columns = update_distances(engine, radius_km, previous)
+        logger.info(f"Distance cache miss, recomputed {recomputed_rows}/{len(engine.school_coords)} rows and "
+                    f"{recomputed_columns}/{len(engine.center_coords)} columns")
+        self.write(entry, sparse)
+        self.evict(keep=entry)
+        return sparse
@@ -0,0 +1,110 @@
+"""Precomputed road distances or travel times between schools and centers."""
+
+from __future__ import annotations
+
+from typing import Dict, List, Sequence
+
+from utils.lazy_import import lazy_import
+
+from utils.distance import SCREEN_TOLERANCE_KM, DistanceEngine
+from utils.tsv_reader import Field, read_table
+
+np = lazy_import('numpy')
+
+MATRIX_SCHEMA = (Field('scode'), Field('cscode'), Field('distance', float, 0))
+THRESHOLD_METRICS = ['matrix', 'haversine']
+
+
+def read_distance_matrix(file_path: str) -> Dict[str, Dict[str, float]]:
+    """
+    Read a sparse distance matrix TSV with scode, cscode and distance columns.
+    Return a dict of dicts key scode and then cscode, like prefs.
+    """
+    table = read_table(file_path, MATRIX_SCHEMA)
+    matrix = {}
+    for scode, cscode, distance in zip(table.text['scode'], table.text['cscode'], table.typed['distance'].tolist()):
+        matrix.setdefault(scode, {})[cscode] = distance
+    return matrix
+
+
+class MatrixDistanceEngine(DistanceEngine):
+    """
+    Distance engine whose distances come from a precomputed sparse matrix (road distance,
+    travel time) and fall back to haversine for the pairs the matrix does not list.
+
+    rows: Listed distances per school index, {center index: distance}, for O(1) lookups
+    threshold_metric: 'matrix' compares distance thresholds with these distances,
+                      'haversine' with straight-line distances
+    Nearest center fallback stays straight-line, through the spatial index.
+    """
+
+    def __init__(self, school_coords: np.ndarray, center_coords: np.ndarray, rows: List[Dict[int, float]],
+                 threshold_metric: str = 'matrix', index=None):
+        super().__init__(school_coords, center_coords, index=index)
+        if threshold_metric not in THRESHOLD_METRICS:
+            raise ValueError(f"unknown threshold metric '{threshold_metric}', expected one of {THRESHOLD_METRICS}")
+        self.rows = rows
+        self.threshold_metric = threshold_metric
+
+    @classmethod
+    def from_engine(cls, engine: DistanceEngine, matrix: Dict[str, Dict[str, float]],
+                    schools: Sequence[Dict[str, str]], centers: Sequence[Dict[str, str]],
+                    threshold_metric: str = 'matrix') -> 'MatrixDistanceEngine':
+        """
+        Return an engine over the coordinates, index and sparse distances of a straight-line engine
+        with the matrix rows of the given schools and centers.
+        """
+        center_positions = {}
+        for i, c in enumerate(centers):
+            center_positions.setdefault(c['cscode'], i)
+        rows = []
+        for s in schools:
+            listed = matrix.get(s['scode'], {})
+            rows.append({center_positions[cscode]: distance for cscode, distance in listed.items()
+                         if cscode in center_positions})
+        result = cls(engine.school_coords, engine.center_coords, rows, threshold_metric, engine.index)
+        result.block_size = engine.block_size
+        result.sparse = engine.sparse
+        return result
+
+    def exact(self, school_index: int, center_indexes: Sequence[int]) -> List[float]:
+        distances = super().exact(school_index, center_indexes)
+        row = self.rows[school_index]
+        if row:
+            for k, center_index in enumerate(np.asarray(center_indexes).tolist()):
+                distances[k] = row.get(center_index, distances[k])
+        return distances
+
+    def pairs(self, school_indexes: Sequence[int], center_indexes: Sequence[int]) -> np.ndarray:
+        distances = super().pairs(school_indexes, center_indexes)
+        for k, (si, ci) in enumerate(zip(school_indexes, center_indexes)):
+            distances[k] = self.rows[si].get(ci, distances[k])
+        return distances
+
+    def threshold_distances(self, school_index: int, center_indexes: np.ndarray, distances: np.ndarray) -> np.ndarray:
+        if self.threshold_metric == 'haversine' and self.rows[school_index]:
+            return np.array(super().exact(school_index, center_indexes))
+        return distances
+
+    def within(self, school_index: int, distance_threshold: float) -> np.ndarray:
+        """
+        Return indexes of centers that may lie within the given distance from the school in the
+        threshold metric: listed pairs within it and unlisted pairs within it in a straight line.
+        """
+        nearby = super().within(school_index, distance_threshold)
+        row = self.rows[school_index]
+        if self.threshold_metric == 'haversine' or not row:
+            return nearby
+        listed = [ci for ci, distance in row.items() if distance <= distance_threshold + SCREEN_TOLERANCE_KM]
+        unlisted = [ci for ci in np.asarray(nearby).tolist() if ci not in row]
+        return np.array(sorted(listed + unlisted), dtype=np.intp)
+
+    def listed_within(self, distance_threshold: float):
+        if self.threshold_metric == 'haversine':
+            return super().listed_within(distance_threshold)
+        pairs = [(si, ci) for si, row in enumerate(self.rows) for ci, distance in row.items()
+                 if distance <= distance_threshold + SCREEN_TOLERANCE_KM]
+        if not pairs:
+            return super().listed_within(distance_threshold)
+        school_indexes, center_indexes = zip(*pairs)
+        return np.array(school_indexes, dtype=np.intp), np.array(center_indexes, dtype=np.intp)
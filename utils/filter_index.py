@@ -0,0 +1,40 @@
+"""Lookup of allocation rows by school or center, for the app's filter."""
+
+from __future__ import annotations
+
+from typing import Dict, List, NamedTuple
+
+from utils.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+FILTER_COLUMNS = {'school': ('scode', 'school'), 'center': ('cscode', 'center')}    # filter type -> code, name
+
+
+class FilterIndex(NamedTuple):
+    labels: List[str]               # "code | name" per distinct code, in order of first appearance
+    rows: Dict[str, np.ndarray]     # label -> positions of its rows
+
+    def select(self, df: pd.DataFrame, label: str) -> pd.DataFrame:
+        """
+        Return the rows of df, the frame the index was built from, with the given label.
+        """
+        return df.take(self.rows.get(label, np.empty(0, dtype=np.intp)))
+
+
+def build_filter_index(df: pd.DataFrame, code_column: str, name_column: str) -> FilterIndex:
+    """
+    Index the rows of df by code, labelled with the name on the first row of each code.
+    """
+    positions = df.groupby(code_column, sort=False).indices
+    firsts = df.drop_duplicates(code_column)
+    labels = [f"{code} | {name}" for code, name in zip(firsts[code_column].tolist(), firsts[name_column].tolist())]
+    return FilterIndex(labels, {label: positions[code] for label, code in zip(labels, firsts[code_column].tolist())})
+
+
+def build_filter_indexes(df: pd.DataFrame) -> Dict[str, FilterIndex]:
+    """
+    Return a FilterIndex per filter type of FILTER_COLUMNS.
+    """
+    return {filter_type: build_filter_index(df, code, name) for filter_type, (code, name) in FILTER_COLUMNS.items()}
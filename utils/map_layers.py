@@ -0,0 +1,98 @@
+"""Folium map of allocated centers and their schools, built from column arrays rather than per-row markers."""
+
+import base64
+import html
+import json
+import os
+from functools import lru_cache
+
+import folium
+import numpy as np
+import pandas as pd
+from folium.plugins import FastMarkerCluster
+
+from utils.pretty import custom_map_zoom
+
+ICONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'icons')
+MARKER_TYPES = ['School', 'Center']     # Index into MARKER_TYPES is the icon of a marker row
+ICON_SIZE = (38, 40)
+ICON_ANCHOR = (19, 39)
+MAX_CIRCLE_RADIUS = 25                  # Radius in px of the center with the largest allocation
+
+# Markers are created in the browser from [lat, long, type index, tooltip] rows, with the icons defined once
+MARKER_CALLBACK = """(function () {
+    var icons = %s.map(function (url) {
+        return L.icon({iconUrl: url, iconSize: %s, iconAnchor: %s, popupAnchor: [0, -%d]});
+    });
+    return function (row) {
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icons[row[2]]});
+        marker.bindTooltip(row[3]);
+        marker.bindPopup(row[3]);
+        return marker;
+    };
+})()"""
+
+
+@lru_cache(maxsize=None)
+def icon_data_uri(marker_type: str) -> str:
+    """
+    Return the bundled icon of a marker type as a data URI, so maps need no image server.
+    """
+    with open(os.path.join(ICONS_DIR, f'{marker_type.lower()}.svg'), 'rb') as file:
+        return 'data:image/svg+xml;base64,' + base64.b64encode(file.read()).decode('ascii')
+
+
+def marker_tooltips(map_data: pd.DataFrame) -> pd.Series:
+    """
+    Return the tooltip of every row, built column-wise.
+    """
+    allocation = map_data['allocation'].fillna(0)
+    names = map_data['name'].astype(str).str.title().map(html.escape)
+    labels = np.where(map_data['type'] == 'Center', '📍 Center', '🏫 School')
+    allocated = np.where(allocation > 0, '<b>Allocation:</b> ' + allocation.astype(int).astype(str) + '<br/>', '')
+    return ('<h6>' + names + '</h6><strong>' + labels + '</strong><br/>'
+            + '<b>Latitude:</b> ' + map_data['lat'].astype(str) + '<br/>'
+            + '<b>Longitude:</b> ' + map_data['long'].astype(str) + '<br/>' + allocated)
+
+
+def marker_layer(map_data: pd.DataFrame) -> FastMarkerCluster:
+    """
+    Return one clustered layer of all markers, rendered in the browser from column arrays.
+    """
+    rows = list(zip(map_data['lat'].tolist(), map_data['long'].tolist(),
+                    map_data['type'].map(MARKER_TYPES.index).tolist(), marker_tooltips(map_data).tolist()))
+    icons = [icon_data_uri(marker_type) for marker_type in MARKER_TYPES]
+    callback = MARKER_CALLBACK % (json.dumps(icons), list(ICON_SIZE), list(ICON_ANCHOR), ICON_ANCHOR[1])
+    return FastMarkerCluster(rows, callback=callback, name="Allocated Centers")
+
+
+def allocation_layer(map_data: pd.DataFrame) -> folium.GeoJson:
+    """
+    Return one GeoJSON layer of circles sized by the students allocated at each point.
+    """
+    allocated = map_data[map_data['allocation'].fillna(0) > 0]
+    radius = allocated['allocation'] / allocated['allocation'].max() * MAX_CIRCLE_RADIUS
+    features = [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [long, lat]},
+                 'properties': {'radius': r}}
+                for lat, long, r in zip(allocated['lat'].tolist(), allocated['long'].tolist(), radius.tolist())]
+    return folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': features},
+        name="Allocation distribution",
+        marker=folium.CircleMarker(color="#3c844a", opacity=0.35, fill=True, fill_color="green", fill_opacity=0.3),
+        style_function=lambda feature: {'radius': feature['properties']['radius']},
+    )
+
+
+def build_map(map_data: pd.DataFrame, tiles: str = "cartodbpositron", show_heatmap: bool = False) -> folium.Map:
+    """
+    Return the map of map_data rows with lat, long, name, allocation and type ('School' or 'Center') columns.
+    """
+    m = folium.Map(
+        location=[map_data['lat'].mean(), map_data['long'].mean()],         # Center map on the mean of the lat and long
+        zoom_start=custom_map_zoom(map_data['lat'].values, map_data['long'].values),
+        tiles=tiles
+    )
+    marker_layer(map_data).add_to(m)
+    if show_heatmap and (map_data['allocation'].fillna(0) > 0).any():
+        allocation_layer(map_data).add_to(m)
+    return m
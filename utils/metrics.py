@@ -0,0 +1,84 @@
+"""Wall time, call counts and per-school counters of an allocation run."""
+
+from __future__ import annotations
+
+import io
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from utils.custom_logger import METRICS_LOGGER, PROFILE_TARGET
+from utils.lazy_import import lazy_import
+
+# only needed when profiling
+cProfile = lazy_import('cProfile')
+pstats = lazy_import('pstats')
+
+logger = logging.getLogger(__name__)
+metrics_logger = logging.getLogger(METRICS_LOGGER)
+
+
+class Metrics:
+    """
+    Wall time and call count per phase, plus counters per school.
+    Phases may nest, e.g. distance evaluation is part of ranking centers.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.schools: Dict[str, Dict[str, int]] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            phase = self.phases.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            phase['seconds'] += time.perf_counter() - start
+            phase['calls'] += 1
+
+    def count(self, scode: str, counter: str, n: int = 1):
+        school = self.schools.setdefault(scode, {})
+        school[counter] = school.get(counter, 0) + n
+
+    def totals(self) -> Dict[str, int]:
+        """
+        Return every per-school counter summed over schools.
+        """
+        totals = {}
+        for counters in self.schools.values():
+            for counter, n in counters.items():
+                totals[counter] = totals.get(counter, 0) + n
+        return totals
+
+    def to_dict(self) -> Dict[str, any]:
+        return {'phases': self.phases, 'totals': self.totals(), 'schools': self.schools}
+
+    def summary(self) -> Dict[str, any]:
+        """
+        Return the phase timings and counter totals, without the per-school counters.
+        """
+        return {'phases': {name: round(phase['seconds'], 6) for name, phase in self.phases.items()},
+                'totals': self.totals(), 'schools': len(self.schools)}
+
+    def write(self, file_path: Optional[str] = None):
+        """
+        Write the metrics to file_path if given, and log a one-line summary of them to the metrics log.
+        """
+        if file_path:
+            with open(file_path, 'w', encoding='utf-8') as file:
+                json.dump(self.to_dict(), file, ensure_ascii=False, indent=2)
+        metrics_logger.info(json.dumps(self.summary(), ensure_ascii=False))
+
+
+def write_profile(profiler: cProfile.Profile, file_path: str = PROFILE_TARGET, top: int = 25):
+    """
+    Dump the profiler stats for pstats/snakeviz and log the top functions by cumulative time.
+    """
+    profiler.dump_stats(file_path)
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(top)
+    logger.info(f"Profile written to {file_path}\n{text.getvalue()}")
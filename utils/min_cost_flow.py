@@ -0,0 +1,193 @@
+"""Min-cost flow: OR-Tools' cost scaling solver when installed, a pure python solver (primal-dual) otherwise."""
+
+from __future__ import annotations
+
+import heapq
+from typing import List, Optional
+
+from utils.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+INF = float('inf')
+BACKENDS = ['ortools', 'python']
+
+
+def ortools_available() -> bool:
+    try:
+        from ortools.graph.python import min_cost_flow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class MinCostFlow:
+    """
+    Directed graph with integer capacities and non-negative integer costs.
+
+    solve() sends as much flow as possible from source to sink at minimum cost.
+    Each phase runs Dijkstra with node potentials to find the shortest path
+    length, then pushes flow along all the shortest paths (the zero reduced cost
+    subgraph), so the number of phases grows with the number of distinct path
+    costs instead of the number of paths.
+    """
+
+    def __init__(self, num_nodes: int):
+        self.num_nodes = num_nodes
+        self.graph: List[List[int]] = [[] for _ in range(num_nodes)]
+        # edge e and its residual edge e ^ 1 are stored side by side
+        self.to: List[int] = []
+        self.cap: List[int] = []
+        self.cost: List[int] = []
+
+    def add_edge(self, u: int, v: int, cap: int, cost: int) -> int:
+        """
+        Add an edge and return its id, to read its flow after solving.
+        """
+        if cost < 0:
+            raise ValueError(f"edge {u}->{v} has negative cost {cost}")
+        edge = len(self.to)
+        self.graph[u].append(edge)
+        self.to.append(v)
+        self.cap.append(cap)
+        self.cost.append(cost)
+        self.graph[v].append(edge + 1)
+        self.to.append(u)
+        self.cap.append(0)
+        self.cost.append(-cost)
+        return edge
+
+    def flow(self, edge: int) -> int:
+        return self.cap[edge ^ 1]
+
+    def _shortest_paths(self, source: int, potential: List[float]) -> List[float]:
+        dist = [INF] * self.num_nodes
+        dist[source] = 0
+        heap = [(0, source)]
+        to, cap, cost, graph = self.to, self.cap, self.cost, self.graph
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            pu = potential[u]
+            for e in graph[u]:
+                if cap[e] > 0:
+                    v = to[e]
+                    nd = d + cost[e] + pu - potential[v]
+                    if nd < dist[v]:
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+        return dist
+
+    def _augment(self, source: int, sink: int, potential: List[float], limit: int) -> int:
+        """
+        Push flow along zero reduced cost paths: a max flow (Dinic) over the subgraph of
+        those edges, so that one phase uses up every shortest path. Breadth first levels
+        keep the depth first search off the zero cost cycles of residual edges.
+        """
+        to, cap, cost, graph = self.to, self.cap, self.cost, self.graph
+        total = 0
+        while total < limit:
+            level = [-1] * self.num_nodes
+            level[source] = 0
+            queue = [source]
+            for u in queue:
+                pu, next_level = potential[u], level[u] + 1
+                for e in graph[u]:
+                    if cap[e] > 0:
+                        v = to[e]
+                        if level[v] < 0 and cost[e] + pu == potential[v]:
+                            level[v] = next_level
+                            queue.append(v)
+            if level[sink] < 0:
+                return total
+
+            pointer = [0] * self.num_nodes
+            while total < limit:
+                path = []
+                u = source
+                while u != sink:
+                    edges, pu, next_level = graph[u], potential[u], level[u] + 1
+                    i, end = pointer[u], len(edges)
+                    while i < end:
+                        e = edges[i]
+                        v = to[e]
+                        if cap[e] > 0 and level[v] == next_level and cost[e] + pu == potential[v]:
+                            break
+                        i += 1
+                    pointer[u] = i
+                    if i < end:
+                        path.append(e)
+                        u = v
+                        continue
+                    # dead end for the rest of this round
+                    level[u] = -1
+                    if not path:
+                        break
+                    u = to[path.pop() ^ 1]
+                    pointer[u] += 1
+                if u != sink:
+                    break
+                pushed = min(limit - total, min(cap[e] for e in path))
+                for e in path:
+                    cap[e] -= pushed
+                    cap[e ^ 1] += pushed
+                total += pushed
+        return total
+
+    def solve(self, source: int, sink: int, max_flow: float = INF):
+        """
+        Return (flow, cost) of a minimum cost flow of at most max_flow units.
+        """
+        potential = [0] * self.num_nodes
+        flow = 0
+        while flow < max_flow:
+            dist = self._shortest_paths(source, potential)
+            if dist[sink] == INF:
+                break
+            for v in range(self.num_nodes):
+                if dist[v] < INF:
+                    potential[v] += dist[v]
+            flow += self._augment(source, sink, potential, max_flow - flow)
+        cost = sum(self.cost[e] * self.cap[e ^ 1] for e in range(0, len(self.to), 2))
+        return flow, cost
+
+
+def solve_min_cost_flow(num_nodes: int, tails: np.ndarray, heads: np.ndarray, capacities: np.ndarray,
+                        costs: np.ndarray, supplies: np.ndarray, backend: Optional[str] = None) -> np.ndarray:
+    """
+    Return the flow on every arc of a minimum cost flow that meets the node supplies, positive
+    at sources and negative at sinks. Raise ValueError if they cannot be met.
+    backend: 'ortools' (needs the ortools package) or 'python', whose costs must be
+             non-negative; default: ortools if installed
+    """
+    if backend is None:
+        backend = 'ortools' if ortools_available() else 'python'
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown min-cost flow backend '{backend}', expected one of {BACKENDS}")
+    if supplies.sum() != 0:
+        raise ValueError(f"supplies add up to {supplies.sum()}, not 0")
+
+    if backend == 'ortools':
+        from ortools.graph.python import min_cost_flow
+        solver = min_cost_flow.SimpleMinCostFlow()
+        arcs = solver.add_arcs_with_capacity_and_unit_cost(tails, heads, capacities, costs)
+        solver.set_nodes_supplies(np.arange(num_nodes), supplies)
+        status = solver.solve()
+        if status != solver.OPTIMAL:
+            raise ValueError(f"no min-cost flow meets the supplies, solver status {status}")
+        return solver.flows(arcs)
+
+    source, sink = num_nodes, num_nodes + 1
+    flow = MinCostFlow(num_nodes + 2)
+    edges = [flow.add_edge(u, v, cap, cost)
+             for u, v, cap, cost in zip(tails.tolist(), heads.tolist(), capacities.tolist(), costs.tolist())]
+    for node, supply in enumerate(supplies.tolist()):
+        if supply > 0:
+            flow.add_edge(source, node, supply, 0)
+        elif supply < 0:
+            flow.add_edge(node, sink, -supply, 0)
+    total, _ = flow.solve(source, sink)
+    if total < supplies[supplies > 0].sum():
+        raise ValueError(f"no min-cost flow meets the supplies, {total} of {supplies[supplies > 0].sum()} sent")
+    return np.array([flow.flow(edge) for edge in edges], dtype=np.int64)
@@ -21,14 +21,3 @@ def custom_map_zoom(lat, long):
     
     # Return the smaller of the two zooms (more zoomed out)
     return min(zoom_lat, zoom_long)
-
-def custom_map_tooltip(row):
-    tooltip = f"""
-        <h6>{row['name'].title()}</h6>
-        <strong>""" + ("📍 Center" if row['type'] == "Center" else "🏫 School") + f"""</strong><br/>
-        <b>Latitude:</b> {row['lat']}<br/>
-        <b>Longitude:</b> {row['long']}<br/> """ + (
-        f"""<b>Allocation:</b> {int(row['allocation'])}<br/>""" if row["allocation"] > 0 else ""
-        )
-    
-    return tooltip
\ No newline at end of file
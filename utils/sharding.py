@@ -0,0 +1,42 @@
+"""Partition a graph into connected components with vectorized label propagation."""
+
+from __future__ import annotations
+
+from typing import List
+
+from utils.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+
+def connected_components(num_nodes: int, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    Return the component label of every node: the smallest node index in its component.
+    sources, targets: Endpoints of the (undirected) edges
+    """
+    labels = np.arange(num_nodes)
+    sources = np.asarray(sources, dtype=np.intp)
+    targets = np.asarray(targets, dtype=np.intp)
+    while True:
+        # hook the larger label of every edge onto the smaller one, then shortcut label chains
+        low = np.minimum(labels[sources], labels[targets])
+        updated = labels.copy()
+        np.minimum.at(updated, labels[sources], low)
+        np.minimum.at(updated, labels[targets], low)
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def group_components(labels: np.ndarray) -> List[np.ndarray]:
+    """
+    Return the ascending node indexes of every component, ordered by their smallest node index.
+    """
+    order = np.argsort(labels, kind='stable')
+    _, starts = np.unique(labels[order], return_index=True)
+    return np.split(order, starts[1:])
@@ -0,0 +1,104 @@
+"""Grid based spatial index for radius and nearest neighbour queries over centers."""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, Tuple
+
+from utils.lazy_import import lazy_import
+
+from utils.distance import RADIUS_EARTH_KM, haversine_matrix
+
+np = lazy_import('numpy')
+
+
+KM_PER_DEGREE = RADIUS_EARTH_KM * math.pi / 180     # Length of one degree of latitude in km
+DEFAULT_CELL_KM = 7                                 # Grid cell edge in km, ideally close to the query radius
+
+
+class CenterIndex:
+    """
+    Bucket center coordinates into a regular lat/long grid.
+
+    A radius query only visits the grid cells that can hold a point within the
+    radius and evaluates haversine distances for the centers in those cells.
+    Centers with missing coordinates are never returned.
+    """
+
+    def __init__(self, coords: np.ndarray, cell_km: float = DEFAULT_CELL_KM):
+        self.coords = coords
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.cells: Dict[Tuple[int, int], np.ndarray] = {}
+
+        valid = np.flatnonzero(~np.isnan(coords).any(axis=1))
+        keys = np.floor(coords[valid] / self.cell_deg).astype(np.int64)
+        order = np.lexsort((valid, keys[:, 1], keys[:, 0]))
+        keys, valid = keys[order], valid[order]
+        if len(valid):
+            bounds = np.flatnonzero((np.diff(keys, axis=0) != 0).any(axis=1)) + 1
+            for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(valid)]):
+                self.cells[tuple(keys[start].tolist())] = valid[start:end]
+        self.size = len(valid)
+
+    def _candidates(self, lat: float, long: float, radius_km: float) -> np.ndarray:
+        """
+        Return indexes of centers in the grid cells overlapping the bounding box of the circle.
+        """
+        dlat = radius_km / KM_PER_DEGREE
+        lat_min, lat_max = lat - dlat, lat + dlat
+        max_abs_lat = max(abs(lat_min), abs(lat_max))
+        if max_abs_lat >= 90:
+            dlong = 180
+        else:
+            # a point within radius satisfies cos(lat1)cos(lat2)sin^2(dlong/2) <= sin^2(radius/2R)
+            ratio = math.sin(radius_km / (2 * RADIUS_EARTH_KM)) / math.cos(math.radians(max_abs_lat))
+            dlong = 180 if ratio >= 1 else math.degrees(2 * math.asin(ratio))
+        if dlong >= 180 or long - dlong < -180 or long + dlong > 180:
+            return self._all()
+
+        row_min, row_max = math.floor(lat_min / self.cell_deg), math.floor(lat_max / self.cell_deg)
+        col_min, col_max = math.floor((long - dlong) / self.cell_deg), math.floor((long + dlong) / self.cell_deg)
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self.cells):
+            # cheaper to take every populated cell than to probe the bounding box
+            return self._all()
+        found = [self.cells[(row, col)]
+                 for row in range(row_min, row_max + 1)
+                 for col in range(col_min, col_max + 1)
+                 if (row, col) in self.cells]
+        return np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+
+    def _all(self) -> np.ndarray:
+        if not self.cells:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate(list(self.cells.values()))
+
+    def _distances(self, lat: float, long: float, center_indexes: np.ndarray) -> np.ndarray:
+        return haversine_matrix(np.array([[lat, long]]), self.coords[center_indexes])[0]
+
+    def within(self, lat: float, long: float, radius_km: float) -> np.ndarray:
+        """
+        Return indexes (ascending) of all centers within radius_km of (lat, long).
+        """
+        candidates = self._candidates(lat, long, radius_km)
+        if len(candidates) == 0:
+            return candidates
+        distances = self._distances(lat, long, candidates)
+        return np.sort(candidates[distances <= radius_km])
+
+    def nearest(self, lat: float, long: float, k: int) -> np.ndarray:
+        """
+        Return indexes (ascending) of the k centers nearest to (lat, long).
+        """
+        k = min(k, self.size)
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        radius_km = self.cell_deg * KM_PER_DEGREE
+        while True:
+            candidates = self._candidates(lat, long, radius_km)
+            distances = self._distances(lat, long, candidates)
+            # every center within radius_km is a candidate, so the k closest are
+            # final once the k-th of them lies inside the searched circle
+            if len(candidates) == self.size or np.count_nonzero(distances <= radius_km) >= k:
+                nearest = np.argsort(distances, kind='stable')[:k]
+                return np.sort(candidates[nearest])
+            radius_km *= 2
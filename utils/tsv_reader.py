@@ -0,0 +1,229 @@
+"""Typed, validated ingestion of the input TSV files."""
+
+from __future__ import annotations
+
+import mmap
+from operator import methodcaller
+from dataclasses import dataclass
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from utils.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+NUMPY_TYPES = {int: 'int64', float: 'float64'}
+MAX_REPORTED_ERRORS = 1000      # Bad rows listed in a SchemaError message, all are kept in its errors
+
+
+class Field(NamedTuple):
+    """
+    A column that must be present, with its type and the inclusive range of its values.
+    blank: Blank cells of a float column are allowed and typed as NaN
+    """
+    name: str
+    type: type = str
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+    blank: bool = False
+
+
+# schools without coordinates are kept, they are left unassigned as no center is in reach
+SCHOOLS_SCHEMA = (Field('scode'), Field('count', int, 0),
+                  Field('lat', float, -90, 90, blank=True), Field('long', float, -180, 180, blank=True))
+CENTERS_SCHEMA = (Field('cscode'), Field('capacity', int, 0),
+                  Field('lat', float, -90, 90), Field('long', float, -180, 180))
+PREFS_SCHEMA = (Field('scode'), Field('cscode'), Field('pref', int))
+
+
+class RowError(NamedTuple):
+    line: int           # 1-based line no. in the file, the header is line 1
+    column: str
+    value: str
+    reason: str
+
+    def __str__(self):
+        return f"line {self.line}, {self.column}={self.value!r}: {self.reason}"
+
+
+class SchemaError(ValueError):
+    """
+    Raised with every bad row of a file once it has been validated.
+    """
+
+    def __init__(self, source: str, errors: List[RowError]):
+        self.source = source
+        self.errors = errors
+        lines = [str(error) for error in errors[:MAX_REPORTED_ERRORS]]
+        if len(errors) > MAX_REPORTED_ERRORS:
+            lines.append(f"... and {len(errors) - MAX_REPORTED_ERRORS} more")
+        super().__init__(f"{len(errors)} invalid values in {source}:\n" + '\n'.join(lines))
+
+    def __reduce__(self):
+        # rebuilt from source and errors when raised in a worker process
+        return SchemaError, (self.source, self.errors)
+
+
+class Rows(list):
+    """
+    Rows as dicts of text, carrying the typed arrays of the table they were read from so that
+    numeric columns need not be parsed again. Slices and copies are plain lists.
+    """
+
+    def __init__(self, rows: List[Dict[str, str]], typed: Dict[str, np.ndarray]):
+        super().__init__(rows)
+        self.typed = typed
+
+
+def typed_column(rows: Sequence[Dict[str, str]], name: str, type: type = int) -> np.ndarray:
+    """
+    Return a numeric column of rows as an array, taken from the typed arrays of Rows when there.
+    """
+    typed = getattr(rows, 'typed', None)
+    if typed is not None and name in typed:
+        return typed[name]
+    return np.fromiter((type(row[name]) for row in rows), NUMPY_TYPES[type], len(rows))
+
+
+@dataclass
+class Table:
+    """
+    Columns of a TSV file: the text of every cell, plus typed arrays of the schema's int and float columns.
+    """
+    header: List[str]
+    text: Dict[str, List[str]]
+    typed: Dict[str, np.ndarray]
+
+    def __len__(self):
+        return len(self.text[self.header[0]]) if self.header else 0
+
+    def rows(self) -> Rows:
+        """
+        Return the rows as dicts of text keyed by the header, as csv.DictReader reads them.
+        """
+        header = self.header
+        return Rows([dict(zip(header, values)) for values in zip(*(self.text[name] for name in header))], self.typed)
+
+
+def split_lines(text: str) -> Tuple[List[str], Sequence[int]]:
+    """
+    Split TSV text into lines, skipping blank lines.
+    Return the lines and the 1-based line no. of each in the text, for error messages.
+    """
+    if '\r' in text:
+        text = text.replace('\r\n', '\n')
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    if '' not in lines:
+        return lines, range(1, len(lines) + 1)
+    return [line for line in lines if line], [i + 1 for i, line in enumerate(lines) if line]
+
+
+def split_columns(lines: List[str], width: int) -> Optional[List[List[str]]]:
+    """
+    Return the cells of every column if each line has width cells, None otherwise.
+    The cells are split in one go, not line by line, so no per-row lists are built.
+    Cells are not unquoted.
+    """
+    if set(map(methodcaller('count', '\t'), lines)) - {width - 1}:
+        return None
+    cells = '\t'.join(lines).split('\t') if lines else []
+    return [cells[i::width] for i in range(width)]
+
+
+def range_reason(field: Field) -> str:
+    if field.min_value is None and field.max_value is None:
+        return 'not a finite number'
+    if field.max_value is None:
+        return f'less than {field.min_value}'
+    return f'outside {field.min_value} to {field.max_value}'
+
+
+def to_array(values: List[str], field: Field, errors: List[RowError], line_numbers: Sequence[int]) -> np.ndarray:
+    """
+    Convert a column to a typed array in one vectorized pass, recording the rows that are not
+    numbers of the field type or are out of its range. Bad cells are 0 in the returned array.
+    line_numbers: Line no. of each value in the file
+    """
+    dtype = NUMPY_TYPES[field.type]
+    blanks = None
+    try:
+        array = np.fromiter(map(field.type, values), dtype, len(values))
+    except ValueError:
+        # some cell does not parse: find every one of them
+        array = np.zeros(len(values), dtype=dtype)
+        blanks = np.zeros(len(values), dtype=bool)
+        for i, value in enumerate(values):
+            try:
+                array[i] = field.type(value)
+            except ValueError:
+                if not value.strip() and field.blank:
+                    array[i], blanks[i] = np.nan, True
+                    continue
+                reason = 'missing value' if not value.strip() else f'not {"an integer" if field.type is int else "a number"}'
+                errors.append(RowError(line_numbers[i], field.name, value, reason))
+    bad = np.zeros(len(array), dtype=bool)
+    if field.type is float:
+        bad |= ~np.isfinite(array)
+        if blanks is not None:
+            bad &= ~blanks
+    if field.min_value is not None:
+        bad |= array < field.min_value
+    if field.max_value is not None:
+        bad |= array > field.max_value
+    for i in np.flatnonzero(bad).tolist():
+        errors.append(RowError(line_numbers[i], field.name, values[i], range_reason(field)))
+        array[i] = 0
+    return array
+
+
+def parse_table(text: str, schema: Sequence[Field] = (), source: str = '<text>') -> Table:
+    """
+    Parse TSV text into a Table, checking that every schema field is a column and that its values
+    have the field type and range. Raise SchemaError listing every bad row of the text.
+    """
+    lines, line_numbers = split_lines(text.removeprefix('\ufeff'))
+    line_numbers = line_numbers[1:]
+    header = lines[0].split('\t') if lines else []
+    errors = []
+    missing = [field.name for field in schema if field.name not in header]
+    if missing:
+        raise SchemaError(source, [RowError(1, name, '', 'missing column') for name in missing])
+
+    columns = split_columns(lines[1:], len(header))
+    if columns is None:
+        body = [line.split('\t') for line in lines[1:]]
+        for i, cells in enumerate(body):
+            if len(cells) != len(header):
+                errors.append(RowError(line_numbers[i], '', lines[i + 1], f'{len(cells)} fields, expected {len(header)}'))
+                body[i] = (cells + [''] * len(header))[:len(header)]
+        columns = [list(column) for column in zip(*body)] if body else [[] for _ in header]
+    text_columns = dict(zip(header, columns))
+
+    typed = {}
+    for field in schema:
+        values = text_columns[field.name]
+        if field.type is str:
+            if '' in values:
+                errors.extend(RowError(line_numbers[i], field.name, value, 'missing value')
+                              for i, value in enumerate(values) if not value)
+        else:
+            typed[field.name] = to_array(values, field, errors, line_numbers)
+    if errors:
+        raise SchemaError(source, sorted(errors))
+    return Table(header, text_columns, typed)
+
+
+def read_table(file_path: str, schema: Sequence[Field] = ()) -> Table:
+    """
+    Read a UTF-8 TSV file through a memory map, decoding it in one go without per-line reads,
+    and parse it with parse_table.
+    """
+    with open(file_path, 'rb') as file:
+        try:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                text = str(mapped, 'utf-8')
+        except ValueError:
+            # empty files cannot be mapped
+            text = ''
+    return parse_table(text, schema, file_path)
@@ -0,0 +1,67 @@
+"""Buffered, optionally compressed TSV output."""
+
+import csv
+import gzip
+import io
+import os
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, TextIO
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+BUFFER_SIZE = 1 << 20       # Bytes buffered before each write to the file
+BATCH_ROWS = 10000          # Rows converted and written per writerows call
+GZIP_LEVEL = 6              # zlib default, level 9 is much slower for little gain on TSV
+PARTIAL_SUFFIX = '.partial' # Files are written under this suffix and renamed once complete
+
+
+def zstd_available() -> bool:
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def output_path(file_path: str, compression: Optional[str] = None) -> str:
+    """
+    Return the file path with the suffix of the compression appended, if it is not there already.
+    """
+    suffix = COMPRESSION_SUFFIXES.get(compression, '')
+    return file_path if file_path.endswith(suffix) else file_path + suffix
+
+
+def open_text(file_path: str, compression: Optional[str] = None) -> TextIO:
+    """
+    Open a buffered UTF-8 text stream writing to file_path, compressed with gzip or zstd if given.
+    zstd needs the zstandard package.
+    """
+    if compression is None:
+        return open(file_path, 'w', encoding='utf-8', newline='', buffering=BUFFER_SIZE)
+    if compression == 'gzip':
+        binary = gzip.open(file_path, 'wb', compresslevel=GZIP_LEVEL)
+    elif compression == 'zstd':
+        import zstandard
+        binary = zstandard.ZstdCompressor().stream_writer(open(file_path, 'wb'))
+    else:
+        raise ValueError(f"unknown compression '{compression}', expected one of {sorted(COMPRESSION_SUFFIXES)}")
+    return io.TextIOWrapper(io.BufferedWriter(binary, BUFFER_SIZE), encoding='utf-8', newline='')
+
+
+def write_tsv(file_path: str, columns: List[str], rows: Iterable[Dict[str, any]],
+              compression: Optional[str] = None) -> str:
+    """
+    Stream rows (dicts keyed by columns) to a TSV file in batches and return the path written.
+    Output matches csv.DictWriter with delimiter='\\t'. The file only appears once complete, so an
+    interrupted run never leaves a truncated output behind.
+    """
+    file_path = output_path(file_path, compression)
+    values = itemgetter(*columns) if len(columns) > 1 else (lambda row: (row[columns[0]],))
+    rows = iter(rows)
+    with open_text(file_path + PARTIAL_SUFFIX, compression) as file:
+        writer = csv.writer(file, delimiter='\t')
+        writer.writerow(columns)
+        while batch := list(islice(rows, BATCH_ROWS)):
+            writer.writerows(map(values, batch))
+    os.replace(file_path + PARTIAL_SUFFIX, file_path)
+    return file_path
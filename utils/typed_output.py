@@ -0,0 +1,112 @@
+"""Typed columnar output of allocation results: Parquet files or a SQLite database."""
+
+import os
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.lazy_import import lazy_import
+from utils.tsv_writer import PARTIAL_SUFFIX
+
+sqlite3 = lazy_import('sqlite3')
+
+BATCH_ROWS = 100000             # Rows per Parquet row group / SQLite executemany call
+INDEX_COLUMNS = ('scode', 'cscode')
+SQL_TYPES = {str: 'TEXT', int: 'INTEGER', float: 'REAL'}
+
+# A table: (column names, type of each column, rows as dicts keyed by column)
+Table = Tuple[List[str], Dict[str, type], Iterable[Dict[str, any]]]
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def convert(value, column_type: type):
+    """
+    Convert a value read from a TSV cell to the column type, empty cells become None.
+    """
+    if value is None or value == '':
+        return None
+    return column_type(value)
+
+
+def typed_rows(columns: List[str], types: Dict[str, type], rows: Iterable[Dict[str, any]]) -> Iterator[tuple]:
+    converters = [(column, types.get(column, str)) for column in columns]
+    for row in rows:
+        yield tuple(convert(row[column], column_type) for column, column_type in converters)
+
+
+def batches(iterable: Iterable, size: int = BATCH_ROWS) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def write_sqlite(file_path: str, tables: Dict[str, Table]) -> str:
+    """
+    Write every table to a new SQLite database with typed columns and indexes on scode and cscode.
+    """
+    temp_path = file_path + PARTIAL_SUFFIX
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    with sqlite3.connect(temp_path) as connection:
+        for name, (columns, types, rows) in tables.items():
+            connection.execute(f'DROP TABLE IF EXISTS "{name}"')
+            connection.execute(f'CREATE TABLE "{name}" (' + ', '.join(
+                f'"{column}" {SQL_TYPES[types.get(column, str)]}' for column in columns) + ')')
+            insert = f'INSERT INTO "{name}" VALUES ({", ".join("?" * len(columns))})'
+            for batch in batches(typed_rows(columns, types, rows)):
+                connection.executemany(insert, batch)
+            for column in INDEX_COLUMNS:
+                if column in columns:
+                    connection.execute(f'CREATE INDEX "{name}_{column}" ON "{name}" ("{column}")')
+    connection.close()
+    os.replace(temp_path, file_path)
+    return file_path
+
+
+def read_sqlite(file_path: str, table: str, **filters) -> List[Dict[str, any]]:
+    """
+    Return the rows of a table as dicts, only those matching the column=value filters if given.
+    """
+    query = f'SELECT * FROM "{table}"'
+    if filters:
+        query += ' WHERE ' + ' AND '.join(f'"{column}" = ?' for column in filters)
+    with sqlite3.connect(file_path) as connection:
+        connection.row_factory = sqlite3.Row
+        rows = [dict(row) for row in connection.execute(query, list(filters.values()))]
+    connection.close()
+    return rows
+
+
+def write_parquet(file_path: str, table: Table) -> str:
+    """
+    Write a table to a Parquet file with typed columns, one row group per BATCH_ROWS rows.
+    Needs the pyarrow package.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {str: pa.string(), int: pa.int64(), float: pa.float64()}
+    columns, types, rows = table
+    schema = pa.schema([(column, arrow_types[types.get(column, str)]) for column in columns])
+    with pq.ParquetWriter(file_path + PARTIAL_SUFFIX, schema) as writer:
+        for batch in batches(typed_rows(columns, types, rows)):
+            values = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column_values, type=field.type) for column_values, field in zip(values, schema)],
+                schema=schema))
+    os.replace(file_path + PARTIAL_SUFFIX, file_path)
+    return file_path
+
+
+def read_parquet(file_path: str, filters: Optional[list] = None) -> List[Dict[str, any]]:
+    """
+    Return the rows of a Parquet file as dicts, e.g. filters=[('scode', '=', '27001')].
+    """
+    import pyarrow.parquet as pq
+    return pq.read_table(file_path, filters=filters).to_pylist()
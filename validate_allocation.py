@@ -0,0 +1,259 @@
+"""Check an allocation (school-center.tsv) against the allocation rules of school_center.py."""
+
+from typing import Dict, List, NamedTuple, Optional
+import argparse
+import csv
+import logging
+import sys
+
+import numpy as np
+
+from school_center import AllocationParams, build_distance_engine, calc_per_center, read_prefs, read_tsv
+from utils.custom_logger import configure_logging
+from utils.distance import haversine_pairs
+from utils.distance_matrix import THRESHOLD_METRICS, read_distance_matrix
+from utils.tsv_reader import CENTERS_SCHEMA, SCHOOLS_SCHEMA
+
+DISTANCE_TOLERANCE_KM = 1e-6    # Max. difference between distance_km and the distance of the coordinates
+VIOLATION_COLUMNS = ["rule", "severity", "scode", "cscode", "detail"]
+
+logger = logging.getLogger(__name__)
+
+
+class Violation(NamedTuple):
+    rule: str
+    severity: str       # 'error' breaks a rule, 'warning' a guideline the allocator may relax
+    scode: str
+    cscode: str
+    detail: str
+
+
+class AllocationChecker:
+    """
+    Check every row of an allocation at once with array and hash lookups, so the
+    cost grows linearly with the no. of rows.
+
+    schools, centers: Lists of dicts as returned by read_tsv
+    prefs: Preference scores as returned by read_prefs
+    allocations: Rows of school-center.tsv as returned by read_tsv
+    distance_matrix: Precomputed distances of the run as returned by read_distance_matrix
+    """
+
+    def __init__(self, schools: List[Dict[str, str]], centers: List[Dict[str, str]],
+                 prefs: Dict[str, Dict[str, int]], allocations: List[Dict[str, str]],
+                 params: Optional[AllocationParams] = None,
+                 distance_matrix: Optional[Dict[str, Dict[str, float]]] = None):
+        self.params = params or AllocationParams()
+        self.schools = schools
+        self.centers = centers
+        self.prefs = prefs
+        self.school_positions = {}
+        for i, s in enumerate(schools):
+            self.school_positions.setdefault(s['scode'], i)
+        self.center_positions = {}
+        for i, c in enumerate(centers):
+            self.center_positions.setdefault(c['cscode'], i)
+        self.counts = np.array([int(s['count']) for s in schools], dtype=np.int64)
+        self.capacity = np.array([int(c['capacity']) for c in centers], dtype=np.int64)
+
+        self.scodes = [row['scode'] for row in allocations]
+        self.cscodes = [row['cscode'] for row in allocations]
+        self.allocation = np.array([int(row['allocation']) for row in allocations], dtype=np.int64)
+        self.distance = np.array([float(row['distance_km']) for row in allocations], dtype=np.float64)
+        self.school_index = np.array([self.school_positions.get(scode, -1) for scode in self.scodes], dtype=np.intp)
+        self.center_index = np.array([self.center_positions.get(cscode, -1) for cscode in self.cscodes],
+                                     dtype=np.intp)
+        self.engine = build_distance_engine(schools, centers, self.params, distance_matrix=distance_matrix)
+
+    def rows(self, rule: str, severity: str, mask: np.ndarray, details: List[str]) -> List[Violation]:
+        return [Violation(rule, severity, self.scodes[i], self.cscodes[i], detail)
+                for i, detail in zip(np.flatnonzero(mask).tolist(), details)]
+
+    def check_known_codes(self) -> List[Violation]:
+        unknown = (self.school_index < 0) | (self.center_index < 0)
+        return self.rows('unknown_code', 'error', unknown,
+                         ['scode or cscode not in the inputs'] * int(unknown.sum()))
+
+    def check_own_center(self) -> List[Violation]:
+        own = np.array(self.scodes, dtype=object) == np.array(self.cscodes, dtype=object)
+        return self.rows('own_center', 'error', own, ['school allocated to its own center'] * int(own.sum()))
+
+    def check_mutual(self) -> List[Violation]:
+        """
+        Two schools must not be each other's center; every such pair is reported once.
+        """
+        pairs = set(zip(self.scodes, self.cscodes))
+        return [Violation('mutual', 'error', scode, cscode, f'{cscode} is also allocated to {scode}')
+                for scode, cscode in sorted(pairs)
+                if scode < cscode and (cscode, scode) in pairs]
+
+    def check_pref_cutoff(self) -> List[Violation]:
+        scores = np.array([self.prefs.get(scode, {}).get(cscode, 0)
+                           for scode, cscode in zip(self.scodes, self.cscodes)], dtype=np.int64)
+        bad = scores <= self.params.pref_cutoff
+        return self.rows('pref_cutoff', 'error', bad,
+                         [f'pref {score} at or below {self.params.pref_cutoff}' for score in scores[bad].tolist()])
+
+    def check_capacity(self) -> List[Violation]:
+        """
+        No center may take more students than its capacity stretched by stretch_capacity_factor.
+        """
+        known = self.center_index >= 0
+        used = np.bincount(self.center_index[known], weights=self.allocation[known],
+                           minlength=len(self.centers)).astype(np.int64)
+        limit = np.floor(self.capacity * (1 + self.params.stretch_capacity_factor)).astype(np.int64)
+        return [Violation('capacity', 'error', '', self.centers[ci]['cscode'],
+                          f'{used[ci]} students, capacity {self.capacity[ci]} stretched to {limit[ci]}')
+                for ci in np.flatnonzero(used > limit).tolist()]
+
+    def check_school_counts(self) -> List[Violation]:
+        """
+        A school may not have more students allocated than it has; fewer is reported as a warning.
+        """
+        known = self.school_index >= 0
+        allocated = np.bincount(self.school_index[known], weights=self.allocation[known],
+                                minlength=len(self.schools)).astype(np.int64)
+        return [Violation('school_count' if allocated[si] > self.counts[si] else 'unassigned',
+                          'error' if allocated[si] > self.counts[si] else 'warning',
+                          self.schools[si]['scode'], '', f'{allocated[si]} of {self.counts[si]} students allocated')
+                for si in np.flatnonzero(allocated != self.counts).tolist()]
+
+    def check_per_center(self) -> List[Violation]:
+        """
+        A center should take at most calc_per_center (100 or 200) students of a school.
+        The relaxed pass may exceed it, so it is a warning.
+        """
+        known = self.school_index >= 0
+        per_center = np.array([calc_per_center(count) for count in self.counts.tolist()], dtype=np.int64)
+        limit = np.full(len(self.allocation), np.iinfo(np.int64).max)
+        limit[known] = per_center[self.school_index[known]]
+        bad = self.allocation > limit
+        return self.rows('per_center', 'warning', bad,
+                         [f'{n} students, more than {cap} from one school'
+                          for n, cap in zip(self.allocation[bad].tolist(), limit[bad].tolist())])
+
+    def check_distances(self) -> List[Violation]:
+        """
+        distance_km must match the coordinates (or the distance matrix), and centers beyond abs_distance_threshold
+        in the threshold metric must be among the nearest_centers_fallback closest centers the school could
+        have been allocated to.
+        """
+        known = np.flatnonzero((self.school_index >= 0) & (self.center_index >= 0))
+        distance = np.full(len(self.allocation), np.nan)
+        distance[known] = self.engine.pairs(self.school_index[known].tolist(), self.center_index[known].tolist())
+        mismatch = np.abs(distance - self.distance) > DISTANCE_TOLERANCE_KM  # False for unknown codes (NaN)
+        violations = self.rows('distance_km', 'error', mismatch,
+                               [f'distance_km {d}, coordinates are {c:.6f} km apart'
+                                for d, c in zip(self.distance[mismatch].tolist(), distance[mismatch].tolist())])
+
+        threshold_distance = distance.copy()
+        if self.params.threshold_metric == 'haversine':
+            threshold_distance[known] = haversine_pairs(self.engine.school_coords[self.school_index[known]],
+                                                        self.engine.center_coords[self.center_index[known]])
+        far = np.flatnonzero(threshold_distance > self.params.abs_distance_threshold + DISTANCE_TOLERANCE_KM).tolist()
+        if far:
+            excluded = self.excluded_centers()
+            for i in far:
+                si, ci = int(self.school_index[i]), int(self.center_index[i])
+                nearest = self.fallback_centers(si, excluded.get(si, ()))
+                if ci not in nearest:
+                    violations.append(Violation(
+                        'distance', 'error', self.scodes[i], self.cscodes[i],
+                        f'{threshold_distance[i]:.3f} km, beyond {self.params.abs_distance_threshold} km and not among '
+                        f'the nearest {self.params.nearest_centers_fallback} qualifying centers'))
+        return violations
+
+    def fallback_centers(self, school_index: int, excluded: np.ndarray) -> set:
+        """
+        Return the nearest centers the allocator may fall back to, searched like Allocator.nearest_candidates:
+        the nearest k centers, k doubling until nearest_centers_fallback of them are not excluded.
+        """
+        order = np.argsort(self.engine.row(school_index), kind='stable')
+        qualifying = np.cumsum(~np.isin(order, excluded))
+        wanted = self.params.nearest_centers_fallback
+        k = wanted
+        while k < len(order) and qualifying[k - 1] < wanted:
+            k *= 2
+        return set(order[:k].tolist())
+
+    def excluded_centers(self) -> Dict[int, np.ndarray]:
+        """
+        Return the centers each school could never be allocated to: its own, prefs at or below pref_cutoff
+        and the centers of schools allocated to its own center. Built from the final allocation, this is
+        a superset of what the allocator excluded at any time.
+        """
+        school_center = np.array([self.center_positions.get(s['scode'], -1) for s in self.schools], dtype=np.intp)
+        excluded = {si: [ci] for si, ci in enumerate(school_center.tolist()) if ci >= 0}
+        for scode, scores in self.prefs.items():
+            si = self.school_positions.get(scode)
+            if si is not None:
+                excluded.setdefault(si, []).extend(self.center_positions[cscode] for cscode, score in scores.items()
+                                                   if score <= self.params.pref_cutoff and cscode in self.center_positions)
+        for si, ci in zip(self.school_index.tolist(), self.center_index.tolist()):
+            # si has students at ci: the school of ci may not use si's center
+            other = self.school_positions.get(self.centers[ci]['cscode']) if ci >= 0 else None
+            if si >= 0 and other is not None and school_center[si] >= 0:
+                excluded.setdefault(other, []).append(int(school_center[si]))
+        return {si: np.array(centers, dtype=np.intp) for si, centers in excluded.items()}
+
+    def check(self) -> List[Violation]:
+        return (self.check_known_codes() + self.check_own_center() + self.check_mutual() +
+                self.check_pref_cutoff() + self.check_capacity() + self.check_school_counts() +
+                self.check_per_center() + self.check_distances())
+
+
+def validate(schools: List[Dict[str, str]], centers: List[Dict[str, str]], prefs: Dict[str, Dict[str, int]],
+             allocations: List[Dict[str, str]], params: Optional[AllocationParams] = None,
+             distance_matrix: Optional[Dict[str, Dict[str, float]]] = None) -> List[Violation]:
+    """
+    Return every violation of the allocation rules in the allocations.
+    """
+    return AllocationChecker(schools, centers, prefs, allocations, params, distance_matrix).check()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='validate allocation',
+        description='Checks an allocation against the allocation rules')
+    parser.add_argument('schools_tsv', help="Tab separated (TSV) file containing school details")
+    parser.add_argument('centers_tsv', help="Tab separated (TSV) file containing center details")
+    parser.add_argument('prefs_tsv', help="Tab separated (TSV) file containing preference scores")
+    parser.add_argument('allocation_tsv', help="school-center.tsv written by school_center.py")
+    parser.add_argument('-o', '--output', metavar='FILE', default=None,
+                        help='Write the violations as TSV to FILE')
+    parser.add_argument('--distance-matrix', metavar='FILE', default=None,
+                        help='Distance matrix the allocation was made with')
+    parser.add_argument('--threshold-metric', choices=THRESHOLD_METRICS, default=AllocationParams.threshold_metric,
+                        help='Threshold metric the allocation was made with')
+    parser.add_argument('--strict', action='store_true',
+                        help='Also fail on warnings (per center cap, unassigned students)')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> List[Violation]:
+    args = build_parser().parse_args(argv)
+    configure_logging()
+    distance_matrix = read_distance_matrix(args.distance_matrix) if args.distance_matrix else None
+    violations = validate(read_tsv(args.schools_tsv, SCHOOLS_SCHEMA), read_tsv(args.centers_tsv, CENTERS_SCHEMA),
+                          read_prefs(args.prefs_tsv), read_tsv(args.allocation_tsv),
+                          AllocationParams(threshold_metric=args.threshold_metric), distance_matrix)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file, delimiter='\t')
+            writer.writerow(VIOLATION_COLUMNS)
+            writer.writerows(violations)
+    counts = {}
+    for violation in violations:
+        counts[(violation.rule, violation.severity)] = counts.get((violation.rule, violation.severity), 0) + 1
+    for (rule, severity), n in sorted(counts.items()):
+        logger.log(logging.ERROR if severity == 'error' else logging.WARNING, f"{rule}: {n} {severity}s")
+    failed = [v for v in violations if args.strict or v.severity == 'error']
+    if failed:
+        logger.error(f"{args.allocation_tsv} breaks {len(failed)} rules")
+        sys.exit(1)
+    logger.info(f"{args.allocation_tsv} follows the allocation rules")
+    return violations
+
+
+if __name__ == '__main__':
+    main()